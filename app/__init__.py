@@ -1,14 +1,43 @@
-from flask import Flask
+import os
 
-from app.webhook.routes import webhook
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 
-# Creating our flask app
-def create_app():
+# Creating our flask app: the one entry point for `python run.py`, gunicorn
+# ("app:create_app()") and the benchmarks. Flask and the blueprints are imported
+# here rather than at module level so `from app import config` (the CLI, every
+# submodule) stays cheap.
+def create_app(warm_up=None):
+    from flask import Flask
+    from flask_cors import CORS
 
-    app = Flask(__name__)
+    from app import config
+    from app.events import check_decoder
+    from app.main import dashboard
+    from app.startup import WARM_UP_MODES, startup
+    from app.webhook.routes import webhook
+
+    warm_up = warm_up or config.STARTUP_WARM_UP
+    if warm_up not in WARM_UP_MODES:
+        raise ValueError(f"Unknown STARTUP_WARM_UP: {warm_up} "
+                         f"(expected one of {', '.join(WARM_UP_MODES)})")
+    # An unusable WEBHOOK_DECODER stops the worker here, not every delivery with a 500
+    check_decoder()
+
+    app = Flask(__name__, template_folder=os.path.join(ROOT, 'templates'))
     
     # registering all the blueprints
+    app.register_blueprint(dashboard)
     app.register_blueprint(webhook)
+    CORS(app, resources={r'/webhook/.*': {}})  # Enable CORS for the frontend
+
+    # Indexes and the MongoDB probe (app/startup.py) never run while the app is
+    # built: a background thread warms the worker up, or the first request does
+    if warm_up == 'background':
+        startup.ensure_started()
+        # a worker forked after create_app starts its own
+        app.before_request(startup.ensure_started)
+    elif warm_up == 'request':
+        app.before_request(startup.before_request)
     
     return app
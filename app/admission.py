@@ -0,0 +1,202 @@
+"""
+Admission control for the webhook and dashboard routes of one worker process.
+
+Requests are admitted per route before they wait on storage, and the ones
+that cannot be served in time are shed right away instead of piling up
+behind the database:
+
+    ingest  /webhook, /webhook/<tenant> and /webhook/receiver: at most
+            ADMISSION_INGEST_CONCURRENCY deliveries enqueueing at once; once their
+            ingest queue is ADMISSION_QUEUE_HIGH full they get 503 with a
+            Retry-After of roughly the time the writer needs to catch up,
+            rather than blocking a worker on the full queue
+    read    storage reads behind /api/actions: at most the adaptive limit
+            below, never more than ADMISSION_READ_CONCURRENCY
+
+Ingest beats reads. While any watched ingest queue is ADMISSION_READ_YIELD
+full the writer is behind on the database, so reads are not admitted at
+all and leave it to the writer: the feed is answered from its cache however
+old it is, paged queries get 503.
+
+The read limit follows storage latency (AIMD): every storage call timed
+through ``timed`` or ``call`` (reads and the writer's batches) that takes
+longer than ADMISSION_TARGET_MS, or fails, multiplies it by
+ADMISSION_BACKOFF; every faster call made while at least half of it is in
+use adds one.
+"""
+import functools
+import math
+import threading
+import time
+
+from app import config
+
+ROUTES = ('ingest', 'read')
+
+# Retry-After bounds for shed requests, in seconds
+RETRY_AFTER_MIN = 1
+RETRY_AFTER_MAX = 30
+
+
+class Overloaded(Exception):
+    """A request shed by admission control; ``retry_after`` is in seconds."""
+
+    def __init__(self, message, retry_after=RETRY_AFTER_MIN):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AIMDLimit:
+    """Concurrency limit that grows by one while calls beat ``target`` seconds and shrinks by ``backoff`` when not."""
+
+    def __init__(self, initial, max_limit, target, backoff=0.9, min_limit=1):
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.target = target
+        self.backoff = backoff
+        self._lock = threading.Lock()
+        self.increases = 0
+        self.decreases = 0
+
+    def observe(self, seconds, in_flight, failed=False):
+        """Adjust the limit for one call that took ``seconds`` with ``in_flight`` calls running."""
+        with self._lock:
+            if failed or seconds > self.target:
+                self.limit = max(self.min_limit, self.limit * self.backoff)
+                self.decreases += 1
+            elif in_flight * 2 >= self.limit and self.limit < self.max_limit:
+                # Only grow a limit that is actually being used
+                self.limit = min(self.max_limit, self.limit + 1)
+                self.increases += 1
+
+    def __int__(self):
+        return int(self.limit)
+
+
+class Admission:
+    """Per-route in-flight counts, the adaptive read limit and the watched ingest queues."""
+
+    def __init__(self, enabled=None, ingest_concurrency=None, read_concurrency=None,
+                 target_ms=None, backoff=None, queue_high=None, read_yield=None):
+        self.enabled = config.ADMISSION_ENABLED if enabled is None else enabled
+        self.concurrency = {
+            'ingest': ingest_concurrency or config.ADMISSION_INGEST_CONCURRENCY,
+            'read': read_concurrency or config.ADMISSION_READ_CONCURRENCY,
+        }
+        target_ms = config.ADMISSION_TARGET_MS if target_ms is None else target_ms
+        self.limiter = AIMDLimit(self.concurrency['read'], self.concurrency['read'],
+                                 target_ms / 1000, backoff or config.ADMISSION_BACKOFF)
+        self.queue_high = config.ADMISSION_QUEUE_HIGH if queue_high is None else queue_high
+        self.read_yield = config.ADMISSION_READ_YIELD if read_yield is None else read_yield
+        self.queues = []
+        self._lock = threading.Lock()
+        self._in_flight = dict.fromkeys(ROUTES, 0)
+        self._counters = {route: {'admitted': 0, 'shed': 0} for route in ROUTES}
+
+    def watch(self, queue):
+        """Let a backed-up ``queue`` hold dashboard reads back."""
+        self.queues.append(queue)
+
+    def acquire(self, route):
+        """Admit one ``route`` request; raises Overloaded when it should be shed.
+
+        Every successful acquire must be paired with ``release``.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            if route == 'read':
+                limit = min(self.concurrency['read'], int(self.limiter))
+                reason = None
+                if self._in_flight['read'] >= limit:
+                    reason = f"{limit} reads already in flight"
+                elif any(queue.depth() >= queue.maxsize * self.read_yield for queue in self.queues):
+                    reason = "ingest is behind, reads yield to the writer"
+            else:
+                limit = self.concurrency['ingest']
+                reason = (f"{limit} deliveries already in flight"
+                          if self._in_flight['ingest'] >= limit else None)
+            if reason is not None:
+                self._counters[route]['shed'] += 1
+                raise Overloaded(reason)
+            self._in_flight[route] += 1
+            self._counters[route]['admitted'] += 1
+
+    def release(self, route):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._in_flight[route] -= 1
+
+    def call(self, route, func, *args):
+        """``func(*args)`` as one admitted, timed ``route`` request; raises Overloaded if shed."""
+        self.acquire(route)
+        try:
+            return self.timed(func)(*args)
+        finally:
+            self.release(route)
+
+    def put(self, queue, document):
+        """Admit one delivery into ``queue``; raises Overloaded instead of waiting on it once saturated."""
+        if not self.enabled:
+            queue.put(document)
+            return
+        depth = queue.depth()
+        if depth >= queue.maxsize * self.queue_high:
+            with self._lock:
+                self._counters['ingest']['shed'] += 1
+            raise Overloaded(f"{queue.name} queue is {depth / queue.maxsize:.0%} full",
+                             retry_after(queue, depth))
+        self.acquire('ingest')
+        try:
+            queue.put(document)
+        finally:
+            self.release('ingest')
+
+    def timed(self, func):
+        """Wrap a storage call so its latency (and failures) drive the read limit."""
+        if not self.enabled:
+            return func
+
+        @functools.wraps(func)
+        def timed_call(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            except ValueError:
+                # A bad query, not a struggling database
+                raise
+            except Exception:
+                self.limiter.observe(time.perf_counter() - started, self._in_flight['read'], True)
+                raise
+            self.limiter.observe(time.perf_counter() - started, self._in_flight['read'])
+            return result
+        return timed_call
+
+    def stats(self):
+        with self._lock:
+            routes = {route: dict(self._counters[route], in_flight=self._in_flight[route],
+                                  concurrency=self.concurrency[route])
+                      for route in ROUTES}
+        routes['read']['limit'] = round(self.limiter.limit, 2)
+        return {
+            'enabled': self.enabled,
+            'routes': routes,
+            'target_ms': self.limiter.target * 1000,
+            'increases': self.limiter.increases,
+            'decreases': self.limiter.decreases,
+        }
+
+
+def retry_after(queue, backlog):
+    """Seconds for ``queue``'s writer to work off ``backlog`` documents at its last batch rate."""
+    stats = queue.stats()
+    if not stats['last_write_ms'] or not stats['last_batch_size']:
+        return RETRY_AFTER_MIN
+    seconds = backlog * stats['last_write_ms'] / 1000 / stats['last_batch_size']
+    return min(RETRY_AFTER_MAX, max(RETRY_AFTER_MIN, math.ceil(seconds)))
+
+
+# Process-wide admission control shared by the dashboard and webhook blueprints
+admission = Admission()
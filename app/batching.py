@@ -0,0 +1,111 @@
+# Server error code for a unique index violation
+DUPLICATE_KEY = 11000
+
+
+class StorageUnavailable(Exception):
+    """Storage could not be reached; nothing from ``pending`` is known to be written.
+
+    ``result`` covers whatever was written before the failure.
+    """
+
+    def __init__(self, message, pending=None, result=None):
+        super().__init__(message)
+        self.pending = pending
+        self.result = result
+
+
+class BatchResult:
+    """Outcome of one batched write: how many documents landed and which failed.
+
+    Duplicate-key rejections are kept apart from errors: they mean the
+    document is already stored, not that it was lost. Spooled documents are
+    parked on local disk and will be written later.
+    """
+
+    __slots__ = ('inserted', 'duplicates', 'errors', 'spooled')
+
+    def __init__(self, inserted=0, errors=None, duplicates=None, spooled=None):
+        self.inserted = inserted
+        # Documents rejected by a unique index
+        self.duplicates = duplicates or []
+        # List of (document, error message) pairs
+        self.errors = errors or []
+        # Documents written to the local spool instead of storage
+        self.spooled = spooled or []
+
+    def __repr__(self):
+        return (f"BatchResult(inserted={self.inserted}, duplicates={len(self.duplicates)}, "
+                f"errors={len(self.errors)}, spooled={len(self.spooled)})")
+
+    def stored(self, documents):
+        """The documents from ``documents`` that this write actually inserted."""
+        skipped = {id(document) for document, _ in self.errors}
+        skipped.update(id(document) for document in self.duplicates)
+        skipped.update(id(document) for document in self.spooled)
+        return [document for document in documents if id(document) not in skipped]
+
+
+class BatchWriter:
+    """Write documents with unordered insert_many calls of at most max_size documents.
+
+    An unordered insert keeps going past a failing document, so one bad
+    document (e.g. a duplicate key) only costs itself, not the rest of the batch.
+    """
+
+    def __init__(self, collection, max_size=500, on_error=None):
+        self.collection = collection
+        self.max_size = max_size
+        self.on_error = on_error
+
+    def __call__(self, documents):
+        result = BatchResult()
+        for start in range(0, len(documents), self.max_size):
+            chunk = documents[start:start + self.max_size]
+            try:
+                chunk_result = self.write(chunk)
+            except StorageUnavailable as e:
+                # Earlier chunks landed; everything from this one on did not
+                e.pending = documents[start:]
+                e.result = result
+                raise
+            result.inserted += chunk_result.inserted
+            result.duplicates.extend(chunk_result.duplicates)
+            result.errors.extend(chunk_result.errors)
+        return result
+
+    def write(self, documents):
+        """Insert one chunk and map any per-document write errors back to documents."""
+        if not documents:
+            return BatchResult()
+
+        from pymongo.errors import BulkWriteError, ConnectionFailure
+
+        try:
+            inserted = len(self.collection.insert_many(documents, ordered=False).inserted_ids)
+            return BatchResult(inserted)
+        except BulkWriteError as e:
+            details = e.details or {}
+            write_errors = details.get('writeErrors', [])
+            errors = [
+                (documents[error['index']], error.get('errmsg', 'write error'))
+                for error in write_errors
+                if error.get('code') != DUPLICATE_KEY
+            ]
+            duplicates = [
+                documents[error['index']]
+                for error in write_errors
+                if error.get('code') == DUPLICATE_KEY
+            ]
+            inserted = details.get('nInserted', len(documents) - len(write_errors))
+            result = BatchResult(inserted, errors, duplicates)
+        except ConnectionFailure as e:
+            # Nothing in the chunk is known to be written; the caller decides
+            # whether to spool it or give up
+            raise StorageUnavailable(str(e), pending=documents) from e
+        except Exception as e:
+            result = BatchResult(0, [(document, str(e)) for document in documents])
+
+        if self.on_error:
+            for document, message in result.errors:
+                self.on_error(document, message)
+        return result
@@ -0,0 +1,447 @@
+"""
+Cross-worker event bus: tells every worker process (and, on MongoDB, every
+node) about the actions another one stored, so their feed caches and live
+streams stay in step.
+
+Without it each gunicorn worker only knows what its own writer stored: a
+dashboard streaming from worker A never hears of a push that worker B
+ingested, and A's feed cache only catches up when FEED_CACHE_TTL runs out.
+
+EVENT_BUS picks the transport:
+
+- ``none`` (default): nothing is shared between workers.
+- ``memory``: buses created in one process on the same channel see each
+  other's notifications; for tests and benchmarks.
+- ``socket``: one host. Every worker binds a Unix datagram socket under
+  BUS_DIR and sends each notification to every other socket there, so there
+  is no broker to run or to lose. A peer whose receive queue stays full for
+  SEND_TIMEOUT misses the notification (counted as ``dropped``) and catches
+  up on its next feed reload.
+- ``mongo``: every node tails a change stream on the actions collection, so
+  the inserts themselves are the notifications and nothing is sent; needs a
+  replica set (Atlas clusters are).
+
+Notifications are coalesced: ``publish`` only appends to an outbox, which a
+sender thread flushes BUS_FLUSH_MS after its first action arrived, or as
+soon as BUS_BATCH_SIZE actions wait, as one message per collection.
+Subscribers are called from the receiver thread with ``(collection,
+actions)``, for other workers' messages only.
+"""
+import atexit
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import timezone
+
+from app import config
+from app.metrics import BUS_MESSAGES, BUS_PROPAGATION_SECONDS
+
+BACKENDS = ('none', 'memory', 'socket', 'mongo')
+
+SOCKET_SUFFIX = '.sock'
+# Largest datagram sent; bigger messages are split (Linux allows about 208 KB by default)
+MAX_DATAGRAM = 60 * 1024
+RECEIVE_BUFFER = 4 * 1024 * 1024
+# Longest the sender waits for room in a peer's receive queue before dropping a message
+SEND_TIMEOUT = 0.05
+# Seconds between rereads of BUS_DIR, for workers that started or exited
+PEER_REFRESH_SECONDS = 1.0
+# Own action ids remembered by the mongo bus, so its change stream skips them
+OWN_IDS = 10000
+# Server error code for a change stream on a standalone mongod
+CHANGE_STREAM_UNSUPPORTED = 40573
+
+
+class EventBus:
+    """Base bus: coalescing outbox, sender thread and subscriber delivery.
+
+    Transports implement ``_open`` (bind, start receiving), ``_send(message)``
+    and ``_close``; received messages go to ``_deliver``. A message is a dict
+    with ``origin`` (the sending node), ``collection``, ``sent_at`` (epoch
+    seconds) and ``actions``.
+    """
+
+    name = None
+    # Whether publish() has anything to send (the mongo bus reads the database instead)
+    sends = True
+
+    def __init__(self, flush_ms=None, batch_size=None):
+        self.flush_seconds = (config.BUS_FLUSH_MS if flush_ms is None else flush_ms) / 1000
+        self.batch_size = batch_size or config.BUS_BATCH_SIZE
+        self.node = None
+        self._subscribers = []
+        self._cond = threading.Condition()
+        self._outbox = {}
+        self._pending = 0
+        self._first_at = None
+        self._closed = False
+        self._pid = None
+        self._sender = None
+        self._counters = {'published': 0, 'sent_messages': 0, 'received_messages': 0,
+                          'received_actions': 0, 'dropped': 0, 'errors': 0}
+
+    def subscribe(self, callback):
+        """Call ``callback(collection, actions)`` for every message from another worker."""
+        self._subscribers.append(callback)
+        return callback
+
+    def publish(self, collection, actions):
+        """Queue formatted actions stored in ``collection`` for the other workers."""
+        if not actions:
+            return
+        self.ensure_started()
+        with self._cond:
+            self._outbox.setdefault(collection, []).extend(actions)
+            self._pending += len(actions)
+            self._counters['published'] += len(actions)
+            if self._first_at is None:
+                self._first_at = time.monotonic()
+            self._cond.notify()
+
+    def ensure_started(self):
+        """Open the transport and start the threads in this process (once per process)."""
+        if self._pid == os.getpid():
+            return
+        with self._cond:
+            if self._pid == os.getpid():
+                return
+            if self._pid is None:
+                atexit.register(self.close)
+            # Forked: the outbox and the transport belong to the parent
+            self._pid = os.getpid()
+            self.node = f'{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}'
+            self._outbox, self._pending, self._first_at = {}, 0, None
+            self._closed = False
+            self._open()
+            if self.sends:
+                self._sender = threading.Thread(target=self._run_sender,
+                                                name=f'{self.name}-bus-sender', daemon=True)
+                self._sender.start()
+
+    def close(self):
+        """Send what is still queued and release the transport."""
+        if self._pid != os.getpid():
+            return
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify()
+        if self._sender is not None:
+            self._sender.join(timeout=1)
+        self._close()
+
+    def stats(self):
+        with self._cond:
+            return {'backend': self.name, 'node': self.node, 'pending': self._pending,
+                    'subscribers': len(self._subscribers), **self._counters}
+
+    def _open(self):
+        pass
+
+    def _send(self, message):
+        raise NotImplementedError
+
+    def _close(self):
+        pass
+
+    def _run_sender(self):
+        while True:
+            with self._cond:
+                while not self._closed and not self._due():
+                    self._cond.wait(self._wait_seconds())
+                if self._closed and not self._pending:
+                    return
+                outbox, self._outbox, self._pending, self._first_at = self._outbox, {}, 0, None
+
+            for collection, actions in outbox.items():
+                message = {'origin': self.node, 'collection': collection, 'sent_at': time.time(),
+                           'actions': actions}
+                try:
+                    self._send(message)
+                    BUS_MESSAGES.inc(self.name, 'sent')
+                    self._incr('sent_messages')
+                except Exception as e:
+                    self._incr('errors')
+                    print(f"Event bus send failed for {len(actions)} actions: {str(e)}")
+
+    def _due(self):
+        if self._pending >= self.batch_size:
+            return True
+        return self._first_at is not None and time.monotonic() - self._first_at >= self.flush_seconds
+
+    def _wait_seconds(self):
+        if self._first_at is None:
+            return None
+        return max(0.0, self._first_at + self.flush_seconds - time.monotonic())
+
+    def _deliver(self, message):
+        if message.get('origin') == self.node:
+            return
+        actions = message.get('actions') or []
+        self._incr('received_messages')
+        self._incr('received_actions', len(actions))
+        BUS_MESSAGES.inc(self.name, 'received')
+        if message.get('sent_at'):
+            BUS_PROPAGATION_SECONDS.observe(max(0.0, time.time() - message['sent_at']), self.name)
+        for callback in self._subscribers:
+            try:
+                callback(message.get('collection'), actions)
+            except Exception as e:
+                self._incr('errors')
+                print(f"Event bus subscriber failed: {str(e)}")
+
+    def _incr(self, name, amount=1):
+        with self._cond:
+            self._counters[name] += amount
+
+
+class NullBus(EventBus):
+    """EVENT_BUS=none: every worker keeps to itself."""
+
+    name = 'none'
+    sends = False
+
+    def publish(self, collection, actions):
+        pass
+
+    def ensure_started(self):
+        pass
+
+
+class MemoryBus(EventBus):
+    """Buses on the same ``channel`` in one process deliver to each other, synchronously."""
+
+    name = 'memory'
+    _channels = {}
+    _channels_lock = threading.Lock()
+
+    def __init__(self, channel='default', **kwargs):
+        super().__init__(**kwargs)
+        self.channel = channel
+
+    def _open(self):
+        with self._channels_lock:
+            self._channels.setdefault(self.channel, []).append(self)
+
+    def _send(self, message):
+        with self._channels_lock:
+            peers = [bus for bus in self._channels.get(self.channel, ()) if bus is not self]
+        for bus in peers:
+            bus._deliver(message)
+
+    def _close(self):
+        with self._channels_lock:
+            buses = self._channels.get(self.channel, [])
+            if self in buses:
+                buses.remove(self)
+
+
+class SocketBus(EventBus):
+    """One Unix datagram socket per worker under ``directory``; each send goes to every peer."""
+
+    name = 'socket'
+
+    def __init__(self, directory=None, **kwargs):
+        super().__init__(**kwargs)
+        self.directory = directory or config.BUS_DIR
+        self.path = None
+        self._socket = None
+        self._out = None
+        self._peers = []
+        self._peers_read_at = 0.0
+
+    def stats(self):
+        return dict(super().stats(), path=self.path, peers=len(self._peers))
+
+    def _open(self):
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f'{os.getpid()}-{uuid.uuid4().hex[:6]}{SOCKET_SUFFIX}')
+        if len(path.encode()) > 100:
+            raise ValueError(f"BUS_DIR is too long for a Unix socket path: {self.directory}")
+        receiver = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        try:
+            receiver.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RECEIVE_BUFFER)
+        except OSError:
+            pass  # capped by net.core.rmem_max
+        receiver.bind(path)
+        self.path = path
+        self._socket = receiver
+        self._out = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._out.settimeout(SEND_TIMEOUT)
+        self._peers_read_at = 0.0
+        threading.Thread(target=self._run_receiver, args=(receiver,),
+                         name='socket-bus-receiver', daemon=True).start()
+
+    def _send(self, message):
+        for data in self._encode(message):
+            for peer in self._peer_paths():
+                try:
+                    self._out.sendto(data, peer)
+                except (BlockingIOError, socket.timeout):
+                    # The peer is behind; it catches up on its next feed reload
+                    self._incr('dropped')
+                except (ConnectionRefusedError, FileNotFoundError):
+                    # Left behind by a worker that was killed
+                    self._remove(peer)
+                    self._peers_read_at = 0.0
+                except OSError as e:
+                    self._incr('dropped')
+                    print(f"Event bus: cannot send {len(data)} bytes to {peer}: {str(e)}")
+
+    def _encode(self, message):
+        data = json.dumps(message, separators=(',', ':'), default=str).encode('utf-8')
+        actions = message['actions']
+        if len(data) <= MAX_DATAGRAM or len(actions) < 2:
+            yield data
+            return
+        half = len(actions) // 2
+        for part in (actions[:half], actions[half:]):
+            yield from self._encode(dict(message, actions=part))
+
+    def _peer_paths(self):
+        now = time.monotonic()
+        if now - self._peers_read_at >= PEER_REFRESH_SECONDS:
+            try:
+                names = os.listdir(self.directory)
+            except FileNotFoundError:
+                names = []
+            self._peers = [os.path.join(self.directory, name) for name in names
+                           if name.endswith(SOCKET_SUFFIX)
+                           and os.path.join(self.directory, name) != self.path]
+            self._peers_read_at = now
+        return self._peers
+
+    def _run_receiver(self, receiver):
+        while True:
+            try:
+                data = receiver.recv(MAX_DATAGRAM * 4)
+            except OSError:
+                return  # closed
+            try:
+                message = json.loads(data)
+            except ValueError:
+                self._incr('errors')
+                continue
+            self._deliver(message)
+
+    def _close(self):
+        for sock in (self._socket, self._out):
+            if sock is not None:
+                sock.close()
+        if self.path:
+            self._remove(self.path)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class MongoBus(EventBus):
+    """Tails a change stream on ``collection_name`` and turns inserts into messages.
+
+    ``publish`` only remembers this worker's own action ids so they are not
+    delivered back; ``formatter`` turns a stored document into an action.
+    """
+
+    name = 'mongo'
+    sends = False
+
+    def __init__(self, get_collection, formatter, collection_name, **kwargs):
+        super().__init__(**kwargs)
+        self._get_collection = get_collection
+        self._formatter = formatter
+        self.collection_name = collection_name
+        self._own = deque()
+        self._own_ids = set()
+        self.supported = True
+
+    def publish(self, collection, actions):
+        self.ensure_started()
+        with self._cond:
+            for action in actions:
+                if len(self._own) >= OWN_IDS:
+                    self._own_ids.discard(self._own.popleft())
+                self._own.append(action['id'])
+                self._own_ids.add(action['id'])
+            self._counters['published'] += len(actions)
+
+    def stats(self):
+        return dict(super().stats(), supported=self.supported)
+
+    def _open(self):
+        threading.Thread(target=self._run_receiver, name='mongo-bus-receiver', daemon=True).start()
+
+    def _run_receiver(self):
+        from pymongo.errors import OperationFailure, PyMongoError
+
+        pid = os.getpid()
+        resume_token = None
+        delay = 1
+        while not self._closed and self._pid == pid:
+            try:
+                stream = self._get_collection().watch(
+                    [{'$match': {'operationType': 'insert'}}], resume_after=resume_token,
+                    max_await_time_ms=max(1, int(self.flush_seconds * 1000)))
+                with stream:
+                    delay = 1
+                    resume_token = self._tail(stream, resume_token)
+            except OperationFailure as e:
+                if e.code == CHANGE_STREAM_UNSUPPORTED:
+                    self.supported = False
+                    print("Event bus: change streams need a replica set, EVENT_BUS=mongo is off")
+                    return
+                self._incr('errors')
+                print(f"Event bus change stream failed: {str(e)}")
+            except PyMongoError as e:
+                self._incr('errors')
+                print(f"Event bus change stream failed: {str(e)}")
+            time.sleep(delay)
+            delay = min(delay * 2, 30)
+
+    def _tail(self, stream, resume_token):
+        batch, first_at, sent_at = [], None, None
+        while not self._closed and stream.alive:
+            change = stream.try_next()
+            if change is not None:
+                resume_token = stream.resume_token
+                document = change['fullDocument']
+                if str(document['_id']) not in self._own_ids:
+                    batch.append(document)
+                    first_at = first_at or time.monotonic()
+                    if change.get('wallTime') and sent_at is None:
+                        sent_at = change['wallTime'].replace(tzinfo=timezone.utc).timestamp()
+            if batch and (change is None or len(batch) >= self.batch_size
+                          or time.monotonic() - first_at >= self.flush_seconds):
+                self._deliver({'origin': None, 'collection': self.collection_name,
+                               'sent_at': sent_at,
+                               'actions': [self._formatter(document) for document in batch]})
+                batch, first_at, sent_at = [], None, None
+        return resume_token
+
+
+def create_bus(backend=None, storage=None, formatter=None, collection=None):
+    """Build the configured event bus (EVENT_BUS: none, memory, socket or mongo).
+
+    The mongo bus tails ``storage``'s collection and formats its inserts
+    with ``formatter``; it needs STORAGE_BACKEND=mongo.
+    """
+    backend = backend or config.EVENT_BUS
+    if backend == 'none':
+        return NullBus()
+    if backend == 'memory':
+        return MemoryBus()
+    if backend == 'socket':
+        return SocketBus(config.BUS_DIR)
+    if backend == 'mongo':
+        if storage is None or storage.name != 'mongo':
+            raise ValueError("EVENT_BUS=mongo needs STORAGE_BACKEND=mongo")
+        return MongoBus(lambda: storage.collection, formatter, collection)
+    raise ValueError(f"Unknown event bus: {backend} (expected one of {', '.join(BACKENDS)})")
@@ -0,0 +1,279 @@
+"""
+Maintenance commands, run against the configured storage backend:
+
+    python -m app.cli archive run --collection actions
+    python -m app.cli archive query --collection actions --after 2024-01-01 --author octocat
+    python -m app.cli export data --format csv --compress --output actions.csv.gz
+    python -m app.cli export data --format parquet --after 2024-01-01 --output actions.parquet
+    python -m app.cli export summary --bucket hour --top 20 --action push
+    python -m app.cli schema migrate --collection actions --dry-run
+    python -m app.cli rollups backfill --collection acme_actions --rebuild
+    python -m app.cli startup run
+    python -m app.cli deadletters list --target chat
+    python -m app.cli deadletters replay --target chat
+"""
+import argparse
+import json
+import sys
+
+from bson import json_util
+
+from app import config
+from app.queries import FILTER_FIELDS, parse_time
+
+
+def archive_run(args):
+    from app.retention import Retention
+    from app.storage import create_storage
+
+    storage = create_storage(database=args.database, collection=args.collection)
+    retention = Retention(storage, args.collection, args.retention_days, args.archive_after_days)
+    retention.ensure_ttl()
+    archived, expired = retention.run_once()
+    print(f"{args.collection}: archived {archived}, expired {expired}")
+    return 0
+
+
+def build_filters(args):
+    """Storage filter dict from the FILTER_FIELDS options and --after/--before."""
+    filters = {name: getattr(args, name) for name in FILTER_FIELDS if getattr(args, name)}
+    if args.after:
+        filters['created_after'] = parse_time('--after', args.after)
+    if args.before:
+        filters['created_before'] = parse_time('--before', args.before)
+    return filters
+
+
+def archive_query(args):
+    from app.retention import JSON_OPTIONS, Archive
+
+    filters = build_filters(args)
+    archive = Archive(args.collection, action_field=args.action_field)
+    for document in archive.find(filters, args.limit):
+        sys.stdout.write(json_util.dumps(document, json_options=JSON_OPTIONS) + '\n')
+    return 0
+
+
+def export_data(args):
+    from app.export import parse_export
+    from app.storage import create_storage
+
+    export = parse_export({'format': args.format, 'fields': args.fields,
+                           'compress': args.compress})
+    storage = create_storage(database=args.database, collection=args.collection,
+                             action_field=args.action_field)
+    batches = storage.scan(build_filters(args), export.storage_fields(), args.batch_size)
+    output = open(args.output, 'wb') if args.output else sys.stdout.buffer
+    try:
+        for chunk in export.write(batches, storage.action_field):
+            output.write(chunk)
+    finally:
+        if args.output:
+            output.close()
+        storage.close()
+    return 0
+
+
+def export_summary(args):
+    from app.export import parse_summary, summarize
+    from app.storage import create_storage
+
+    summary = parse_summary({'top': args.top, 'bucket': args.bucket})
+    storage = create_storage(database=args.database, collection=args.collection,
+                             action_field=args.action_field)
+    try:
+        result = summarize(storage, build_filters(args), summary, args.batch_size)
+    finally:
+        storage.close()
+    sys.stdout.write(json.dumps(result, indent=2) + '\n')
+    return 0
+
+
+def schema_migrate(args):
+    from app.schema import SCHEMA_VERSION, migrate
+    from app.storage import create_storage
+
+    storage = create_storage(database=args.database, collection=args.collection)
+    verb = 'to migrate' if args.dry_run else 'migrated'
+
+    def progress(scanned, migrated):
+        print(f"   {scanned} scanned, {migrated} {verb}...")
+
+    try:
+        scanned, migrated = migrate(storage, args.batch_size, args.dry_run, progress)
+    finally:
+        storage.close()
+    print(f"{args.collection}: {scanned} documents, {migrated} {verb} to version {SCHEMA_VERSION}")
+    return 0
+
+
+def rollups_backfill(args):
+    """Recount a collection's hourly and daily rollups from its raw actions."""
+    from app.rollups import Rollups, rollup_prefix
+
+    if config.STORAGE_BACKEND != 'mongo':
+        raise ValueError("rollup collections are only kept on MongoDB; "
+                         f"STORAGE_BACKEND={config.STORAGE_BACKEND} counts at query time")
+    from app.extensions import mongo
+
+    db = mongo.get_client()[args.database]
+    rollups = Rollups(db, rollup_prefix(args.collection))
+    rollups.ensure_indexes()
+    print(f"Backfilling {rollups.prefix}_hourly/_daily from {args.database}.{args.collection}...")
+    total = rollups.backfill(db[args.collection], args.chunk_size, args.rebuild)
+    print(f"{args.collection}: rolled up {total} events")
+    return 0
+
+
+def startup_run(args):
+    """Run the startup tasks (indexes, MongoDB probe) once, e.g. as a deploy step."""
+    from app import create_app
+    from app.startup import startup
+
+    create_app(warm_up='off')
+    startup.warm_up()
+    failed = 0
+    for name, result in startup.stats().items():
+        print(f"{name}: {result['status']} in {result['seconds']}s"
+              + (f" ({result['error']})" if result['error'] else ''))
+        failed += result['status'] != 'done'
+    return 0 if not failed else 1
+
+
+def add_filter_arguments(command):
+    command.add_argument('--after', help="ISO 8601, inclusive")
+    command.add_argument('--before', help="ISO 8601, exclusive")
+    for name in FILTER_FIELDS:
+        command.add_argument(f"--{name.replace('_', '-')}", dest=name)
+
+
+def deadletters_list(args):
+    from app.fanout import DeadLetterStore
+
+    for record in DeadLetterStore().read(args.target):
+        sys.stdout.write(json.dumps(record) + '\n')
+    return 0
+
+
+def deadletters_replay(args):
+    """Send a target's dead letters once more; those that fail again stay."""
+    from app.fanout import DeadLetterStore, DeliveryFailed, Sender, load_subscriptions
+
+    subscription = next((subscription for subscription in load_subscriptions()
+                         if subscription.name == args.target), None)
+    if subscription is None:
+        raise ValueError(f"No subscription named {args.target} in SUBSCRIPTIONS_FILE")
+
+    store = DeadLetterStore()
+    sender = Sender(subscription)
+    delivered = 0
+    failed = []
+    try:
+        for record in store.read(args.target):
+            body = json.dumps(record['action']).encode('utf-8')
+            try:
+                sender.send(body, str(record['action'].get('id', '')), record['attempts'] + 1)
+                delivered += 1
+            except DeliveryFailed as e:
+                record['attempts'] += 1
+                record['error'] = str(e)
+                record['status'] = e.status
+                failed.append(record)
+    finally:
+        sender.close()
+    store.replace(args.target, failed)
+    print(f"{args.target}: delivered {delivered}, still failing {len(failed)}")
+    return 0 if not failed else 1
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='python -m app.cli', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    archive = commands.add_parser('archive', help="Archive old documents or query the archive")
+    archive_commands = archive.add_subparsers(dest='archive_command', required=True)
+
+    run = archive_commands.add_parser('run', help="Run one archive/expiry pass now")
+    run.add_argument('--collection', default=config.COLLECTION_NAME)
+    run.add_argument('--database', default=config.DATABASE_NAME)
+    run.add_argument('--retention-days', type=float, help="Default: RETENTION_DAYS")
+    run.add_argument('--archive-after-days', type=float, help="Default: ARCHIVE_AFTER_DAYS")
+    run.set_defaults(handler=archive_run)
+
+    query = archive_commands.add_parser('query', help="Stream archived documents as JSON lines")
+    query.add_argument('--collection', default=config.COLLECTION_NAME)
+    query.add_argument('--action-field', default='action',
+                       help="'type' for webhook_db.events archived before schema version 2")
+    query.add_argument('--limit', type=int)
+    add_filter_arguments(query)
+    query.set_defaults(handler=archive_query)
+
+    export = commands.add_parser('export', help="Export stored actions or summarize them")
+    export_commands = export.add_subparsers(dest='export_command', required=True)
+    data = export_commands.add_parser('data', help="Stream every matching action, oldest first")
+    data.add_argument('--format', default='ndjson', help="ndjson, csv, arrow or parquet")
+    data.add_argument('--fields', help="Comma-separated fields (default: the /api/actions ones)")
+    data.add_argument('--compress', action='store_true',
+                      help="gzip text formats, zstd buffers for arrow and parquet")
+    data.add_argument('--output', help="File to write (default: stdout)")
+    data.set_defaults(handler=export_data)
+    summary = export_commands.add_parser('summary', help="Action totals, top authors and "
+                                                         "per-branch histograms as JSON")
+    summary.add_argument('--top', type=int, default=10, help="Authors and branches listed")
+    summary.add_argument('--bucket', default='day', help="Histogram bucket: hour or day")
+    summary.set_defaults(handler=export_summary)
+    for command in (data, summary):
+        command.add_argument('--collection', default=config.COLLECTION_NAME)
+        command.add_argument('--database', default=config.DATABASE_NAME)
+        command.add_argument('--action-field', default='action',
+                             help="'type' for webhook_db.events not migrated to schema version 2")
+        command.add_argument('--batch-size', type=int, help="Default: EXPORT_BATCH_SIZE")
+        add_filter_arguments(command)
+
+    schema = commands.add_parser('schema', help="Bring stored documents to the current schema")
+    schema_commands = schema.add_subparsers(dest='schema_command', required=True)
+    migrate = schema_commands.add_parser('migrate', help="Rewrite outdated documents in chunks")
+    migrate.add_argument('--collection', default=config.COLLECTION_NAME)
+    migrate.add_argument('--database', default=config.DATABASE_NAME)
+    migrate.add_argument('--batch-size', type=int, help="Default: EXPORT_BATCH_SIZE")
+    migrate.add_argument('--dry-run', action='store_true', help="Count without writing")
+    migrate.set_defaults(handler=schema_migrate)
+
+    rollups = commands.add_parser('rollups', help="Maintain the /api/stats activity rollups")
+    rollups_commands = rollups.add_subparsers(dest='rollups_command', required=True)
+    backfill = rollups_commands.add_parser('backfill', help="Recount rollups from the raw actions")
+    backfill.add_argument('--collection', default=config.COLLECTION_NAME)
+    backfill.add_argument('--database', default=config.DATABASE_NAME)
+    backfill.add_argument('--chunk-size', type=int, default=config.ROLLUP_BACKFILL_CHUNK)
+    backfill.add_argument('--rebuild', action='store_true',
+                          help="Clear existing counters before recounting")
+    backfill.set_defaults(handler=rollups_backfill)
+
+    startup = commands.add_parser('startup', help="Run the worker startup tasks")
+    startup_commands = startup.add_subparsers(dest='startup_command', required=True)
+    run = startup_commands.add_parser('run', help="Create indexes and probe MongoDB now")
+    run.set_defaults(handler=startup_run)
+
+    deadletters = commands.add_parser('deadletters', help="Inspect or replay failed forwards")
+    deadletters_commands = deadletters.add_subparsers(dest='deadletters_command', required=True)
+    for name, handler, help_text in (
+            ('list', deadletters_list, "Print a target's dead letters as JSON lines"),
+            ('replay', deadletters_replay, "Send a target's dead letters again")):
+        command = deadletters_commands.add_parser(name, help=help_text)
+        command.add_argument('--target', required=True, help="Subscription name")
+        command.set_defaults(handler=handler)
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    try:
+        return args.handler(args)
+    except ValueError as e:
+        parser.error(str(e))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
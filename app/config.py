@@ -0,0 +1,176 @@
+import os
+
+# Application server (gunicorn.conf.py). SERVER_PROFILE is one of: sync (one
+# request per worker process), gthread (WEB_THREADS threads per worker) or
+# gevent (WEB_WORKER_CONNECTIONS greenlets per worker; needs the gevent package)
+SERVER_PROFILE = os.getenv('SERVER_PROFILE', 'gthread')
+WEB_BIND = os.getenv('WEB_BIND', f"0.0.0.0:{os.getenv('PORT', '5000')}")
+WEB_WORKERS = int(os.getenv('WEB_WORKERS', '4'))
+WEB_THREADS = int(os.getenv('WEB_THREADS', '32'))
+WEB_WORKER_CONNECTIONS = int(os.getenv('WEB_WORKER_CONNECTIONS', '1000'))
+WEB_TIMEOUT = int(os.getenv('WEB_TIMEOUT', '30'))
+
+# Startup tasks (index creation, the MongoDB probe), run once per worker process.
+# STARTUP_WARM_UP is one of: background (a thread started by create_app),
+# request (before the first request) or off (only `python -m app.cli startup run`)
+STARTUP_WARM_UP = os.getenv('STARTUP_WARM_UP', 'background')
+
+# Storage backend: mongo, sqlite or memory
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'mongo')
+SQLITE_PATH = os.getenv('SQLITE_PATH', 'webhooks.db')
+MEMORY_CAPACITY = int(os.getenv('MEMORY_CAPACITY', '100000'))
+
+# MongoDB configuration
+MONGO_URI = os.getenv('MONGO_URI', 'mongodb://localhost:27017/')
+DATABASE_NAME = 'github_webhooks'
+COLLECTION_NAME = 'actions'
+
+# MongoDB client: pool per worker process, timeouts and write concern
+# MONGO_SERVER_API pins the Stable API version (e.g. "1" for Atlas); empty to skip
+MONGO_MAX_POOL_SIZE = int(os.getenv('MONGO_MAX_POOL_SIZE', '20'))
+MONGO_MIN_POOL_SIZE = int(os.getenv('MONGO_MIN_POOL_SIZE', '2'))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv('MONGO_WAIT_QUEUE_TIMEOUT_MS', '2000'))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv('MONGO_SERVER_SELECTION_TIMEOUT_MS', '3000'))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv('MONGO_CONNECT_TIMEOUT_MS', '3000'))
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv('MONGO_SOCKET_TIMEOUT_MS', '10000'))
+MONGO_WRITE_CONCERN = os.getenv('MONGO_WRITE_CONCERN', '1')
+MONGO_SERVER_API = os.getenv('MONGO_SERVER_API', '')
+
+# Webhook signatures: WEBHOOK_SECRETS lists every active secret (comma-separated,
+# for rotation); WEBHOOK_SECRET is the single-secret fallback
+WEBHOOK_SECRETS = [secret.strip() for secret in os.getenv(
+    'WEBHOOK_SECRETS', os.getenv('WEBHOOK_SECRET', 'your-webhook-secret-here')).split(',')
+    if secret.strip()]
+# Largest body accepted on the webhook endpoints (GitHub caps deliveries at 25 MB)
+WEBHOOK_MAX_BYTES = int(os.getenv('WEBHOOK_MAX_BYTES', str(25 * 1024 * 1024)))
+WEBHOOK_CHUNK_SIZE = int(os.getenv('WEBHOOK_CHUNK_SIZE', '65536'))
+# Tenants: TENANTS_FILE is a JSON object of tenant name -> settings (secrets,
+# collection, repositories, retention_days, rate_limit, burst); deliveries to
+# /webhook/<tenant> use that tenant's, /webhook uses the "default" tenant
+TENANTS_FILE = os.getenv('TENANTS_FILE', '')
+# Default rate limit per repository (deliveries per second, 0 = unlimited) and
+# burst; every worker process keeps its own buckets, so the limits are per worker
+TENANT_RATE_LIMIT = float(os.getenv('TENANT_RATE_LIMIT', '0'))
+TENANT_BURST = float(os.getenv('TENANT_BURST', '0'))
+RATE_LIMIT_MAX_KEYS = int(os.getenv('RATE_LIMIT_MAX_KEYS', '10000'))
+# Payload decoder: auto (orjson when installed, else stdlib), orjson, stdlib,
+# or pruning (keeps only the fields we read: less memory, more CPU)
+WEBHOOK_DECODER = os.getenv('WEBHOOK_DECODER', 'auto')
+
+# Ingest queue configuration
+# INGEST_BACKPRESSURE is one of: block, reject, drop_oldest
+INGEST_QUEUE_SIZE = int(os.getenv('INGEST_QUEUE_SIZE', '10000'))
+INGEST_BACKPRESSURE = os.getenv('INGEST_BACKPRESSURE', 'block')
+INGEST_BLOCK_TIMEOUT = float(os.getenv('INGEST_BLOCK_TIMEOUT', '2.0'))
+INGEST_SHUTDOWN_TIMEOUT = float(os.getenv('INGEST_SHUTDOWN_TIMEOUT', '10.0'))
+
+# Admission control per worker (app/admission.py): ADMISSION_INGEST_CONCURRENCY
+# deliveries enqueueing and ADMISSION_READ_CONCURRENCY /api/actions storage reads
+# at once. The read limit shrinks by ADMISSION_BACKOFF whenever a storage call
+# takes over ADMISSION_TARGET_MS and grows back by one per faster call.
+# Deliveries are shed (503 + Retry-After) once their ingest queue is
+# ADMISSION_QUEUE_HIGH full; reads yield (stale feed or 503) at ADMISSION_READ_YIELD
+ADMISSION_ENABLED = os.getenv('ADMISSION_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+ADMISSION_INGEST_CONCURRENCY = int(os.getenv('ADMISSION_INGEST_CONCURRENCY', '64'))
+ADMISSION_READ_CONCURRENCY = int(os.getenv('ADMISSION_READ_CONCURRENCY', '16'))
+ADMISSION_TARGET_MS = float(os.getenv('ADMISSION_TARGET_MS', '250'))
+ADMISSION_BACKOFF = float(os.getenv('ADMISSION_BACKOFF', '0.9'))
+ADMISSION_QUEUE_HIGH = float(os.getenv('ADMISSION_QUEUE_HIGH', '0.9'))
+ADMISSION_READ_YIELD = float(os.getenv('ADMISSION_READ_YIELD', '0.5'))
+
+# Write batching: a batch is flushed at INGEST_BATCH_SIZE documents or
+# INGEST_BATCH_DELAY_MS after its first document, whichever comes first
+INGEST_BATCH_SIZE = int(os.getenv('INGEST_BATCH_SIZE', '100'))
+INGEST_BATCH_DELAY_MS = float(os.getenv('INGEST_BATCH_DELAY_MS', '50'))
+
+# Write-ahead spool for batches written while the database is unreachable;
+# replayed SPOOL_REPLAY_BATCH documents at a time, at most SPOOL_REPLAY_RATE
+# per second, retrying every SPOOL_RETRY_SECONDS up to SPOOL_RETRY_MAX_SECONDS
+SPOOL_ENABLED = os.getenv('SPOOL_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+SPOOL_DIR = os.getenv('SPOOL_DIR', os.path.join('logs', 'spool'))
+SPOOL_SEGMENT_BYTES = int(os.getenv('SPOOL_SEGMENT_BYTES', str(16 * 1024 * 1024)))
+SPOOL_MAX_BYTES = int(os.getenv('SPOOL_MAX_BYTES', str(1024 * 1024 * 1024)))
+SPOOL_REPLAY_BATCH = int(os.getenv('SPOOL_REPLAY_BATCH', '200'))
+SPOOL_REPLAY_RATE = float(os.getenv('SPOOL_REPLAY_RATE', '1000'))
+SPOOL_RETRY_SECONDS = float(os.getenv('SPOOL_RETRY_SECONDS', '1'))
+SPOOL_RETRY_MAX_SECONDS = float(os.getenv('SPOOL_RETRY_MAX_SECONDS', '30'))
+
+# Retention: documents older than RETENTION_DAYS are deleted (a TTL index on
+# MongoDB); with ARCHIVE_AFTER_DAYS they are first moved into gzip JSONL files
+# under ARCHIVE_DIR, one per collection and UTC day. 0 disables either.
+RETENTION_DAYS = float(os.getenv('RETENTION_DAYS', '0'))
+ARCHIVE_AFTER_DAYS = float(os.getenv('ARCHIVE_AFTER_DAYS', '0'))
+ARCHIVE_DIR = os.getenv('ARCHIVE_DIR', os.path.join('logs', 'archive'))
+ARCHIVE_INTERVAL_SECONDS = float(os.getenv('ARCHIVE_INTERVAL_SECONDS', '3600'))
+ARCHIVE_BATCH = int(os.getenv('ARCHIVE_BATCH', '5000'))
+# Newest documents mirrored into a capped <collection>_hot collection for the
+# dashboard feed (MongoDB only, 0 = disabled)
+HOT_TIER_SIZE = int(os.getenv('HOT_TIER_SIZE', '0'))
+
+# Outbound fan-out: SUBSCRIPTIONS_FILE is a JSON object of subscription name ->
+# settings (url, secret/secret_env, actions, repositories, tenants,
+# concurrency, timeout, max_attempts); the FANOUT_* values are the defaults
+SUBSCRIPTIONS_FILE = os.getenv('SUBSCRIPTIONS_FILE', '')
+FANOUT_QUEUE_SIZE = int(os.getenv('FANOUT_QUEUE_SIZE', '10000'))
+FANOUT_CONCURRENCY = int(os.getenv('FANOUT_CONCURRENCY', '4'))
+FANOUT_TIMEOUT = float(os.getenv('FANOUT_TIMEOUT', '5'))
+FANOUT_MAX_ATTEMPTS = int(os.getenv('FANOUT_MAX_ATTEMPTS', '6'))
+FANOUT_RETRY_SECONDS = float(os.getenv('FANOUT_RETRY_SECONDS', '1'))
+FANOUT_RETRY_MAX_SECONDS = float(os.getenv('FANOUT_RETRY_MAX_SECONDS', '60'))
+FANOUT_SHUTDOWN_TIMEOUT = float(os.getenv('FANOUT_SHUTDOWN_TIMEOUT', '5'))
+DEAD_LETTER_DIR = os.getenv('DEAD_LETTER_DIR', os.path.join('logs', 'dead_letters'))
+
+# Prometheus metrics on /metrics: each worker flushes its values to
+# METRICS_DIR/<pid>.json every METRICS_FLUSH_SECONDS and a scrape merges them
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+METRICS_DIR = os.getenv('METRICS_DIR', os.path.join('logs', 'metrics'))
+METRICS_FLUSH_SECONDS = float(os.getenv('METRICS_FLUSH_SECONDS', '5'))
+
+# Cross-worker event bus for the feed cache and live streams: EVENT_BUS is one
+# of none, memory (one process, for tests), socket (Unix datagram sockets under
+# BUS_DIR, one host) or mongo (change streams, needs a replica set).
+# Notifications are coalesced for up to BUS_FLUSH_MS or BUS_BATCH_SIZE actions
+EVENT_BUS = os.getenv('EVENT_BUS', 'none')
+BUS_DIR = os.getenv('BUS_DIR', os.path.join('logs', 'bus'))
+BUS_FLUSH_MS = float(os.getenv('BUS_FLUSH_MS', '20'))
+BUS_BATCH_SIZE = int(os.getenv('BUS_BATCH_SIZE', '200'))
+
+# Delivery deduplication (X-GitHub-Delivery)
+# DEDUP_EVICTION is one of: lru, fifo
+DEDUP_CACHE_SIZE = int(os.getenv('DEDUP_CACHE_SIZE', '50000'))
+DEDUP_TTL_SECONDS = float(os.getenv('DEDUP_TTL_SECONDS', '21600'))
+DEDUP_EVICTION = os.getenv('DEDUP_EVICTION', 'lru')
+
+# /api/actions feed cache: newest FEED_CACHE_SIZE actions, reloaded from the
+# database at most every FEED_CACHE_TTL seconds (bounds cross-worker staleness)
+FEED_CACHE_SIZE = int(os.getenv('FEED_CACHE_SIZE', '50'))
+FEED_CACHE_TTL = float(os.getenv('FEED_CACHE_TTL', '5'))
+
+# Live action stream (/api/actions/stream and /api/actions/poll)
+STREAM_HISTORY = int(os.getenv('STREAM_HISTORY', '500'))
+STREAM_KEEPALIVE = float(os.getenv('STREAM_KEEPALIVE', '15'))
+STREAM_MAX_SECONDS = float(os.getenv('STREAM_MAX_SECONDS', '300'))
+STREAM_RETRY_MS = int(os.getenv('STREAM_RETRY_MS', '3000'))
+LONGPOLL_TIMEOUT = float(os.getenv('LONGPOLL_TIMEOUT', '25'))
+
+# Paged queries on /api/actions and /webhook/events
+PAGE_SIZE_DEFAULT = int(os.getenv('PAGE_SIZE_DEFAULT', '50'))
+PAGE_SIZE_MAX = int(os.getenv('PAGE_SIZE_MAX', '200'))
+
+# /api/search: at most SEARCH_LIMIT_MAX results per request, ranked among the
+# newest SEARCH_SCAN_LIMIT matches; MongoDB queries give up after SEARCH_TIMEOUT_MS.
+# Pushes keep the first line of up to COMMIT_MESSAGES_MAX commit messages
+# (COMMIT_MESSAGE_LENGTH characters each) for the text index
+SEARCH_LIMIT_MAX = int(os.getenv('SEARCH_LIMIT_MAX', '1000'))
+SEARCH_SCAN_LIMIT = int(os.getenv('SEARCH_SCAN_LIMIT', '5000'))
+SEARCH_TIMEOUT_MS = int(os.getenv('SEARCH_TIMEOUT_MS', '2000'))
+COMMIT_MESSAGES_MAX = int(os.getenv('COMMIT_MESSAGES_MAX', '20'))
+COMMIT_MESSAGE_LENGTH = int(os.getenv('COMMIT_MESSAGE_LENGTH', '200'))
+
+# /api/export and `python -m app.cli export`: documents read from storage per batch
+# (one batch, and one written chunk, is held in memory at a time)
+EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', '5000'))
+
+# Activity rollups
+ROLLUP_PREFIX = os.getenv('ROLLUP_PREFIX', 'rollups')
+ROLLUP_BACKFILL_CHUNK = int(os.getenv('ROLLUP_BACKFILL_CHUNK', '5000'))
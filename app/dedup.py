@@ -0,0 +1,104 @@
+import threading
+import time
+from collections import OrderedDict
+
+from app import config
+
+EVICTION_POLICIES = ('lru', 'fifo')
+
+# Documents carry the X-GitHub-Delivery GUID in this field
+DELIVERY_FIELD = 'delivery_id'
+
+
+class DeliveryCache:
+    """Bounded, process-local record of recently accepted X-GitHub-Delivery ids.
+
+    Handlers ``check`` a delivery before doing any work and ``add`` it only
+    once the event is queued, so a failed attempt never blocks GitHub's retry.
+    Two copies racing through different workers are caught by the unique index.
+
+    Entries expire after ``ttl`` seconds and the cache never holds more than
+    ``maxsize`` ids. With ``lru`` eviction a repeat delivery refreshes its
+    entry; with ``fifo`` the oldest delivery is evicted first regardless.
+    """
+
+    def __init__(self, maxsize=None, ttl=None, eviction=None):
+        eviction = eviction or config.DEDUP_EVICTION
+        if eviction not in EVICTION_POLICIES:
+            raise ValueError(f"Unknown eviction policy: {eviction}")
+
+        self.maxsize = maxsize or config.DEDUP_CACHE_SIZE
+        self.ttl = config.DEDUP_TTL_SECONDS if ttl is None else ttl
+        self.eviction = eviction
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def check(self, delivery_id):
+        """Return True if the delivery was already accepted and has not expired."""
+        now = time.monotonic()
+        with self._lock:
+            expires = self._entries.get(delivery_id)
+            if expires is not None and expires > now:
+                self.hits += 1
+                if self.eviction == 'lru':
+                    self._entries.move_to_end(delivery_id)
+                return True
+
+            if expires is not None:
+                self.expirations += 1
+                del self._entries[delivery_id]
+            self.misses += 1
+            return False
+
+    def add(self, delivery_id):
+        """Remember a delivery once it has been accepted for storage."""
+        now = time.monotonic()
+        with self._lock:
+            self._entries[delivery_id] = now + self.ttl
+            self._entries.move_to_end(delivery_id)
+            self._evict(now)
+
+    def stats(self):
+        """Return cache size and hit/miss counters."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'capacity': self.maxsize,
+                'ttl_seconds': self.ttl,
+                'eviction': self.eviction,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
+
+    def _evict(self, now):
+        # Expired entries sit at the front in fifo order; in lru order they are
+        # only approximately there, which is fine since size is the hard bound
+        while self._entries:
+            oldest_id, expires = next(iter(self._entries.items()))
+            if expires > now:
+                break
+            del self._entries[oldest_id]
+            self.expirations += 1
+
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+
+def ensure_delivery_index(collection):
+    """Create the unique index that rejects a delivery already stored by another worker."""
+    collection.create_index(
+        [(DELIVERY_FIELD, 1)],
+        name='delivery_id_unique',
+        unique=True,
+        partialFilterExpression={DELIVERY_FIELD: {'$type': 'string'}},
+    )
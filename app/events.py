@@ -0,0 +1,311 @@
+"""
+Normalization of GitHub deliveries into one event record.
+
+Every supported (X-GitHub-Event, payload action) pair maps to a pure
+normalizer function, registered with ``@normalizer`` into the ``NORMALIZERS``
+dispatch table. ``(event, None)`` entries handle every action of an event.
+Both webhook endpoints turn deliveries into the same ``WebhookEvent`` through
+``extract_event`` and decide for themselves which ones to store.
+
+Bodies are decoded according to WEBHOOK_DECODER:
+
+    auto      orjson when it is installed, else stdlib (the default)
+    orjson    the full document, with the orjson package
+    stdlib    the full document, with json.loads
+    pruning   the stdlib decoder with an ``object_pairs_hook`` that keeps
+              only the keys the event's normalizers read, so commit
+              authors, repository dicts and file lists are dropped as soon
+              as they are decoded (a push keeps each commit's message,
+              summarized for search)
+
+A push delivery can carry thousands of commits, yet an action only needs
+the pusher, the ref and the head commit's timestamp. ``pruning`` trades CPU
+for memory: on a 1000-commit push its peak memory is a third of a full
+decode, but it takes 1.6 to 2 times the CPU of json.loads (about 1.2 times
+at 5000 commits), and orjson is faster still (benchmarks/bench_extraction.py).
+Only choose it where workers are short of memory rather than CPU.
+``check_decoder`` validates the setting once, when the app is created.
+"""
+import json
+
+from app import config
+from app.metrics import INGEST_STAGE_SECONDS
+
+try:
+    import orjson
+except ImportError:  # optional, the stdlib decoder is the fallback
+    orjson = None
+
+DECODERS = ('auto', 'orjson', 'stdlib', 'pruning')
+
+# How a review state reads in an activity line ("<author> approved the pull request ...")
+REVIEW_VERBS = {'approved': 'approved', 'changes_requested': 'requested changes on',
+                'commented': 'commented on', 'dismissed': 'dismissed a review on'}
+
+# Stripped from git refs, so branches keep their full name (release/1.2, not 1.2)
+REF_PREFIXES = ('refs/heads/', 'refs/tags/')
+
+# (event, action) -> normalizer; action None matches any action
+NORMALIZERS = {}
+# event -> every object key its normalizers read, for the pruning decoder
+EVENT_KEYS = {}
+# Keys read for every event, by extract_event itself
+COMMON_KEYS = frozenset({'action', 'repository', 'full_name'})
+
+
+class WebhookEvent:
+    """The fields an action is built from, independent of the event's payload shape.
+
+    ``action`` is the normalized action (push, pull_request, merge, create,
+    delete, release, review, workflow_run or check_suite); ``event_action``
+    is the payload's own action (opened, closed, completed, ...).
+    ``timestamp`` is the time GitHub reports for the event, if any.
+    ``ref_type`` (branch/tag), ``state`` (review state, run conclusion) and
+    ``name`` (release tag, workflow or app name) are set where they apply.
+    ``repository`` is the delivering repository's ``owner/name``.
+    ``messages`` holds a push's commit summaries (first lines, newest last).
+    """
+
+    __slots__ = ('event', 'action', 'event_action', 'author', 'from_branch', 'to_branch',
+                 'timestamp', 'ref_type', 'state', 'name', 'repository', 'messages')
+
+    def __init__(self, event, action, author, to_branch, from_branch=None, timestamp=None,
+                 event_action=None, ref_type=None, state=None, name=None, repository=None,
+                 messages=()):
+        self.event = event
+        self.action = action
+        self.event_action = event_action
+        self.author = author
+        self.from_branch = from_branch
+        self.to_branch = to_branch
+        self.timestamp = timestamp
+        self.ref_type = ref_type
+        self.state = state
+        self.name = name
+        self.repository = repository
+        self.messages = messages
+
+    def __repr__(self):
+        return (f'WebhookEvent({self.action!r}, author={self.author!r}, '
+                f'from={self.from_branch!r}, to={self.to_branch!r})')
+
+
+def normalizer(event, *actions, keys):
+    """Register a normalizer for ``event`` (all actions unless ``actions`` are given).
+
+    ``keys`` names every object key the function reads, at any depth;
+    ``repository.full_name`` is kept for every event.
+    """
+    def register(func):
+        for action in actions or (None,):
+            NORMALIZERS[(event, action)] = func
+        EVENT_KEYS[event] = EVENT_KEYS.get(event, COMMON_KEYS) | frozenset(keys)
+        return func
+    return register
+
+
+def _login(user):
+    return (user or {}).get('login', 'Unknown')
+
+
+def branch_name(ref, default='Unknown'):
+    """The branch (or tag) a ref names, in full: ``refs/heads/release/1.2`` is ``release/1.2``."""
+    if not ref:
+        return default
+    for prefix in REF_PREFIXES:
+        if ref.startswith(prefix):
+            return ref[len(prefix):]
+    return ref
+
+
+def commit_summaries(commits, limit=None, length=None):
+    """First line of each commit message, for search: the newest ``limit``, cut at ``length``."""
+    limit = config.COMMIT_MESSAGES_MAX if limit is None else limit
+    length = length or config.COMMIT_MESSAGE_LENGTH
+    summaries = []
+    if not limit:
+        return summaries
+    for commit in commits[-limit:]:
+        message = (commit or {}).get('message') or ''
+        summary = message.split('\n', 1)[0].strip()[:length]
+        if summary:
+            summaries.append(summary)
+    return summaries
+
+
+@normalizer('push', keys=('ref', 'pusher', 'name', 'head_commit', 'timestamp',
+                          'commits', 'message'))
+def normalize_push(payload):
+    head_commit = payload.get('head_commit') or {}
+    return WebhookEvent(
+        'push', 'push',
+        author=(payload.get('pusher') or {}).get('name', 'Unknown'),
+        to_branch=branch_name(payload.get('ref')),
+        timestamp=head_commit.get('timestamp'),
+        # GitHub lists at most 20 commits, oldest first; head_commit covers pushes without them
+        messages=commit_summaries(payload.get('commits') or [head_commit]),
+    )
+
+
+@normalizer('pull_request', keys=('pull_request', 'user', 'login', 'head', 'base', 'ref',
+                                  'merged', 'merged_at', 'created_at'))
+def normalize_pull_request(payload):
+    pr_data = payload.get('pull_request') or {}
+    pr_action = payload.get('action')
+    merged = pr_action == 'closed' and pr_data.get('merged') is True
+    return WebhookEvent(
+        'pull_request', 'merge' if merged else 'pull_request',
+        author=_login(pr_data.get('user')),
+        from_branch=branch_name((pr_data.get('head') or {}).get('ref')),
+        to_branch=branch_name((pr_data.get('base') or {}).get('ref')),
+        timestamp=pr_data.get('merged_at') if merged else pr_data.get('created_at'),
+        event_action=pr_action,
+    )
+
+
+@normalizer('create', keys=('ref', 'ref_type', 'sender', 'login'))
+def normalize_create(payload):
+    return WebhookEvent(
+        'create', 'create',
+        author=_login(payload.get('sender')),
+        to_branch=payload.get('ref', 'Unknown'),
+        ref_type=payload.get('ref_type'),
+    )
+
+
+@normalizer('delete', keys=('ref', 'ref_type', 'sender', 'login'))
+def normalize_delete(payload):
+    return WebhookEvent(
+        'delete', 'delete',
+        author=_login(payload.get('sender')),
+        to_branch=payload.get('ref', 'Unknown'),
+        ref_type=payload.get('ref_type'),
+    )
+
+
+@normalizer('release', 'published', keys=('release', 'author', 'login', 'tag_name',
+                                           'target_commitish', 'published_at'))
+def normalize_release(payload):
+    release = payload.get('release') or {}
+    return WebhookEvent(
+        'release', 'release',
+        author=_login(release.get('author')),
+        to_branch=release.get('target_commitish', 'Unknown'),
+        timestamp=release.get('published_at'),
+        event_action=payload.get('action'),
+        name=release.get('tag_name'),
+    )
+
+
+@normalizer('pull_request_review', 'submitted',
+            keys=('review', 'user', 'login', 'state', 'submitted_at', 'pull_request',
+                  'head', 'base', 'ref'))
+def normalize_pull_request_review(payload):
+    review = payload.get('review') or {}
+    pr_data = payload.get('pull_request') or {}
+    return WebhookEvent(
+        'pull_request_review', 'review',
+        author=_login(review.get('user')),
+        from_branch=branch_name((pr_data.get('head') or {}).get('ref')),
+        to_branch=branch_name((pr_data.get('base') or {}).get('ref')),
+        timestamp=review.get('submitted_at'),
+        event_action=payload.get('action'),
+        state=review.get('state'),
+    )
+
+
+@normalizer('workflow_run', 'completed',
+            keys=('workflow_run', 'actor', 'login', 'head_branch', 'name', 'conclusion',
+                  'status', 'updated_at'))
+def normalize_workflow_run(payload):
+    run = payload.get('workflow_run') or {}
+    return WebhookEvent(
+        'workflow_run', 'workflow_run',
+        author=_login(run.get('actor')),
+        to_branch=run.get('head_branch') or 'Unknown',
+        timestamp=run.get('updated_at'),
+        event_action=payload.get('action'),
+        state=run.get('conclusion') or run.get('status'),
+        name=run.get('name'),
+    )
+
+
+@normalizer('check_suite', 'completed',
+            keys=('check_suite', 'app', 'name', 'head_branch', 'conclusion', 'status',
+                  'updated_at', 'sender', 'login'))
+def normalize_check_suite(payload):
+    suite = payload.get('check_suite') or {}
+    return WebhookEvent(
+        'check_suite', 'check_suite',
+        author=_login(payload.get('sender')),
+        to_branch=suite.get('head_branch') or 'Unknown',
+        timestamp=suite.get('updated_at'),
+        event_action=payload.get('action'),
+        state=suite.get('conclusion') or suite.get('status'),
+        name=(suite.get('app') or {}).get('name'),
+    )
+
+
+def _pruning_decoder(keys):
+    return json.JSONDecoder(
+        object_pairs_hook=lambda pairs: {key: value for key, value in pairs if key in keys})
+
+
+_PRUNING_DECODERS = {event: _pruning_decoder(keys) for event, keys in EVENT_KEYS.items()}
+
+
+def check_decoder(decoder=None):
+    """The decoder ``decoder`` (default: WEBHOOK_DECODER) stands for, ``auto`` resolved.
+
+    Raises ValueError for an unknown decoder and ImportError for orjson
+    without the package.
+    """
+    decoder = decoder or config.WEBHOOK_DECODER
+    if decoder not in DECODERS:
+        raise ValueError(f"Unknown WEBHOOK_DECODER: {decoder} "
+                         f"(expected one of {', '.join(DECODERS)})")
+    if decoder == 'auto':
+        return 'orjson' if orjson is not None else 'stdlib'
+    if decoder == 'orjson' and orjson is None:
+        raise ImportError("WEBHOOK_DECODER=orjson requires the orjson package")
+    return decoder
+
+
+def decode(body, event=None, decoder=None):
+    """Decode a delivery body with ``decoder`` (default: WEBHOOK_DECODER).
+
+    Raises ValueError for invalid JSON or a body that is not a JSON object.
+    """
+    decoder = check_decoder(decoder)
+    if decoder == 'orjson':
+        payload = orjson.loads(body)
+    elif decoder == 'pruning' and event in _PRUNING_DECODERS:
+        text = body.decode('utf-8') if isinstance(body, (bytes, bytearray)) else body
+        payload = _PRUNING_DECODERS[event].decode(text)
+    else:
+        payload = json.loads(body)
+
+    if not isinstance(payload, dict):
+        raise ValueError("Payload must be a JSON object")
+    return payload
+
+
+def find_normalizer(event, action):
+    """The normalizer for ``(event, action)``, falling back to the event's catch-all."""
+    return NORMALIZERS.get((event, action)) or NORMALIZERS.get((event, None))
+
+
+def extract_event(event, body, decoder=None):
+    """The WebhookEvent for a raw delivery, or None for deliveries we don't record."""
+    if event not in EVENT_KEYS:
+        # Unknown event types are answered without decoding the body
+        return None
+    with INGEST_STAGE_SECONDS.time('parse'):
+        payload = decode(body, event, decoder)
+    func = find_normalizer(event, payload.get('action'))
+    if func is None:
+        return None
+    with INGEST_STAGE_SECONDS.time('normalize'):
+        result = func(payload)
+        result.repository = (payload.get('repository') or {}).get('full_name')
+    return result
@@ -0,0 +1,306 @@
+"""
+Bulk export of stored actions, behind /api/export and ``python -m app.cli export``.
+
+Storage hands over matching documents oldest first in batches of
+EXPORT_BATCH_SIZE (``Storage.scan``: one MongoDB cursor with a server-side
+projection, keyset batches on SQLite), each batch is turned into columns
+once and written out as one chunk, so memory stays at about one batch
+however large the collection is. Output is NDJSON, CSV, an Arrow IPC
+stream (one record batch per chunk) or Parquet (one row group per chunk);
+the last two need the optional pyarrow package. ``compress`` gzips the text
+formats and switches the binary ones to zstd-compressed buffers.
+
+``Summary`` computes totals per action, the top authors and per-branch
+histograms from the same column batches, with Counter updates over whole
+columns instead of a Python loop per document.
+"""
+import csv
+import importlib.util
+import io
+import json
+import zlib
+from collections import Counter
+from datetime import datetime
+from operator import methodcaller
+
+from app import config
+from app.queries import QueryError
+
+# Optional, only the arrow and parquet formats need it; imported on first use
+# since it is as slow to import as the rest of the app
+HAS_PYARROW = importlib.util.find_spec('pyarrow') is not None
+
+# format -> (mimetype, file extension)
+FORMATS = {
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'csv': ('text/csv', 'csv'),
+    'arrow': ('application/vnd.apache.arrow.stream', 'arrows'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+BINARY_FORMATS = ('arrow', 'parquet')
+
+# Fields an export can ask for, and the ones it gets by default
+FIELDS = ('id', 'created_at', 'timestamp', 'epoch', 'action', 'author', 'from_branch',
+          'to_branch', 'repository', 'tenant', 'ref_type', 'state', 'name', 'commit_messages',
+          'display_text', 'delivery_id', 'request_id', 'schema_version')
+DEFAULT_FIELDS = ('id', 'created_at', 'action', 'author', 'from_branch', 'to_branch',
+                  'repository', 'tenant', 'timestamp')
+LIST_FIELDS = ('commit_messages',)
+
+# Summary histogram buckets: each maps a created_at column to its bucket keys
+BUCKETS = {
+    'hour': methodcaller('replace', minute=0, second=0, microsecond=0),
+    'day': methodcaller('date'),
+}
+TOP_MAX = 1000
+
+
+class Export:
+    """A parsed export request: output format, fields (in column order) and compression."""
+
+    __slots__ = ('format', 'fields', 'compress')
+
+    def __init__(self, format='ndjson', fields=None, compress=False):
+        self.format = format
+        self.fields = tuple(fields or DEFAULT_FIELDS)
+        self.compress = compress
+
+    @property
+    def mimetype(self):
+        if self.compress and self.format not in BINARY_FORMATS:
+            return 'application/gzip'
+        return FORMATS[self.format][0]
+
+    def filename(self, name):
+        extension = FORMATS[self.format][1]
+        if self.compress and self.format not in BINARY_FORMATS:
+            extension += '.gz'
+        return f'{name}.{extension}'
+
+    def storage_fields(self):
+        """What to ask ``Storage.scan`` for (``_id`` always comes back)."""
+        return [name for name in self.fields if name != 'id']
+
+    def write(self, batches, action_field='action'):
+        """Encode an iterator of document batches; yields one bytes chunk per batch."""
+        column_batches = (to_columns(batch, self.fields, action_field) for batch in batches)
+        if self.format == 'arrow':
+            return write_arrow(column_batches, self.fields, self.compress)
+        if self.format == 'parquet':
+            return write_parquet(column_batches, self.fields, self.compress)
+        writer = write_csv if self.format == 'csv' else write_ndjson
+        chunks = writer(column_batches, self.fields)
+        return gzip_chunks(chunks) if self.compress else chunks
+
+
+def parse_export(args):
+    """Build an Export from query-string (or CLI) arguments; raises QueryError when malformed."""
+    format = args.get('format') or 'ndjson'
+    if format not in FORMATS:
+        raise QueryError(f"format must be one of {', '.join(FORMATS)}")
+    if format in BINARY_FORMATS and not HAS_PYARROW:
+        raise QueryError(f"format={format} requires the pyarrow package")
+
+    fields = None
+    if args.get('fields'):
+        fields = [name.strip() for name in args['fields'].split(',') if name.strip()]
+        unknown = [name for name in fields if name not in FIELDS]
+        if unknown or not fields:
+            raise QueryError(f"fields must be a comma-separated list of {', '.join(FIELDS)}")
+    compress = str(args.get('compress', '')).lower() in ('1', 'true', 'yes', 'gzip')
+    return Export(format, fields, compress)
+
+
+def to_columns(batch, fields, action_field='action'):
+    """One list per field, in ``fields`` order, for a batch of stored documents."""
+    columns = {}
+    for name in fields:
+        if name == 'id':
+            columns[name] = [str(document['_id']) for document in batch]
+        else:
+            key = action_field if name == 'action' else name
+            columns[name] = [document.get(key) for document in batch]
+    return columns
+
+
+def text_columns(columns):
+    """created_at as ISO 8601 text, for the text formats."""
+    if 'created_at' in columns:
+        columns['created_at'] = list(map(datetime.isoformat, columns['created_at']))
+    return columns
+
+
+def write_ndjson(column_batches, fields):
+    for columns in column_batches:
+        columns = text_columns(columns)
+        lines = [json.dumps(dict(zip(fields, row)), separators=(',', ':'), default=str)
+                 for row in zip(*columns.values())]
+        if lines:
+            yield ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+def write_csv(column_batches, fields):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    for columns in column_batches:
+        columns = text_columns(columns)
+        for name in LIST_FIELDS:
+            if name in columns:
+                # One summary per line inside the quoted cell
+                columns[name] = ['\n'.join(value) if value else None for value in columns[name]]
+        writer.writerows(zip(*columns.values()))
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        # Nothing matched: the header alone
+        yield buffer.getvalue().encode('utf-8')
+
+
+def gzip_chunks(chunks):
+    """Stream ``chunks`` through gzip, one compressed chunk out per chunk in."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def arrow_schema(fields):
+    import pyarrow
+
+    types = {'created_at': pyarrow.timestamp('us'), 'epoch': pyarrow.float64(),
+             'schema_version': pyarrow.int32(),
+             'commit_messages': pyarrow.list_(pyarrow.string())}
+    return pyarrow.schema([(name, types.get(name, pyarrow.string())) for name in fields])
+
+
+class ChunkSink(io.RawIOBase):
+    """Write-only file that collects what pyarrow writes until it is drained."""
+
+    def __init__(self):
+        super().__init__()
+        self.parts = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self):
+        data = b''.join(self.parts)
+        self.parts = []
+        return data
+
+
+def write_arrow(column_batches, fields, compress=False):
+    import pyarrow
+    import pyarrow.ipc
+
+    schema = arrow_schema(fields)
+    sink = ChunkSink()
+    options = pyarrow.ipc.IpcWriteOptions(compression='zstd' if compress else None)
+    with pyarrow.ipc.new_stream(sink, schema, options=options) as writer:
+        for columns in column_batches:
+            writer.write_batch(pyarrow.record_batch(list(columns.values()), schema=schema))
+            yield sink.drain()
+    # The end-of-stream marker
+    yield sink.drain()
+
+
+def write_parquet(column_batches, fields, compress=False):
+    import pyarrow
+    import pyarrow.parquet
+
+    schema = arrow_schema(fields)
+    sink = ChunkSink()
+    with pyarrow.parquet.ParquetWriter(sink, schema,
+                                       compression='zstd' if compress else 'snappy') as writer:
+        for columns in column_batches:
+            writer.write_batch(pyarrow.record_batch(list(columns.values()), schema=schema))
+            yield sink.drain()
+    # The footer
+    yield sink.drain()
+
+
+class Summary:
+    """Totals per action, top authors and per-branch histograms over column batches.
+
+    Only the counters are kept, so memory follows the number of distinct
+    authors and (branch, bucket) pairs, not the number of documents.
+    """
+
+    FIELDS = ('created_at', 'action', 'author', 'to_branch')
+
+    def __init__(self, top=10, bucket='day'):
+        self.top = top
+        self.bucket = bucket
+        self.total = 0
+        self.first = None
+        self.last = None
+        self.actions = Counter()
+        self.authors = Counter()
+        self.histogram = Counter()
+
+    def add(self, columns):
+        created = columns['created_at']
+        if not created:
+            return
+        self.total += len(created)
+        # Batches come oldest first
+        if self.first is None:
+            self.first = created[0]
+        self.last = created[-1]
+        self.actions.update(columns['action'])
+        self.authors.update(columns['author'])
+        self.histogram.update(zip(columns['to_branch'], map(BUCKETS[self.bucket], created)))
+
+    def result(self):
+        branches = Counter()
+        per_branch = {}
+        for (branch, bucket), count in self.histogram.items():
+            branches[branch] += count
+            per_branch.setdefault(branch, []).append((bucket, count))
+        return {
+            'total': self.total,
+            'first': self.first.isoformat() if self.first else None,
+            'last': self.last.isoformat() if self.last else None,
+            'bucket': self.bucket,
+            'actions': dict(self.actions.most_common()),
+            'top_authors': [{'author': author, 'count': count}
+                            for author, count in self.authors.most_common(self.top)],
+            'branches': [{'branch': branch, 'count': count,
+                          'histogram': [{'bucket': bucket.isoformat(), 'count': bucket_count}
+                                        for bucket, bucket_count in sorted(per_branch[branch])]}
+                         for branch, count in branches.most_common(self.top)],
+        }
+
+
+def parse_summary(args):
+    """Build an empty Summary from query-string (or CLI) arguments; raises QueryError."""
+    bucket = args.get('bucket') or 'day'
+    if bucket not in BUCKETS:
+        raise QueryError(f"bucket must be one of {', '.join(BUCKETS)}")
+    try:
+        top = int(args.get('top') or 10)
+    except ValueError:
+        raise QueryError("top must be an integer")
+    if top < 1:
+        raise QueryError("top must be positive")
+    return Summary(min(top, TOP_MAX), bucket)
+
+
+def summarize(storage, filters, summary, batch_size=None):
+    """Feed every matching document of ``storage`` through ``summary``; returns its result."""
+    for batch in storage.scan(filters, Summary.FIELDS, batch_size or config.EXPORT_BATCH_SIZE):
+        summary.add(to_columns(batch, Summary.FIELDS, storage.action_field))
+    return summary.result()
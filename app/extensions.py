@@ -1,15 +1,155 @@
+import os
+import threading
+import time
 
-from pymongo.mongo_client import MongoClient
+from pymongo import MongoClient, monitoring
 from pymongo.server_api import ServerApi
 
-uri = "mongodb+srv://Naira:<db_password>@api.c63vp.mongodb.net/?retryWrites=true&w=majority&appName=API"
+from app import config
 
-# Create a new client and connect to the server
-client = MongoClient(uri, server_api=ServerApi('1'))
 
-# Send a ping to confirm a successful connection
-try:
-    client.admin.command('ping')
-    print("Pinged your deployment. You successfully connected to MongoDB!")
-except Exception as e:
-    print(e)
\ No newline at end of file
+class PoolMonitor(monitoring.ConnectionPoolListener):
+    """Counts connection pool events so /health can show pool utilisation."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.open = 0
+        self.checked_out = 0
+        self.waiting = 0
+        self.checkouts = 0
+        self.checkout_failures = 0
+        self.pool_clears = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'open': self.open,
+                'checked_out': self.checked_out,
+                'waiting': self.waiting,
+                'checkouts': self.checkouts,
+                'checkout_failures': self.checkout_failures,
+                'pool_clears': self.pool_clears,
+            }
+
+    def _add(self, **deltas):
+        with self._lock:
+            for name, delta in deltas.items():
+                setattr(self, name, getattr(self, name) + delta)
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._add(pool_clears=1)
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._add(open=1)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._add(open=-1)
+
+    def connection_check_out_started(self, event):
+        self._add(waiting=1)
+
+    def connection_check_out_failed(self, event):
+        self._add(waiting=-1, checkout_failures=1)
+
+    def connection_checked_out(self, event):
+        self._add(waiting=-1, checked_out=1, checkouts=1)
+
+    def connection_checked_in(self, event):
+        self._add(checked_out=-1)
+
+
+class MongoClientManager:
+    """Creates the MongoClient lazily, once per process.
+
+    Nothing connects at import time. A client is built on first use in the
+    process that uses it, so gunicorn workers never inherit a client (and its
+    sockets and monitor threads) from the master. Pool size, timeouts and
+    write concern come from config.
+    """
+
+    def __init__(self, uri=None):
+        self.uri = uri or config.MONGO_URI
+        self._lock = threading.Lock()
+        self._client = None
+        self._pid = None
+        self._monitor = None
+        self._last_probe = None
+
+    def get_client(self):
+        """The MongoClient for this process, created on first call."""
+        if self._client is not None and self._pid == os.getpid():
+            return self._client
+
+        with self._lock:
+            if self._client is None or self._pid != os.getpid():
+                self._monitor = PoolMonitor()
+                self._client = MongoClient(self.uri, connect=False,
+                                           event_listeners=[self._monitor],
+                                           **self.client_options())
+                self._pid = os.getpid()
+                self._last_probe = None
+        return self._client
+
+    def client_options(self):
+        """Pool, timeout and write-concern settings passed to MongoClient."""
+        options = {
+            'maxPoolSize': config.MONGO_MAX_POOL_SIZE,
+            'minPoolSize': config.MONGO_MIN_POOL_SIZE,
+            'waitQueueTimeoutMS': config.MONGO_WAIT_QUEUE_TIMEOUT_MS,
+            'serverSelectionTimeoutMS': config.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+            'connectTimeoutMS': config.MONGO_CONNECT_TIMEOUT_MS,
+            'socketTimeoutMS': config.MONGO_SOCKET_TIMEOUT_MS,
+            'w': int(config.MONGO_WRITE_CONCERN) if config.MONGO_WRITE_CONCERN.isdigit()
+                 else config.MONGO_WRITE_CONCERN,
+            'appname': 'webhook-repo',
+        }
+        if config.MONGO_SERVER_API:
+            options['server_api'] = ServerApi(config.MONGO_SERVER_API)
+        return options
+
+    def probe(self):
+        """Ping the server once and remember the outcome for ``health``."""
+        started = time.perf_counter()
+        try:
+            self.get_client().admin.command('ping')
+            self._last_probe = {
+                'ok': True,
+                'latency_ms': round((time.perf_counter() - started) * 1000, 2),
+                'at': time.time(),
+            }
+        except Exception as e:
+            self._last_probe = {'ok': False, 'error': str(e), 'at': time.time()}
+        return self._last_probe
+
+    def health(self):
+        """Last probe result plus pool utilisation for this process."""
+        if self._client is None or self._pid != os.getpid():
+            return {'client': 'not created'}
+
+        pool = self._monitor.stats()
+        pool['max_size'] = config.MONGO_MAX_POOL_SIZE
+        pool['utilisation'] = round(pool['checked_out'] / config.MONGO_MAX_POOL_SIZE, 4)
+        return {'probe': self._last_probe, 'pool': pool}
+
+    def close(self):
+        with self._lock:
+            if self._client is not None and self._pid == os.getpid():
+                self._client.close()
+            self._client = None
+            self._pid = None
+
+
+# Process-wide client manager used by the storage layer
+mongo = MongoClientManager()
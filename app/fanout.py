@@ -0,0 +1,473 @@
+"""
+Outbound fan-out: forward every stored action to subscribed HTTP endpoints.
+
+Subscriptions are read from SUBSCRIPTIONS_FILE once per process:
+
+    {
+      "chat": {
+        "url": "https://chat.example.com/hooks/github",
+        "secret_env": "CHAT_FORWARD_SECRET",
+        "actions": ["push", "merge"],
+        "repositories": ["acme/*"],
+        "tenants": ["acme"],
+        "concurrency": 2,
+        "timeout": 5,
+        "max_attempts": 6
+      }
+    }
+
+The ingest writer hands stored actions to ``Dispatcher.publish``, which only
+appends them to each matching target's bounded queue, so forwarding never
+holds up a webhook response or the database writer. Each target has
+``concurrency`` sender threads, each keeping one keep-alive connection open
+(the target's connection pool). A delivery is retried with exponential
+backoff and jitter on connection errors, timeouts, 429 and 5xx; after
+``max_attempts``, on any other status, or when the target's queue is full,
+it goes to the dead-letter store, from where ``python -m app.cli
+deadletters replay`` can send it again.
+
+Requests are JSON POSTs of the formatted action with ``X-Forward-Id`` (the
+action id, for idempotent receivers), ``X-Forward-Attempt`` and, when the
+subscription has a secret, ``X-Forward-Signature-256`` (``sha256=`` HMAC of
+the body, like GitHub's own header).
+"""
+import atexit
+import hashlib
+import hmac
+import http.client
+import json
+import os
+import queue
+import random
+import re
+import threading
+import time
+from collections import deque
+from fnmatch import fnmatchcase
+from urllib.parse import urlsplit
+
+from app import config
+from app.queries import utcnow
+
+NAME_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+SETTINGS = frozenset({'url', 'secret', 'secret_env', 'actions', 'repositories', 'tenants',
+                      'concurrency', 'timeout', 'max_attempts'})
+USER_AGENT = 'github-webhook-monitor-forwarder'
+
+# Statuses worth retrying: the receiver is overloaded or broken, not refusing the payload
+RETRY_STATUSES = frozenset({408, 425, 429, 500, 502, 503, 504})
+# Recent delivery latencies kept per target for the percentiles in /health
+LATENCY_SAMPLES = 1000
+
+_STOP = object()
+
+
+class Subscription:
+    """One downstream endpoint and the actions it wants."""
+
+    __slots__ = ('name', 'url', 'secret', 'actions', 'repositories', 'tenants',
+                 'concurrency', 'timeout', 'max_attempts')
+
+    def __init__(self, name, url, secret=None, actions=(), repositories=(), tenants=(),
+                 concurrency=None, timeout=None, max_attempts=None):
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https') or not parts.hostname:
+            raise ValueError(f"Subscription {name}: url must be an http(s) URL")
+        self.name = name
+        self.url = url
+        self.secret = secret.encode('utf-8') if secret else None
+        self.actions = frozenset(actions)
+        self.repositories = tuple(repositories)
+        self.tenants = frozenset(tenants)
+        self.concurrency = int(concurrency or config.FANOUT_CONCURRENCY)
+        self.timeout = float(timeout or config.FANOUT_TIMEOUT)
+        self.max_attempts = int(max_attempts or config.FANOUT_MAX_ATTEMPTS)
+
+    def __repr__(self):
+        return f'Subscription({self.name!r}, {self.url!r})'
+
+    def wants(self, action):
+        """Whether the formatted ``action`` passes this subscription's filters."""
+        if self.actions and action.get('action') not in self.actions:
+            return False
+        if self.tenants and action.get('tenant') not in self.tenants:
+            return False
+        if self.repositories:
+            repository = action.get('repository')
+            return repository is not None and any(
+                fnmatchcase(repository, pattern) for pattern in self.repositories)
+        return True
+
+    def sign(self, body):
+        if self.secret is None:
+            return None
+        return 'sha256=' + hmac.new(self.secret, body, hashlib.sha256).hexdigest()
+
+
+def load_subscriptions(path=None):
+    """Subscriptions from ``path`` (SUBSCRIPTIONS_FILE); none when it is unset.
+
+    Raises ValueError for an unreadable file or invalid settings.
+    """
+    path = config.SUBSCRIPTIONS_FILE if path is None else path
+    if not path:
+        return []
+    try:
+        with open(path) as subscriptions_file:
+            entries = json.load(subscriptions_file)
+    except (OSError, ValueError) as e:
+        raise ValueError(f"Cannot load subscriptions from {path}: {str(e)}")
+    if not isinstance(entries, dict):
+        raise ValueError(f"{path} must hold a JSON object of subscription name -> settings")
+
+    subscriptions = []
+    for name, settings in entries.items():
+        if not NAME_PATTERN.match(name):
+            raise ValueError(f"Invalid subscription name: {name!r}")
+        if not isinstance(settings, dict) or 'url' not in settings:
+            raise ValueError(f"Subscription {name}: settings must be a JSON object with a url")
+        unknown = set(settings) - SETTINGS
+        if unknown:
+            raise ValueError(f"Subscription {name}: unknown settings {', '.join(sorted(unknown))}")
+        secret = settings.get('secret')
+        if settings.get('secret_env'):
+            secret = os.getenv(settings['secret_env'])
+        try:
+            subscriptions.append(Subscription(
+                name, settings['url'], secret,
+                actions=settings.get('actions') or (),
+                repositories=settings.get('repositories') or (),
+                tenants=settings.get('tenants') or (),
+                concurrency=settings.get('concurrency'),
+                timeout=settings.get('timeout'),
+                max_attempts=settings.get('max_attempts'),
+            ))
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"Subscription {name}: {str(e)}")
+    return subscriptions
+
+
+class DeliveryFailed(Exception):
+    """One attempt failed; ``retry`` says whether another attempt may succeed."""
+
+    def __init__(self, message, status=None, retry=True, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.retry = retry
+        self.retry_after = retry_after
+
+
+class Sender:
+    """POSTs to one subscription over a single keep-alive connection (not thread-safe)."""
+
+    def __init__(self, subscription):
+        self.subscription = subscription
+        parts = urlsplit(subscription.url)
+        self._https = parts.scheme == 'https'
+        self._host = parts.hostname
+        self._port = parts.port
+        self._path = (parts.path or '/') + (f'?{parts.query}' if parts.query else '')
+        self._connection = None
+
+    def send(self, body, forward_id, attempt):
+        """One delivery attempt; returns the status or raises DeliveryFailed."""
+        headers = {
+            'Content-Type': 'application/json',
+            'User-Agent': USER_AGENT,
+            'X-Forward-Id': forward_id,
+            'X-Forward-Attempt': str(attempt),
+        }
+        signature = self.subscription.sign(body)
+        if signature:
+            headers['X-Forward-Signature-256'] = signature
+
+        while True:
+            reused = self._connection is not None
+            try:
+                connection = self._connect()
+                connection.request('POST', self._path, body=body, headers=headers)
+                response = connection.getresponse()
+                # Drain the body so the connection can be reused
+                response.read()
+                break
+            except (OSError, http.client.HTTPException) as e:
+                self.close()
+                if reused and isinstance(e, (ConnectionError, http.client.RemoteDisconnected)):
+                    # The receiver closed an idle keep-alive connection; that's not a failure
+                    continue
+                raise DeliveryFailed(f"{type(e).__name__}: {str(e) or 'connection failed'}")
+
+        if response.will_close:
+            self.close()
+        if 200 <= response.status < 300:
+            return response.status
+        raise DeliveryFailed(f"HTTP {response.status}", status=response.status,
+                             retry=response.status in RETRY_STATUSES,
+                             retry_after=_retry_after(response.getheader('Retry-After')))
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def _connect(self):
+        if self._connection is None:
+            connection_class = (http.client.HTTPSConnection if self._https
+                                else http.client.HTTPConnection)
+            self._connection = connection_class(self._host, self._port,
+                                                timeout=self.subscription.timeout)
+        return self._connection
+
+
+def _retry_after(value):
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+class DeadLetterStore:
+    """Deliveries that ran out of attempts, as JSON lines under ``directory/<target>.jsonl``."""
+
+    def __init__(self, directory=None):
+        self.directory = directory or config.DEAD_LETTER_DIR
+        self._lock = threading.Lock()
+
+    def add(self, target, action, attempts, error, status=None):
+        record = {
+            'failed_at': utcnow().isoformat(),
+            'target': target,
+            'attempts': attempts,
+            'status': status,
+            'error': error,
+            'action': action,
+        }
+        line = json.dumps(record, default=str) + '\n'
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(self._path(target), 'a', encoding='utf-8') as dead_letters:
+                dead_letters.write(line)
+
+    def read(self, target):
+        try:
+            with open(self._path(target), encoding='utf-8') as dead_letters:
+                for line in dead_letters:
+                    if line.strip():
+                        yield json.loads(line)
+        except FileNotFoundError:
+            return
+
+    def replace(self, target, records):
+        """Rewrite ``target``'s dead letters with ``records`` (e.g. those still failing)."""
+        path = self._path(target)
+        with self._lock:
+            if not records:
+                if os.path.exists(path):
+                    os.remove(path)
+                return
+            with open(path + '.tmp', 'w', encoding='utf-8') as dead_letters:
+                for record in records:
+                    dead_letters.write(json.dumps(record, default=str) + '\n')
+            os.replace(path + '.tmp', path)
+
+    def count(self, target):
+        return sum(1 for _ in self.read(target))
+
+    def _path(self, target):
+        return os.path.join(self.directory, f'{target}.jsonl')
+
+
+class Target:
+    """One subscription's queue, sender threads and delivery counters."""
+
+    def __init__(self, subscription, dead_letters, queue_size, retry_seconds, retry_max_seconds):
+        self.subscription = subscription
+        self.dead_letters = dead_letters
+        self.retry_seconds = retry_seconds
+        self.retry_max_seconds = retry_max_seconds
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.threads = []
+        self.stopping = threading.Event()
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=LATENCY_SAMPLES)
+        self._lags = deque(maxlen=LATENCY_SAMPLES)
+        self.in_flight = 0
+        self.last_error = None
+        self.counters = {'queued': 0, 'delivered': 0, 'retries': 0, 'dead_lettered': 0,
+                         'dropped': 0}
+
+    def start(self):
+        # A queue inherited across fork may have been locked by a parent thread
+        self.queue = queue.Queue(maxsize=self.queue.maxsize)
+        self.stopping.clear()
+        self.threads = [
+            threading.Thread(target=self._run, name=f'forward-{self.subscription.name}-{number}',
+                             daemon=True)
+            for number in range(self.subscription.concurrency)
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def offer(self, action):
+        try:
+            self.queue.put_nowait((action, time.monotonic()))
+        except queue.Full:
+            # Never wait here: the caller is the ingest writer
+            self._incr('dropped')
+            self.dead_letters.add(self.subscription.name, action, 0, 'forward queue full')
+            return
+        self._incr('queued')
+
+    def stop(self, timeout):
+        """Stop the senders; whatever is still queued is dead-lettered for replay."""
+        self.stopping.set()
+        for _ in self.threads:
+            try:
+                self.queue.put_nowait(_STOP)
+            except queue.Full:
+                pass
+        deadline = time.monotonic() + timeout
+        for thread in self.threads:
+            thread.join(max(0, deadline - time.monotonic()))
+        while True:
+            try:
+                item = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                self.dead_letters.add(self.subscription.name, item[0], 0, 'shut down before delivery')
+                self._incr('dead_lettered')
+
+    def stats(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+            lags = sorted(self._lags)
+            counters = dict(self.counters)
+            in_flight = self.in_flight
+        return {
+            'url': self.subscription.url,
+            'concurrency': self.subscription.concurrency,
+            'depth': self.queue.qsize(),
+            'in_flight': in_flight,
+            'latency_ms': _percentiles(latencies),
+            'lag_ms': _percentiles(lags),
+            'last_error': self.last_error,
+            **counters,
+        }
+
+    def _run(self):
+        sender = Sender(self.subscription)
+        try:
+            while True:
+                item = self.queue.get()
+                if item is _STOP:
+                    return
+                action, queued_at = item
+                with self._lock:
+                    self.in_flight += 1
+                try:
+                    self._deliver(sender, action, queued_at)
+                finally:
+                    with self._lock:
+                        self.in_flight -= 1
+        finally:
+            sender.close()
+
+    def _deliver(self, sender, action, queued_at):
+        body = json.dumps(action, default=str).encode('utf-8')
+        forward_id = str(action.get('id', ''))
+        attempt = 0
+        while True:
+            attempt += 1
+            started = time.monotonic()
+            try:
+                sender.send(body, forward_id, attempt)
+            except DeliveryFailed as e:
+                self.last_error = str(e)
+                if not e.retry or attempt >= self.subscription.max_attempts or self.stopping.is_set():
+                    self.dead_letters.add(self.subscription.name, action, attempt, str(e), e.status)
+                    self._incr('dead_lettered')
+                    print(f"Forward to {self.subscription.name} failed after {attempt} "
+                          f"attempts: {str(e)}")
+                    return
+                self._incr('retries')
+                # Full jitter keeps retries from many senders from synchronizing
+                delay = min(self.retry_seconds * 2 ** (attempt - 1), self.retry_max_seconds)
+                delay = e.retry_after if e.retry_after is not None else random.uniform(delay / 2, delay)
+                self.stopping.wait(min(delay, self.retry_max_seconds))
+                continue
+
+            finished = time.monotonic()
+            with self._lock:
+                self._latencies.append((finished - started) * 1000)
+                self._lags.append((finished - queued_at) * 1000)
+                self.counters['delivered'] += 1
+            return
+
+    def _incr(self, counter, amount=1):
+        with self._lock:
+            self.counters[counter] += amount
+
+
+def _percentiles(samples):
+    if not samples:
+        return None
+    def pick(fraction):
+        return round(samples[min(len(samples) - 1, int(len(samples) * fraction))], 3)
+    return {'p50': pick(0.50), 'p95': pick(0.95), 'p99': pick(0.99), 'max': round(samples[-1], 3)}
+
+
+class Dispatcher:
+    """Forwards formatted actions to every subscription that wants them.
+
+    ``publish`` is safe to call from any thread and never blocks. Sender
+    threads start lazily in the publishing process, so each gunicorn worker
+    forwards what it stored itself.
+    """
+
+    def __init__(self, subscriptions=None, dead_letters=None, queue_size=None,
+                 retry_seconds=None, retry_max_seconds=None, shutdown_timeout=None):
+        subscriptions = load_subscriptions() if subscriptions is None else subscriptions
+        self.dead_letters = dead_letters or DeadLetterStore()
+        self.shutdown_timeout = (config.FANOUT_SHUTDOWN_TIMEOUT if shutdown_timeout is None
+                                 else shutdown_timeout)
+        queue_size = queue_size or config.FANOUT_QUEUE_SIZE
+        retry_seconds = retry_seconds or config.FANOUT_RETRY_SECONDS
+        retry_max_seconds = retry_max_seconds or config.FANOUT_RETRY_MAX_SECONDS
+        self.targets = [Target(subscription, self.dead_letters, queue_size, retry_seconds,
+                               retry_max_seconds)
+                        for subscription in subscriptions]
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def publish(self, actions):
+        """Queue each formatted action for every target whose filters it passes."""
+        if not self.targets or not actions:
+            return
+        self.ensure_started()
+        for action in actions:
+            for target in self.targets:
+                if target.subscription.wants(action):
+                    target.offer(action)
+
+    def ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            if self._pid is None:
+                atexit.register(self.close)
+            # Threads don't survive a fork; the child starts its own
+            self._pid = os.getpid()
+            for target in self.targets:
+                target.start()
+
+    def close(self):
+        if self._pid != os.getpid():
+            return
+        for target in self.targets:
+            target.stop(self.shutdown_timeout)
+
+    def stats(self):
+        return {target.subscription.name: target.stats() for target in self.targets}
@@ -0,0 +1,111 @@
+import hashlib
+import json
+import threading
+import time
+
+from app import config
+from app.admission import Overloaded
+from app.metrics import READ_ROWS, READ_STAGE_SECONDS
+
+
+class FeedCache:
+    """Latest-N formatted actions kept in memory together with their JSON body and ETag.
+
+    ``loader(limit)`` returns the newest raw documents (newest first) and
+    ``formatter(document)`` turns one into its API representation. The
+    ingest writer pushes freshly written documents in with ``add``, and the
+    event bus other workers' actions with ``add_items``; ``ttl`` bounds how
+    stale the cache can get from writes it was not told about. When the
+    loader is shed by admission control (``Overloaded``) the cached feed is
+    served as it is, however old.
+    """
+
+    def __init__(self, loader, formatter, limit=None, ttl=None, key='actions'):
+        self.loader = loader
+        self.formatter = formatter
+        self.limit = limit or config.FEED_CACHE_SIZE
+        self.ttl = config.FEED_CACHE_TTL if ttl is None else ttl
+        self.key = key
+
+        self._lock = threading.Lock()
+        self._items = None
+        self._body = None
+        self._etag = None
+        self._loaded_at = 0.0
+        self.hits = 0
+        self.loads = 0
+        self.updates = 0
+        self.stale = 0
+
+    def get(self):
+        """Return (body bytes, etag), reloading from storage only when stale."""
+        with self._lock:
+            if self._body is not None and time.monotonic() - self._loaded_at < self.ttl:
+                self.hits += 1
+                return self._body, self._etag
+
+        try:
+            with READ_STAGE_SECONDS.time('feed', 'query'):
+                documents = self.loader(self.limit)
+        except Overloaded:
+            with self._lock:
+                if self._body is None:
+                    raise
+                self.stale += 1
+                return self._body, self._etag
+        with READ_STAGE_SECONDS.time('feed', 'format'):
+            items = [self.formatter(document) for document in documents]
+        READ_ROWS.observe(len(items), 'feed')
+        with self._lock:
+            self.loads += 1
+            self._loaded_at = time.monotonic()
+            with READ_STAGE_SECONDS.time('feed', 'serialize'):
+                self._set_items(items)
+            return self._body, self._etag
+
+    def add(self, documents):
+        """Write-through: put newly stored documents at the head of the cached feed."""
+        with self._lock:
+            if self._items is None:
+                return
+            self._prepend([self.formatter(document) for document in reversed(documents)])
+
+    def add_items(self, items):
+        """Like ``add``, for actions already formatted (oldest first), e.g. from another worker."""
+        with self._lock:
+            if self._items is None:
+                return
+            self._prepend(items[::-1])
+
+    def invalidate(self):
+        """Make the next read reload the feed; until then it stays the fallback for shed reloads."""
+        with self._lock:
+            self._loaded_at = 0.0
+
+    def stats(self):
+        """Return cache counters."""
+        with self._lock:
+            return {
+                'cached': self._body is not None,
+                'size': len(self._items) if self._items is not None else 0,
+                'limit': self.limit,
+                'ttl_seconds': self.ttl,
+                'etag': self._etag,
+                'hits': self.hits,
+                'loads': self.loads,
+                'updates': self.updates,
+                'stale': self.stale,
+            }
+
+    def _prepend(self, fresh):
+        # A reload may already have picked some of them up
+        fresh = [item for item in fresh if item not in self._items]
+        self.updates += 1
+        self._set_items((fresh + self._items)[:self.limit])
+
+    def _set_items(self, items):
+        self._items = items
+        self._body = json.dumps({self.key: items}, separators=(',', ':'),
+                                default=str).encode('utf-8')
+        # Content hash, so every worker serving the same feed agrees on the ETag
+        self._etag = hashlib.sha1(self._body).hexdigest()
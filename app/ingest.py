@@ -0,0 +1,276 @@
+import atexit
+import os
+import queue
+import threading
+import time
+
+from app import config
+from app.metrics import DOCUMENTS_WRITTEN, INGEST_STAGE_SECONDS
+
+BACKPRESSURE_POLICIES = ('block', 'reject', 'drop_oldest')
+
+# Marker put on the queue to wake the writer up during shutdown
+_STOP = object()
+
+
+class QueueFull(Exception):
+    """Raised when the ingest queue cannot accept another document."""
+
+
+class IngestQueue:
+    """Bounded in-process queue drained into storage by a background writer thread.
+
+    The writer hands documents to ``sink`` in batches: a batch is written once
+    it reaches ``batch_size`` documents or ``batch_delay_ms`` after its first
+    document arrived, whichever comes first. ``sink`` takes a list of documents
+    and may return a ``BatchResult`` describing per-document failures.
+
+    ``on_written(batch, result)``, if given, is called after each batch is
+    written, e.g. to update read caches.
+
+    Each gunicorn worker gets its own queue and writer; the thread is started
+    lazily on first use so it always belongs to the process that serves requests.
+    """
+
+    def __init__(self, sink, name='ingest', maxsize=None, policy=None,
+                 block_timeout=None, shutdown_timeout=None,
+                 batch_size=None, batch_delay_ms=None, on_written=None):
+        policy = policy or config.INGEST_BACKPRESSURE
+        if policy not in BACKPRESSURE_POLICIES:
+            raise ValueError(f"Unknown backpressure policy: {policy}")
+
+        self.sink = sink
+        self.on_written = on_written
+        self.name = name
+        self.maxsize = maxsize or config.INGEST_QUEUE_SIZE
+        self.policy = policy
+        self.block_timeout = (config.INGEST_BLOCK_TIMEOUT
+                              if block_timeout is None else block_timeout)
+        self.shutdown_timeout = (config.INGEST_SHUTDOWN_TIMEOUT
+                                 if shutdown_timeout is None else shutdown_timeout)
+        self.batch_size = batch_size or config.INGEST_BATCH_SIZE
+        self.batch_delay = (config.INGEST_BATCH_DELAY_MS
+                            if batch_delay_ms is None else batch_delay_ms) / 1000
+
+        self._queue = queue.Queue(maxsize=self.maxsize)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._closed = False
+        self._counters = {
+            'enqueued': 0,
+            'written': 0,
+            'failed': 0,
+            'rejected': 0,
+            'dropped': 0,
+            'duplicates': 0,
+            'spooled': 0,
+            'batches': 0,
+        }
+        self._high_watermark = 0
+        self._last_write_ms = None
+        self._last_batch_size = 0
+
+    def put(self, document):
+        """Enqueue a document for the writer, applying the backpressure policy."""
+        if self._closed:
+            raise QueueFull(f"{self.name} queue is shut down")
+        self._ensure_started()
+
+        try:
+            if self.policy == 'block':
+                self._queue.put(document, timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait(document)
+        except queue.Full:
+            if self.policy != 'drop_oldest':
+                self._incr('rejected')
+                raise QueueFull(f"{self.name} queue is full ({self.maxsize} documents)")
+            self._drop_oldest_and_put(document)
+
+        self._incr('enqueued')
+        depth = self._queue.qsize()
+        if depth > self._high_watermark:
+            self._high_watermark = depth
+
+    def depth(self):
+        """Documents waiting for the writer."""
+        return self._queue.qsize()
+
+    def flush(self, timeout=None):
+        """Wait until every queued document has been handed to the sink."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def close(self, timeout=None):
+        """Stop accepting documents, drain the queue and stop the writer."""
+        timeout = self.shutdown_timeout if timeout is None else timeout
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            thread = self._thread
+
+        if thread is None or not thread.is_alive():
+            # Nothing is draining the queue, write whatever is left inline
+            self._drain_inline()
+            return
+
+        self._queue.put(_STOP)
+        thread.join(timeout)
+        if thread.is_alive():
+            print(f"{self.name} queue: writer did not finish within {timeout}s, "
+                  f"{self._queue.qsize()} documents left unwritten")
+
+    def stats(self):
+        """Return queue depth and throughput counters."""
+        with self._lock:
+            counters = dict(self._counters)
+        return {
+            'name': self.name,
+            'policy': self.policy,
+            'depth': self._queue.qsize(),
+            'capacity': self.maxsize,
+            'high_watermark': self._high_watermark,
+            'last_write_ms': self._last_write_ms,
+            'last_batch_size': self._last_batch_size,
+            'batch_size': self.batch_size,
+            'batch_delay_ms': self.batch_delay * 1000,
+            'writer_alive': bool(self._thread and self._thread.is_alive()),
+            **counters,
+        }
+
+    def _ensure_started(self):
+        pid = os.getpid()
+        if self._pid == pid and self._thread is not None and self._thread.is_alive():
+            return
+
+        with self._lock:
+            if self._pid == pid and self._thread is not None and self._thread.is_alive():
+                return
+            if self._pid is not None and self._pid != pid:
+                # We were forked after the writer started: the parent's thread
+                # does not exist here, and neither should its pending documents.
+                self._queue = queue.Queue(maxsize=self.maxsize)
+            else:
+                atexit.register(self.close)
+            self._pid = pid
+            self._thread = threading.Thread(
+                target=self._run, name=f"{self.name}-writer", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            batch, stopping = self._collect_batch()
+            try:
+                self._write(batch)
+            finally:
+                for _ in range(len(batch) + stopping):
+                    self._queue.task_done()
+            if stopping:
+                self._drain_inline()
+                return
+
+    def _collect_batch(self):
+        """Block for the first document, then gather more until the size or time limit."""
+        first = self._queue.get()
+        if first is _STOP:
+            return [], True
+
+        batch = [first]
+        deadline = time.monotonic() + self.batch_delay
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    document = self._queue.get(timeout=remaining)
+                else:
+                    document = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if document is _STOP:
+                return batch, True
+            batch.append(document)
+        return batch, False
+
+    def _drain_inline(self):
+        while True:
+            batch = []
+            while len(batch) < self.batch_size:
+                try:
+                    document = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if document is _STOP:
+                    self._queue.task_done()
+                    continue
+                batch.append(document)
+            if not batch:
+                return
+            try:
+                self._write(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write(self, batch):
+        if not batch:
+            return
+        started = time.perf_counter()
+        try:
+            result = self.sink(batch)
+        except Exception as e:
+            self._incr('failed', len(batch))
+            DOCUMENTS_WRITTEN.inc(self.name, 'failed', amount=len(batch))
+            print(f"{self.name} queue: error writing {len(batch)} documents: {str(e)}")
+            return
+
+        failed = len(result.errors) if result is not None else 0
+        duplicates = len(result.duplicates) if result is not None else 0
+        spooled = len(result.spooled) if result is not None else 0
+        for _, message in (result.errors if result is not None else []):
+            print(f"{self.name} queue: document rejected: {message}")
+
+        elapsed = time.perf_counter() - started
+        self._last_write_ms = elapsed * 1000
+        self._last_batch_size = len(batch)
+        written = len(batch) - failed - duplicates - spooled
+        with self._lock:
+            self._counters['batches'] += 1
+            self._counters['written'] += written
+            self._counters['failed'] += failed
+            self._counters['duplicates'] += duplicates
+            self._counters['spooled'] += spooled
+        INGEST_STAGE_SECONDS.observe(elapsed, 'write')
+        for outcome, count in (('written', written), ('failed', failed),
+                               ('duplicate', duplicates), ('spooled', spooled)):
+            if count:
+                DOCUMENTS_WRITTEN.inc(self.name, outcome, amount=count)
+
+        if self.on_written:
+            try:
+                self.on_written(batch, result)
+            except Exception as e:
+                print(f"{self.name} queue: on_written hook failed: {str(e)}")
+
+    def _drop_oldest_and_put(self, document):
+        while True:
+            try:
+                self._queue.get_nowait()
+                self._queue.task_done()
+                self._incr('dropped')
+            except queue.Empty:
+                pass
+            try:
+                self._queue.put_nowait(document)
+                return
+            except queue.Full:
+                continue
+
+    def _incr(self, counter, amount=1):
+        with self._lock:
+            self._counters[counter] += amount
@@ -0,0 +1,604 @@
+"""
+The dashboard, the /webhook receivers and the actions API, registered by ``create_app``.
+"""
+from flask import Blueprint, Response, g, request, jsonify, render_template, stream_with_context
+from collections import namedtuple
+import itertools
+import json
+import math
+import time
+
+from app import config, metrics
+from app.admission import Overloaded, admission
+from app.bus import create_bus
+from app.dedup import DeliveryCache
+from app.events import extract_event
+from app.export import parse_export, parse_summary, summarize
+from app.fanout import Dispatcher
+from app.feed import FeedCache
+from app.ingest import IngestQueue, QueueFull
+from app.metrics import DELIVERIES, INGEST_STAGE_SECONDS, READ_ROWS, READ_STAGE_SECONDS, REQUEST_SECONDS
+from app.queries import QueryError, build_filter, is_paged_query, parse_limit, parse_time
+from app.ratelimit import rate_limiter
+from app.retention import Retention
+from app.schema import build_document, event_document, view
+from app.rollups import DIMENSIONS, create_rollups
+from app.search import parse_search
+from app.signatures import PayloadRejected
+from app.spool import Spool
+from app.startup import startup
+from app.storage import create_storage
+from app.stream import Broadcaster, sse_events
+from app.tenants import DEFAULT_TENANT, TenantRegistry
+
+dashboard = Blueprint('dashboard', __name__)
+
+# MongoDB configuration
+MONGO_URI = config.MONGO_URI
+DATABASE_NAME = config.DATABASE_NAME
+COLLECTION_NAME = config.COLLECTION_NAME
+
+# Tenants (TENANTS_FILE), each with its own webhook secrets, collection,
+# repository allowlist and rate limit; bodies are size-checked and
+# HMAC-verified with the tenant's secrets while they are read
+tenants = TenantRegistry()
+
+# Forwards stored actions to the downstream endpoints in SUBSCRIPTIONS_FILE,
+# from per-target sender threads, never from the request or the writer
+dispatcher = Dispatcher()
+
+# Initialize storage (MongoDB unless STORAGE_BACKEND says otherwise)
+storage = create_storage(database=DATABASE_NAME, collection=COLLECTION_NAME)
+
+# Batches the database can't take are parked under logs/spool and replayed
+# once it is back, so an outage delays actions instead of losing them
+spool = Spool(COLLECTION_NAME, admission.timed(storage.insert_many))
+
+# Documents are written in batches by a background writer so GitHub gets its
+# response without waiting on the database round trip
+ingest_queue = IngestQueue(spool.write, name=COLLECTION_NAME)
+
+# Hourly/daily activity counters, updated by the writer as actions are stored
+rollups = create_rollups(storage, COLLECTION_NAME)
+
+# Storage, spool, ingest queue, retention and rollups per tenant collection;
+# the dashboard feed and stream follow the default collection
+Pipeline = namedtuple('Pipeline', 'storage spool ingest_queue retention rollups')
+
+def retention_days(collection):
+    """Longest retention any tenant writing to ``collection`` asks for (None: RETENTION_DAYS)."""
+    days = [tenant.retention_days for tenant in tenants
+            if tenant.collection == collection and tenant.retention_days is not None]
+    return max(days) if days else None
+
+def forward_actions(collection):
+    """Writer callback for a tenant's own collection (not on the dashboard):
+    roll the stored actions up and forward them."""
+    def forward(batch, result):
+        stored = result.stored(batch) if result is not None else batch
+        if stored:
+            pipelines[collection].rollups.record(stored)
+            dispatcher.publish([view(document) for document in stored])
+    return forward
+
+pipelines = {COLLECTION_NAME: Pipeline(storage, spool, ingest_queue,
+                                       Retention(storage, COLLECTION_NAME, retention_days(COLLECTION_NAME)),
+                                       rollups)}
+for tenant in tenants:
+    if tenant.collection not in pipelines:
+        tenant_storage = create_storage(database=DATABASE_NAME, collection=tenant.collection)
+        tenant_spool = Spool(tenant.collection, admission.timed(tenant_storage.insert_many),
+                             on_replayed=forward_actions(tenant.collection))
+        tenant_queue = IngestQueue(tenant_spool.write, name=tenant.collection,
+                                   on_written=forward_actions(tenant.collection))
+        pipelines[tenant.collection] = Pipeline(
+            tenant_storage, tenant_spool, tenant_queue,
+            Retention(tenant_storage, tenant.collection, retention_days(tenant.collection)),
+            create_rollups(tenant_storage, tenant.collection))
+
+def tenant_scope(tenant):
+    """Tenant filter for reads on behalf of ``tenant``: named tenants only see
+    their own actions, even in a collection they share; the default tenant
+    reads its whole collection, like the dashboard feed."""
+    return None if tenant.name == DEFAULT_TENANT else tenant.name
+
+# Deliveries are shed before their queue fills up, and dashboard reads while
+# any of them is backing up (app/admission.py)
+for pipeline in pipelines.values():
+    admission.watch(pipeline.ingest_queue)
+
+# Recently seen X-GitHub-Delivery ids, so redeliveries never reach MongoDB
+delivery_cache = DeliveryCache()
+
+@dashboard.route('/')
+def index():
+    """Serve the main UI."""
+    return render_template('index.html')
+
+@dashboard.route('/webhook', methods=['POST'], defaults={'tenant_name': DEFAULT_TENANT})
+@dashboard.route('/webhook/<tenant_name>', methods=['POST'])
+def webhook(tenant_name):
+    """Handle GitHub webhook events for a tenant (the default one on /webhook)."""
+    try:
+        tenant = tenants.get(tenant_name)
+        if tenant is None:
+            DELIVERIES.inc('unknown', 'unknown_tenant')
+            return jsonify({'error': 'Unknown tenant'}), 404
+        
+        # Size and signature are checked before anything is parsed or stored
+        try:
+            with INGEST_STAGE_SECONDS.time('signature'):
+                body = tenant.verifier.read(
+                    request.stream,
+                    request.content_length,
+                    request.headers.get('X-Hub-Signature-256')
+                )
+        except PayloadRejected as e:
+            DELIVERIES.inc(tenant.name, 'rejected')
+            return jsonify({'error': e.reason}), e.status
+        
+        # Answer redeliveries of an event we already accepted without any work
+        delivery_id = request.headers.get('X-GitHub-Delivery')
+        if delivery_id and delivery_cache.check(delivery_id):
+            DELIVERIES.inc(tenant.name, 'duplicate')
+            return jsonify({
+                'status': 'duplicate',
+                'message': 'Delivery already processed',
+                'delivery_id': delivery_id
+            }), 200
+        
+        if not body:
+            DELIVERIES.inc(tenant.name, 'invalid')
+            return jsonify({'error': 'No payload received'}), 400
+        
+        # Decode only the fields this event type needs
+        try:
+            event = extract_event(request.headers.get('X-GitHub-Event', ''), body)
+        except ValueError:
+            DELIVERIES.inc(tenant.name, 'invalid')
+            return jsonify({'error': 'Invalid JSON payload'}), 400
+        
+        if event is None:
+            DELIVERIES.inc(tenant.name, 'ignored')
+            return jsonify({'status': 'ignored', 'message': 'Event type not recorded'}), 200
+        
+        if not tenant.accepts(event.repository):
+            DELIVERIES.inc(tenant.name, 'forbidden')
+            return jsonify({'error': 'Repository not allowed for this tenant'}), 403
+        
+        # Per-(tenant, repository) token buckets, so one noisy repository can't
+        # monopolize the workers; keyed on the signed payload, not on a header
+        # anyone could set
+        wait = rate_limiter.acquire((tenant.name, event.repository),
+                                    tenant.rate_limit, tenant.burst)
+        if wait:
+            DELIVERIES.inc(tenant.name, 'rate_limited')
+            return (jsonify({'error': 'Rate limit exceeded'}), 429,
+                    {'Retry-After': str(math.ceil(wait))})
+        
+        # The stored document, display text included, so reads never format it again;
+        # delivery_id is backed by a unique index, the final guard across workers
+        document = event_document(event, tenant=tenant.name, delivery_id=delivery_id)
+        
+        # Hand the document to the background writer for the tenant's collection,
+        # unless it is already too far behind to take it without waiting
+        try:
+            with INGEST_STAGE_SECONDS.time('enqueue'):
+                admission.put(pipelines[tenant.collection].ingest_queue, document)
+        except Overloaded as e:
+            DELIVERIES.inc(tenant.name, 'shed')
+            print(f"Webhook shed: {str(e)}")
+            return (jsonify({'error': 'Overloaded, retry later'}), 503,
+                    {'Retry-After': str(e.retry_after)})
+        except QueueFull as e:
+            DELIVERIES.inc(tenant.name, 'queue_full')
+            print(f"Webhook rejected: {str(e)}")
+            return jsonify({'error': 'Ingest queue is full'}), 503, {'Retry-After': '1'}
+        
+        if delivery_id:
+            delivery_cache.add(delivery_id)
+        
+        DELIVERIES.inc(tenant.name, 'accepted')
+        print(f"Webhook received: {event.action} by {event.author} on {event.repository}")
+        
+        with INGEST_STAGE_SECONDS.time('serialize'):
+            response = jsonify({
+                'status': 'accepted',
+                'message': 'Webhook queued for processing',
+                'document_id': str(document['_id'])
+            })
+        return response, 202
+        
+    except Exception as e:
+        DELIVERIES.inc(tenant_name if tenants.get(tenant_name) else 'unknown', 'error')
+        print(f"Error processing webhook: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@dashboard.route('/api/actions', methods=['GET'])
+def get_actions():
+    """API endpoint to get recent actions for the UI."""
+    if is_paged_query(request.args):
+        return query_actions()
+    
+    try:
+        # Latest actions come pre-formatted and pre-serialized from the feed cache
+        body, etag = feed_cache.get()
+        
+        # Unchanged since the client's last poll: no body, no serialization
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            response = Response(body, mimetype='application/json')
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+        
+    except Overloaded as e:
+        # Shed with nothing cached to fall back on
+        return (jsonify({'error': 'Overloaded, retry later'}), 503,
+                {'Retry-After': str(e.retry_after)})
+    except Exception as e:
+        print(f"Error fetching actions: {str(e)}")
+        return jsonify({'error': 'Failed to fetch actions'}), 500
+
+def query_actions():
+    """Filtered, cursor-paginated history behind /api/actions."""
+    tenant = tenants.get(request.args.get('tenant') or DEFAULT_TENANT)
+    if tenant is None:
+        return jsonify({'error': 'Unknown tenant'}), 404
+    tenant_storage = pipelines[tenant.collection].storage
+    try:
+        filters = build_filter(request.args, tenant_scope(tenant))
+        limit = parse_limit(request.args)
+        with READ_STAGE_SECONDS.time('query', 'query'):
+            actions, next_cursor = admission.call('read', tenant_storage.find_page, filters,
+                                                  request.args.get('cursor'), limit)
+    except QueryError as e:
+        return jsonify({'error': str(e)}), 400
+    except Overloaded as e:
+        return (jsonify({'error': 'Overloaded, retry later'}), 503,
+                {'Retry-After': str(e.retry_after)})
+    except Exception as e:
+        print(f"Error querying actions: {str(e)}")
+        return jsonify({'error': 'Failed to fetch actions'}), 500
+    
+    READ_ROWS.observe(len(actions), 'query')
+    with READ_STAGE_SECONDS.time('query', 'format'):
+        formatted = [view(action) for action in actions]
+    with READ_STAGE_SECONDS.time('query', 'serialize'):
+        response = jsonify({
+            'actions': formatted,
+            'next_cursor': next_cursor
+        })
+    return response, 200
+
+@dashboard.route('/api/search', methods=['GET'])
+def search_actions():
+    """Relevance-ranked search over authors, branches and commit summaries.
+
+    Results are streamed as they are read from storage, as one JSON document
+    or, with ``format=ndjson`` (or ``Accept: application/x-ndjson``), one
+    result per line.
+    """
+    tenant = tenants.get(request.args.get('tenant') or DEFAULT_TENANT)
+    if tenant is None:
+        return jsonify({'error': 'Unknown tenant'}), 404
+    tenant_storage = pipelines[tenant.collection].storage
+    try:
+        query = parse_search(request.args, tenant_scope(tenant))
+        with READ_STAGE_SECONDS.time('search', 'query'):
+            results = iter(tenant_storage.search(query))
+            # The first result is fetched here so a failing query still gets a proper error
+            first = next(results, None)
+    except QueryError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"Error searching actions: {str(e)}")
+        return jsonify({'error': 'Search failed'}), 500
+    
+    ndjson = (request.args.get('format') == 'ndjson' or
+              request.accept_mimetypes.best == 'application/x-ndjson')
+    
+    def generate():
+        count = 0
+        if not ndjson:
+            yield '{"results":['
+        for document, score in itertools.chain([first] if first is not None else [], results):
+            item = dict(view(document), score=score,
+                        commit_messages=document.get('commit_messages', []))
+            line = json.dumps(item, separators=(',', ':'), default=str)
+            if ndjson:
+                yield line + '\n'
+            else:
+                yield line if count == 0 else ',' + line
+            count += 1
+        if not ndjson:
+            yield ']}'
+        READ_ROWS.observe(count, 'search')
+    
+    return Response(generate(), mimetype='application/x-ndjson' if ndjson else 'application/json')
+
+@dashboard.route('/api/export', methods=['GET'])
+def export_actions():
+    """Every matching action, oldest first, as a streamed NDJSON, CSV, Arrow or Parquet download.
+
+    Takes the /api/actions filters plus ``format``, ``fields`` (comma
+    separated) and ``compress``; storage is read in EXPORT_BATCH_SIZE batches.
+    """
+    tenant = tenants.get(request.args.get('tenant') or DEFAULT_TENANT)
+    if tenant is None:
+        return jsonify({'error': 'Unknown tenant'}), 404
+    tenant_storage = pipelines[tenant.collection].storage
+    try:
+        filters = build_filter(request.args, tenant_scope(tenant))
+        export = parse_export(request.args)
+        with READ_STAGE_SECONDS.time('export', 'query'):
+            batches = iter(tenant_storage.scan(filters, export.storage_fields()))
+            # The first batch is read here so a failing query still gets a proper error
+            first = next(batches, [])
+    except QueryError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"Error exporting actions: {str(e)}")
+        return jsonify({'error': 'Export failed'}), 500
+    
+    def counted(batches):
+        count = 0
+        for batch in batches:
+            count += len(batch)
+            yield batch
+        READ_ROWS.observe(count, 'export')
+    
+    chunks = export.write(counted(itertools.chain([first], batches)), tenant_storage.action_field)
+    return Response(chunks, mimetype=export.mimetype, headers={
+        'Content-Disposition': f'attachment; filename="{export.filename(tenant.collection)}"'
+    })
+
+@dashboard.route('/api/export/summary', methods=['GET'])
+def export_summary():
+    """Action totals, top authors and per-branch histograms over every matching action."""
+    tenant = tenants.get(request.args.get('tenant') or DEFAULT_TENANT)
+    if tenant is None:
+        return jsonify({'error': 'Unknown tenant'}), 404
+    try:
+        filters = build_filter(request.args, tenant_scope(tenant))
+        summary = parse_summary(request.args)
+        with READ_STAGE_SECONDS.time('export', 'summary'):
+            result = summarize(pipelines[tenant.collection].storage, filters, summary)
+    except QueryError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"Error summarizing actions: {str(e)}")
+        return jsonify({'error': 'Summary failed'}), 500
+    
+    return jsonify(result), 200
+
+def on_actions_written(batch, result):
+    """Fan freshly stored actions out to the feed cache, live stream and rollups."""
+    stored = result.stored(batch) if result is not None else batch
+    if result is not None and (result.errors or result.duplicates):
+        # Not every document in the batch landed, let the next read reload
+        feed_cache.invalidate()
+    elif stored:
+        # Spooled documents are left out until they are replayed
+        feed_cache.add(stored)
+    if stored:
+        formatted = [view(document) for document in stored]
+        broadcaster.publish(formatted)
+        bus.publish(COLLECTION_NAME, formatted)
+        dispatcher.publish(formatted)
+        rollups.record(stored)
+
+def on_actions_replayed(batch, result):
+    """Fan actions replayed from the spool out like freshly written ones."""
+    stored = result.stored(batch) if result is not None else batch
+    # Replayed actions are older than what was written meanwhile, reload in order
+    feed_cache.invalidate()
+    if stored:
+        formatted = [view(document) for document in stored]
+        broadcaster.publish(formatted)
+        bus.publish(COLLECTION_NAME, formatted)
+        dispatcher.publish(formatted)
+        rollups.record(stored)
+
+def on_remote_actions(collection, actions):
+    """Actions stored by another worker or node: into this worker's feed cache and streams.
+
+    Forwarding and rollups stay with the worker that stored them.
+    """
+    if collection != COLLECTION_NAME:
+        return
+    feed_cache.add_items(actions)
+    broadcaster.publish(actions)
+
+def load_feed(limit):
+    """The newest actions for the feed cache, read as one admitted request."""
+    return admission.call('read', storage.latest, limit)
+
+# Latest 50 actions, sorted by creation time, formatted once and kept in memory;
+# served as they are while reloads are shed
+feed_cache = FeedCache(
+    load_feed,
+    view
+)
+ingest_queue.on_written = on_actions_written
+spool.on_replayed = on_actions_replayed
+
+# Tells the other workers (EVENT_BUS) about the actions this one stored, and
+# feeds theirs into this worker's feed cache and live streams
+bus = create_bus(storage=storage, formatter=view, collection=COLLECTION_NAME)
+bus.subscribe(on_remote_actions)
+
+@dashboard.before_app_request
+def start_background_workers():
+    # Lazily, so each worker replays its own spool leftovers and any orphaned
+    # ones; retention passes are serialized across workers by a file lock
+    for pipeline in pipelines.values():
+        pipeline.spool.ensure_started()
+        pipeline.retention.ensure_started()
+    metrics.registry.ensure_started()
+    bus.ensure_started()
+    if metrics.registry.enabled:
+        g.request_started = time.perf_counter()
+
+@dashboard.after_app_request
+def record_request_time(response):
+    started = g.get('request_started')
+    if started is not None:
+        # The route pattern, not the path, keeps label cardinality bounded
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        REQUEST_SECONDS.observe(time.perf_counter() - started, route, request.method,
+                                str(response.status_code))
+    return response
+
+@metrics.registry.on_collect
+def collect_gauges():
+    """Per-worker gauges, sampled whenever the metrics are flushed or scraped."""
+    for collection, pipeline in pipelines.items():
+        metrics.INGEST_QUEUE_DEPTH.set(pipeline.ingest_queue.stats()['depth'], collection)
+    if storage.name == 'mongo':
+        from app.extensions import mongo
+        pool = mongo.health().get('pool')
+        if pool:
+            for state in ('open', 'checked_out', 'waiting'):
+                metrics.MONGO_POOL_CONNECTIONS.set(pool[state], state)
+
+# Fans stored actions out to every connected dashboard in this worker
+broadcaster = Broadcaster()
+
+@dashboard.route('/api/actions/stream', methods=['GET'])
+def stream_actions():
+    """Push newly stored actions to the dashboard as Server-Sent Events."""
+    cursor = request.headers.get('Last-Event-ID') or request.args.get('since')
+    return Response(
+        stream_with_context(sse_events(broadcaster, cursor)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@dashboard.route('/api/actions/poll', methods=['GET'])
+def poll_actions():
+    """Long-poll for actions stored after the `since` cursor."""
+    cursor = request.args.get('since')
+    if not cursor:
+        # First call only hands out a cursor to wait on
+        return jsonify({'cursor': broadcaster.cursor, 'actions': [], 'reset': False}), 200
+    
+    timeout = min(request.args.get('timeout', config.LONGPOLL_TIMEOUT, type=float),
+                  config.LONGPOLL_TIMEOUT)
+    cursor, actions, reset = broadcaster.wait(cursor, timeout)
+    return jsonify({'cursor': cursor, 'actions': actions, 'reset': reset}), 200
+
+@dashboard.route('/api/stats', methods=['GET'])
+def get_stats():
+    """Activity counts read from the pre-aggregated rollups only."""
+    tenant = tenants.get(request.args.get('tenant') or DEFAULT_TENANT)
+    if tenant is None:
+        return jsonify({'error': 'Unknown tenant'}), 404
+    try:
+        filters = {name: request.args[name] for name in DIMENSIONS
+                   if name != 'tenant' and request.args.get(name)}
+        if tenant_scope(tenant):
+            filters['tenant'] = tenant_scope(tenant)
+        for name in ('created_after', 'created_before'):
+            if request.args.get(name):
+                filters[name] = parse_time(name, request.args[name])
+        
+        granularity = request.args.get('granularity', 'hour')
+        group_by = request.args.get('group_by', 'bucket')
+        results = pipelines[tenant.collection].rollups.query(granularity, group_by, filters,
+                                                             parse_limit(request.args))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"Error fetching stats: {str(e)}")
+        return jsonify({'error': 'Failed to fetch stats'}), 500
+    
+    if group_by == 'bucket':
+        # ISO 8601, like every other timestamp in the API (jsonify would use RFC 1123)
+        results = [dict(row, bucket=row['bucket'].isoformat()) for row in results]
+    return jsonify({'granularity': granularity, 'group_by': group_by, 'results': results}), 200
+
+# Test endpoint to simulate webhook events
+@dashboard.route('/test-webhook', methods=['POST'])
+def test_webhook():
+    """Test endpoint to simulate webhook events."""
+    test_data = request.get_json()
+    
+    document = build_document(
+        test_data.get('action', 'push'),
+        test_data.get('author', 'TestUser'),
+        to_branch=test_data.get('to_branch', 'main'),
+        from_branch=test_data.get('from_branch', 'dev'),
+        repository=test_data.get('repository')
+    )
+    
+    try:
+        ingest_queue.put(document)
+    except QueueFull:
+        return jsonify({'error': 'Ingest queue is full'}), 503, {'Retry-After': '1'}
+    return jsonify({'status': 'Test webhook queued', 'id': str(document['_id'])}), 202
+
+@dashboard.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Every worker's counters and histograms in the Prometheus text format."""
+    if not metrics.registry.enabled:
+        return jsonify({'error': 'Metrics are disabled'}), 404
+    return Response(metrics.registry.render(), content_type=metrics.CONTENT_TYPE)
+
+@dashboard.route('/health', methods=['GET'])
+def health():
+    """Report ingest queue depth, writer status and spool backlog."""
+    stats = ingest_queue.stats()
+    spool_stats = spool.stats()
+    collections = {
+        collection: {'ingest': pipeline.ingest_queue.stats(), 'spool': pipeline.spool.stats(),
+                     'retention': pipeline.retention.stats()}
+        for collection, pipeline in pipelines.items()
+        if collection != COLLECTION_NAME
+    }
+    status = 'ok'
+    for queue_stats, pipeline_spool_stats in [(stats, spool_stats)] + [
+            (c['ingest'], c['spool']) for c in collections.values()]:
+        writer_ok = queue_stats['writer_alive'] or queue_stats['enqueued'] == 0
+        if not (writer_ok and pipeline_spool_stats['healthy']):
+            status = 'degraded'
+    mongo_health = None
+    if storage.name == 'mongo':
+        from app.extensions import mongo
+        mongo_health = mongo.health()
+    return jsonify({
+        'status': status,
+        'ingest': stats,
+        'storage': storage.stats(),
+        'spool': spool_stats,
+        'retention': pipelines[COLLECTION_NAME].retention.stats(),
+        'mongo': mongo_health,
+        'dedup': delivery_cache.stats(),
+        'tenants': tenants.stats(),
+        'rate_limits': rate_limiter.stats(),
+        'collections': collections,
+        'forwarding': dispatcher.stats(),
+        'feed': feed_cache.stats(),
+        'stream': broadcaster.stats(),
+        'bus': bus.stats(),
+        'startup': startup.stats(),
+        'admission': admission.stats()
+    }), 200
+
+@startup.task('mongo-probe')
+def probe_mongo():
+    """Select a server and open pool connections before the first request needs them."""
+    if storage.name == 'mongo':
+        from app.extensions import mongo
+        result = mongo.probe()
+        if not result['ok']:
+            raise ConnectionError(result['error'])
+
+@startup.task('indexes')
+def ensure_indexes():
+    """Indexes behind the feed, paged queries, the delivery guard and the rollups."""
+    for pipeline in pipelines.values():
+        pipeline.storage.ensure_indexes()
+        pipeline.rollups.ensure_indexes()
+    
\ No newline at end of file
@@ -0,0 +1,374 @@
+"""
+Prometheus metrics shared by every worker process.
+
+Counters and histograms are recorded in plain per-process dicts, under one
+lock per metric. A background thread writes this process's values to
+``<METRICS_DIR>/<pid>.json`` every METRICS_FLUSH_SECONDS (and at exit), and
+whichever worker answers ``/metrics`` merges every file into one exposition,
+so a scrape sees all gunicorn workers no matter which one it hits. Files of
+workers that are gone are folded into ``dead.json`` so their counts survive
+worker restarts; gauges are per process, labelled with ``pid``, and only
+reported for live ones. Other workers' values can lag by up to one flush
+interval.
+
+With METRICS_ENABLED off every ``observe``/``inc`` returns after one
+attribute check and ``time()`` hands back a shared no-op context manager
+(benchmarks/bench_metrics.py measures both).
+"""
+import atexit
+import fcntl
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+
+from app import config
+
+# Seconds: half a millisecond to ten seconds
+DEFAULT_BUCKETS = (.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+ROW_BUCKETS = (0, 1, 5, 10, 25, 50, 100, 200, 500, 1000)
+DEAD_FILE = 'dead.json'
+LOCK_FILE = '.lock'
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    __slots__ = ('histogram', 'labels', 'started')
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, *self.labels)
+        return False
+
+
+class Metric:
+    """One named metric; ``values`` maps a tuple of label values to its value."""
+
+    kind = None
+
+    def __init__(self, registry, name, documentation, labels=()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def dump(self):
+        with self._lock:
+            return [[list(labels), value] for labels, value in self.values.items()]
+
+    def clear(self):
+        with self._lock:
+            self.values = {}
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, *labels, amount=1):
+        if not self.registry.enabled:
+            return
+        with self._lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    @staticmethod
+    def merge(current, value):
+        return value if current is None else current + value
+
+
+class Gauge(Metric):
+    """A per-process value, set by a collector right before each snapshot."""
+
+    kind = 'gauge'
+
+    def set(self, value, *labels):
+        with self._lock:
+            self.values[labels] = value
+
+
+class Histogram(Metric):
+    """Bucket counts (the last one is +Inf) followed by the sum of observations."""
+
+    kind = 'histogram'
+
+    def __init__(self, registry, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(registry, name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        if not self.registry.enabled:
+            return
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self.values.get(labels)
+            if state is None:
+                state = self.values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            state[index] += 1
+            state[-1] += value
+
+    def time(self, *labels):
+        """Context manager observing the seconds spent in its block."""
+        if not self.registry.enabled:
+            return NULL_TIMER
+        return _Timer(self, labels)
+
+    def merge(self, current, value):
+        if len(value) != len(self.buckets) + 2:
+            # Written with other buckets, by an older deploy
+            return current
+        if current is None:
+            return list(value)
+        return [a + b for a, b in zip(current, value)]
+
+
+class Registry:
+    """This process's metrics plus the snapshot files of every other worker."""
+
+    def __init__(self, enabled=None, directory=None, flush_interval=None):
+        self.enabled = config.METRICS_ENABLED if enabled is None else enabled
+        self.directory = config.METRICS_DIR if directory is None else directory
+        self.flush_interval = flush_interval or config.METRICS_FLUSH_SECONDS
+        self.metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def counter(self, name, documentation, labels=()):
+        return self._add(Counter(self, name, documentation, labels))
+
+    def gauge(self, name, documentation, labels=()):
+        return self._add(Gauge(self, name, documentation, labels))
+
+    def histogram(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(self, name, documentation, labels, buckets))
+
+    def on_collect(self, collector):
+        """Call ``collector()`` before every snapshot, e.g. to set gauges."""
+        self._collectors.append(collector)
+        return collector
+
+    def ensure_started(self):
+        """Start the flush thread in this process (once per process)."""
+        if not self.enabled or self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            if self._pid is None:
+                atexit.register(self.flush)
+            else:
+                # Forked: the values belong to the parent, which reports them itself
+                for metric in self.metrics.values():
+                    metric.clear()
+            self._pid = os.getpid()
+            if self.directory:
+                self._thread = threading.Thread(target=self._run, name='metrics-flush',
+                                                daemon=True)
+                self._thread.start()
+
+    def flush(self):
+        """Write this process's snapshot to ``<directory>/<pid>.json``."""
+        if not (self.enabled and self.directory) or self._pid != os.getpid():
+            return
+        try:
+            _write(self._path(os.getpid()), self._snapshot())
+        except OSError as e:
+            print(f"Metrics: cannot write snapshot: {str(e)}")
+
+    def render(self):
+        """Every worker's metrics in the Prometheus text format."""
+        merged = self._gather()
+        lines = []
+        for name, metric in self.metrics.items():
+            lines.append(f'# HELP {name} {metric.documentation}')
+            lines.append(f'# TYPE {name} {metric.kind}')
+            labelnames = metric.labels + (('pid',) if metric.kind == 'gauge' else ())
+            for labels, value in sorted(merged.get(name, {}).items()):
+                pairs = list(zip(labelnames, labels))
+                if metric.kind != 'histogram':
+                    lines.append(f'{name}{_labels(pairs)} {_number(value)}')
+                    continue
+                cumulative = 0
+                for bound, count in zip(metric.buckets + (float('inf'),), value[:-1]):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{_labels(pairs + [("le", _number(bound))])} '
+                                 f'{cumulative}')
+                lines.append(f'{name}_sum{_labels(pairs)} {_number(value[-1])}')
+                lines.append(f'{name}_count{_labels(pairs)} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+    def _add(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def _snapshot(self):
+        for collector in self._collectors:
+            try:
+                collector()
+            except Exception as e:
+                print(f"Metrics: collector failed: {str(e)}")
+        return {name: metric.dump() for name, metric in self.metrics.items()}
+
+    def _gather(self):
+        """name -> {labels: value} over this process, live workers and dead ones."""
+        merged = {}
+        own = self._snapshot()
+        self._merge(merged, own, os.getpid())
+        if not self.directory:
+            return merged
+
+        os.makedirs(self.directory, exist_ok=True)
+        if self._pid == os.getpid():
+            _write(self._path(os.getpid()), own)
+        with open(os.path.join(self.directory, LOCK_FILE), 'a') as lock:
+            # Only one worker at a time folds dead workers' files into dead.json
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            dead = {}
+            self._merge(dead, _read(os.path.join(self.directory, DEAD_FILE)))
+            retired = []
+            for name in os.listdir(self.directory):
+                if not name.endswith('.json') or not name[:-5].isdigit():
+                    continue
+                pid = int(name[:-5])
+                if pid == os.getpid():
+                    continue
+                snapshot = _read(os.path.join(self.directory, name))
+                if _alive(pid):
+                    self._merge(merged, snapshot, pid)
+                else:
+                    self._merge(dead, snapshot)
+                    retired.append(name)
+            if retired:
+                _write(os.path.join(self.directory, DEAD_FILE),
+                       {name: [[list(labels), value] for labels, value in values.items()]
+                        for name, values in dead.items()})
+                for name in retired:
+                    os.remove(os.path.join(self.directory, name))
+        self._merge(merged, {name: [[list(labels), value] for labels, value in values.items()]
+                             for name, values in dead.items()})
+        return merged
+
+    def _merge(self, into, snapshot, pid=None):
+        """Add ``snapshot``'s values to ``into``; gauges only from a live ``pid``."""
+        for name, samples in snapshot.items():
+            metric = self.metrics.get(name)
+            if metric is None:
+                continue
+            values = into.setdefault(name, {})
+            for labels, value in samples:
+                labels = tuple(labels)
+                if metric.kind == 'gauge':
+                    if pid is not None:
+                        values[labels + (str(pid),)] = value
+                    continue
+                merged = metric.merge(values.get(labels), value)
+                if merged is not None:
+                    values[labels] = merged
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def _path(self, pid):
+        return os.path.join(self.directory, f'{pid}.json')
+
+
+def _read(path):
+    try:
+        with open(path) as snapshot:
+            return json.load(snapshot)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write(path, snapshot):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = f'{path}.{threading.get_ident()}.tmp'
+    with open(temporary, 'w') as output:
+        json.dump(snapshot, output, separators=(',', ':'))
+    os.replace(temporary, path)
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _labels(pairs):
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+
+# Process-wide registry and the metrics recorded across the app
+registry = Registry()
+
+REQUEST_SECONDS = registry.histogram(
+    'webhook_http_request_duration_seconds', 'Request latency by route, method and status.',
+    ('route', 'method', 'status'))
+INGEST_STAGE_SECONDS = registry.histogram(
+    'webhook_ingest_stage_seconds',
+    'Time spent per webhook ingest stage (write is per batch, by the background writer).',
+    ('stage',))
+DELIVERIES = registry.counter(
+    'webhook_deliveries_total', 'Webhook deliveries by tenant and outcome.', ('tenant', 'outcome'))
+DOCUMENTS_WRITTEN = registry.counter(
+    'webhook_documents_written_total', 'Documents handed to storage by the ingest writer.',
+    ('collection', 'outcome'))
+READ_STAGE_SECONDS = registry.histogram(
+    'webhook_read_stage_seconds', 'Time spent per read-path stage.', ('endpoint', 'stage'))
+READ_ROWS = registry.histogram(
+    'webhook_read_rows', 'Rows returned per read.', ('endpoint',), buckets=ROW_BUCKETS)
+INGEST_QUEUE_DEPTH = registry.gauge(
+    'webhook_ingest_queue_depth', 'Documents waiting for the ingest writer.', ('collection',))
+MONGO_POOL_CONNECTIONS = registry.gauge(
+    'webhook_mongo_pool_connections', 'MongoDB pool connections by state.', ('state',))
+BUS_MESSAGES = registry.counter(
+    'webhook_bus_messages_total', 'Event bus messages sent and received.', ('backend', 'direction'))
+BUS_PROPAGATION_SECONDS = registry.histogram(
+    'webhook_bus_propagation_seconds',
+    'Time from a worker sending an event bus message to another worker receiving it.',
+    ('backend',))
@@ -0,0 +1,93 @@
+import base64
+import json
+from datetime import datetime, timezone
+
+from bson import ObjectId
+
+from app import config
+
+# Equality filters accepted in query strings and by every storage backend
+FILTER_FIELDS = ('action', 'author', 'to_branch', 'from_branch', 'repository', 'tenant')
+
+# Parameters that switch an endpoint from the cached feed to a paged query
+QUERY_PARAMS = FILTER_FIELDS + ('cursor', 'limit', 'created_after', 'created_before')
+
+
+class QueryError(ValueError):
+    """Raised for a malformed filter, limit or cursor in a query string."""
+
+
+def is_paged_query(args):
+    """True when the request asks for anything beyond the default latest feed."""
+    return any(name in args for name in QUERY_PARAMS)
+
+
+def build_filter(args, tenant=None):
+    """Turn query-string filters into the backend-neutral filter dict storage expects.
+
+    Keys are the FILTER_FIELDS (equality) plus ``created_after`` (inclusive)
+    and ``created_before`` (exclusive) as naive UTC datetimes. The ``tenant``
+    parameter only picks whose data is read; the filter on it is the
+    ``tenant`` name passed in, once the caller has resolved it.
+    """
+    filters = {}
+    for name in FILTER_FIELDS:
+        value = args.get(name)
+        if value and name != 'tenant':
+            filters[name] = value
+    if tenant:
+        filters['tenant'] = tenant
+
+    for name in ('created_after', 'created_before'):
+        value = args.get(name)
+        if value:
+            filters[name] = parse_time(name, value)
+    return filters
+
+
+def parse_limit(args):
+    """Page size from the query string, clamped to PAGE_SIZE_MAX."""
+    try:
+        limit = int(args.get('limit', config.PAGE_SIZE_DEFAULT))
+    except ValueError:
+        raise QueryError("limit must be an integer")
+    if limit < 1:
+        raise QueryError("limit must be positive")
+    return min(limit, config.PAGE_SIZE_MAX)
+
+
+def encode_cursor(document):
+    """Opaque, URL-safe cursor pointing just past ``document``."""
+    raw = json.dumps([document['created_at'].isoformat(), str(document['_id'])])
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Inverse of ``encode_cursor``: returns (created_at, id string)."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, last_id = json.loads(base64.urlsafe_b64decode(padded))
+        created_at, last_id = datetime.fromisoformat(created_at), str(last_id)
+    except Exception:
+        raise QueryError("Invalid cursor")
+    # Backends turn the id back into an ObjectId, which would fail as a 500
+    if not ObjectId.is_valid(last_id):
+        raise QueryError("Invalid cursor")
+    return created_at, last_id
+
+
+def utcnow():
+    """The current time as the naive UTC datetime stored in created_at."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def parse_time(name, value):
+    """Parse an ISO 8601 query-string timestamp into a naive UTC datetime."""
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        raise QueryError(f"{name} must be an ISO 8601 timestamp")
+    # created_at is stored as a naive UTC datetime
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
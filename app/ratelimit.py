@@ -0,0 +1,80 @@
+import threading
+import time
+from collections import OrderedDict
+
+from app import config
+
+
+class TokenBucket:
+    """``rate`` tokens per second, holding at most ``burst``; starts full."""
+
+    __slots__ = ('rate', 'burst', 'tokens', 'updated')
+
+    def __init__(self, rate, burst, now):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def take(self, now):
+        """Spend one token; returns 0 on success, else the seconds until one is available."""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """Process-local token buckets keyed by e.g. (tenant, repository).
+
+    Each key gets its own bucket, so one noisy repository only exhausts its
+    own tokens. At most ``max_keys`` buckets are kept; the least recently
+    used one is dropped first, which only ever errs on the side of allowing.
+
+    Buckets are not shared between worker processes: each worker allows the
+    full rate, so N workers together allow up to N times as many deliveries.
+    """
+
+    def __init__(self, max_keys=None):
+        self.max_keys = max_keys or config.RATE_LIMIT_MAX_KEYS
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+        self.allowed = 0
+        self.limited = 0
+
+    def acquire(self, key, rate, burst):
+        """Take a token for ``key``; returns 0 if allowed, else seconds to wait.
+
+        A falsy ``rate`` means unlimited.
+        """
+        if not rate:
+            return 0
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None or bucket.rate != rate:
+                bucket = self._buckets[key] = TokenBucket(rate, max(burst or rate, 1), now)
+                if len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            self._buckets.move_to_end(key)
+            wait = bucket.take(now)
+            if wait:
+                self.limited += 1
+            else:
+                self.allowed += 1
+            return wait
+
+    def stats(self):
+        with self._lock:
+            return {
+                'keys': len(self._buckets),
+                'max_keys': self.max_keys,
+                'allowed': self.allowed,
+                'limited': self.limited,
+            }
+
+
+# Per-worker buckets shared by the dashboard and webhook blueprints
+rate_limiter = RateLimiter()
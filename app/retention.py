@@ -0,0 +1,263 @@
+"""
+Retention for a stored collection: expiry, archiving and the archive reader.
+
+Documents older than ARCHIVE_AFTER_DAYS are moved out of storage into
+gzip-compressed JSON Lines files, one per UTC day:
+
+    <ARCHIVE_DIR>/<collection>/<YYYY>/<MM>/<YYYY-MM-DD>.jsonl.gz
+
+Each archiving pass appends one gzip member per day it touched, so files are
+never rewritten; gzip readers stream the members back to back. Documents
+are written (and fsync'd) before they are deleted from storage, so a crash
+in between can only leave a copy in both places, which the reader skips.
+
+Documents older than RETENTION_DAYS are deleted outright: by a TTL index on
+MongoDB, by a periodic ``expire`` elsewhere and on MongoDB with a hot tier
+(the TTL index stays as a backstop; ``expire`` also prunes the hot tier). Archived days stay queryable
+through ``Archive.find`` or ``python -m app.cli archive query``.
+"""
+import fcntl
+import gzip
+import os
+import threading
+import time
+import zlib
+from datetime import date, timedelta
+
+from bson import json_util
+
+from app import config
+from app.queries import utcnow
+from app.storage.base import matches
+
+PARTITION_SUFFIX = '.jsonl.gz'
+DAY_SECONDS = 86400
+
+# Relaxed extended JSON keeps archives readable by other tools (dates as ISO
+# strings) while _id and created_at still come back as ObjectId and datetime
+JSON_OPTIONS = json_util.RELAXED_JSON_OPTIONS.with_options(tz_aware=False)
+
+
+class Archive:
+    """The date-partitioned archive files of one collection."""
+
+    def __init__(self, collection, directory=None, action_field='action'):
+        self.collection = collection
+        self.directory = os.path.join(directory or config.ARCHIVE_DIR, collection)
+        self.action_field = action_field
+
+    def write(self, documents):
+        """Append ``documents`` to their day's partitions; returns the bytes written."""
+        days = {}
+        for document in documents:
+            days.setdefault(document['created_at'].date(), []).append(document)
+
+        written = 0
+        for day, day_documents in days.items():
+            data = ''.join(json_util.dumps(document, json_options=JSON_OPTIONS) + '\n'
+                           for document in day_documents).encode('utf-8')
+            member = gzip.compress(data)
+            path = self._path(day)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'ab') as partition:
+                partition.write(member)
+                partition.flush()
+                os.fsync(partition.fileno())
+            written += len(member)
+        return written
+
+    def partitions(self, created_after=None, created_before=None):
+        """(day, path) of every partition that can hold documents in the range, oldest first."""
+        found = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if not name.endswith(PARTITION_SUFFIX):
+                    continue
+                try:
+                    day = date.fromisoformat(name[:-len(PARTITION_SUFFIX)])
+                except ValueError:
+                    continue
+                if created_after is not None and day < created_after.date():
+                    continue
+                if created_before is not None and day > created_before.date():
+                    continue
+                found.append((day, os.path.join(root, name)))
+        return sorted(found)
+
+    def find(self, filters=None, limit=None):
+        """Stream archived documents matching ``filters`` (as built by
+        ``queries.build_filter``), oldest first."""
+        filters = filters or {}
+        returned = 0
+        for _, path in self.partitions(filters.get('created_after'), filters.get('created_before')):
+            # An interrupted pass can archive a document twice
+            seen = set()
+            for document in self._read(path):
+                if document['_id'] in seen or not matches(document, filters, self.action_field):
+                    continue
+                seen.add(document['_id'])
+                yield document
+                returned += 1
+                if limit and returned >= limit:
+                    return
+
+    def stats(self):
+        partitions = self.partitions()
+        return {
+            'directory': self.directory,
+            'partitions': len(partitions),
+            'bytes': sum(os.path.getsize(path) for _, path in partitions),
+            'oldest': partitions[0][0].isoformat() if partitions else None,
+            'newest': partitions[-1][0].isoformat() if partitions else None,
+        }
+
+    def _read(self, path):
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as partition:
+                for line in partition:
+                    yield json_util.loads(line, json_options=JSON_OPTIONS)
+        except (EOFError, zlib.error, gzip.BadGzipFile):
+            # A member still being appended, or one torn by a crash
+            return
+
+    def _path(self, day):
+        return os.path.join(self.directory, f'{day:%Y}', f'{day:%m}',
+                            f'{day.isoformat()}{PARTITION_SUFFIX}')
+
+
+class Retention:
+    """Expires and archives one storage's documents from a background thread.
+
+    Every worker runs the thread, but each pass first takes an exclusive
+    flock on ``<ARCHIVE_DIR>/<collection>.lock`` and is skipped when another
+    process holds it, so one process does the work at a time. Passes run
+    every ``interval`` seconds and archive at most ``batch`` documents per
+    storage round trip, oldest first, so the hot indexes only ever cover the
+    retained window.
+    """
+
+    def __init__(self, storage, collection, retention_days=None, archive_after_days=None,
+                 directory=None, interval=None, batch=None):
+        self.storage = storage
+        self.collection = collection
+        self.retention_days = (config.RETENTION_DAYS if retention_days is None
+                               else retention_days) or None
+        self.archive_after_days = (config.ARCHIVE_AFTER_DAYS if archive_after_days is None
+                                   else archive_after_days) or None
+        if (self.retention_days and self.archive_after_days
+                and self.retention_days <= self.archive_after_days):
+            raise ValueError(f"{collection}: retention ({self.retention_days} days) must be longer "
+                             f"than ARCHIVE_AFTER_DAYS ({self.archive_after_days} days) or "
+                             f"documents expire before they are archived")
+        self.directory = directory or config.ARCHIVE_DIR
+        self.archive = Archive(collection, self.directory, storage.action_field)
+        self.interval = interval or config.ARCHIVE_INTERVAL_SECONDS
+        self.batch = batch or config.ARCHIVE_BATCH
+
+        self.ttl = None
+        self.last_run = None
+        self.last_error = None
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._counters = {'archived': 0, 'archived_bytes': 0, 'expired': 0, 'passes': 0}
+
+    def ensure_started(self):
+        """Start the retention thread in this process (once per process)."""
+        if self._pid == os.getpid() and self._thread is not None:
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None:
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name=f'{self.collection}-retention',
+                                            daemon=True)
+            self._thread.start()
+
+    def ensure_ttl(self):
+        """Hand expiry to the backend's TTL support, where it has one."""
+        seconds = self.retention_days * DAY_SECONDS if self.retention_days else None
+        self.ttl = self.storage.ensure_ttl(seconds)
+        return self.ttl
+
+    def run_once(self):
+        """One archive + expiry pass; returns (archived, expired)."""
+        archived = expired = 0
+        if self.archive_after_days:
+            cutoff = utcnow() - timedelta(days=self.archive_after_days)
+            while True:
+                documents = self.storage.oldest(cutoff, self.batch)
+                if not documents:
+                    break
+                size = self.archive.write(documents)
+                deleted = self.storage.delete([document['_id'] for document in documents])
+                archived += len(documents)
+                self._incr('archived', len(documents))
+                self._incr('archived_bytes', size)
+                if deleted < len(documents):
+                    # Deleted elsewhere meanwhile, or not deletable: retry next pass
+                    break
+
+        if self.retention_days and not self.ttl:
+            expired = self.storage.expire(utcnow() - timedelta(days=self.retention_days))
+            self._incr('expired', expired)
+
+        self._incr('passes')
+        self.last_run = utcnow().isoformat()
+        return archived, expired
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+        return {
+            'retention_days': self.retention_days,
+            'archive_after_days': self.archive_after_days,
+            'ttl_index': bool(self.ttl),
+            'last_run': self.last_run,
+            'last_error': self.last_error,
+            **counters,
+        }
+
+    def _run(self):
+        if not (self.retention_days or self.archive_after_days):
+            # Nothing to do but drop a TTL index left by an earlier configuration
+            try:
+                self.ensure_ttl()
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"{self.collection} retention: cannot update TTL index: {str(e)}")
+            return
+
+        ttl_ready = False
+        while True:
+            lock = self._try_lock()
+            if lock is not None:
+                try:
+                    if not ttl_ready:
+                        self.ensure_ttl()
+                        ttl_ready = True
+                    archived, expired = self.run_once()
+                    if archived or expired:
+                        print(f"{self.collection} retention: archived {archived}, expired {expired}")
+                    self.last_error = None
+                except Exception as e:
+                    self.last_error = str(e)
+                    print(f"{self.collection} retention: pass failed: {str(e)}")
+                finally:
+                    lock.close()
+            time.sleep(self.interval)
+
+    def _try_lock(self):
+        os.makedirs(self.directory, exist_ok=True)
+        lock = open(os.path.join(self.directory, f'{self.collection}.lock'), 'a')
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock.close()
+            return None
+        return lock
+
+    def _incr(self, counter, amount=1):
+        with self._lock:
+            self._counters[counter] += amount
+
@@ -0,0 +1,209 @@
+"""
+Pre-aggregated activity counters per (hour|day, action, branch, author,
+repository, tenant).
+
+Every pipeline's ingest writer calls its ``Rollups.record`` with every
+stored batch, which turns into one unordered bulk of ``$inc`` upserts per
+granularity. ``/api/stats`` reads only these collections, never the raw
+actions. Each collection has its own counters (``rollup_prefix``).
+
+Rebuild the counters from a raw collection with:
+
+    python -m app.cli rollups backfill --rebuild
+    python -m app.cli rollups backfill --collection acme_actions --rebuild
+"""
+from collections import Counter
+from datetime import datetime
+
+from app import config
+from app.storage.base import truncate
+
+GRANULARITIES = ('hour', 'day')
+DIMENSIONS = ('action', 'branch', 'author', 'repository', 'tenant')
+GROUP_BY = DIMENSIONS + ('bucket',)
+
+# Raw fields a rollup needs; used as the backfill projection
+SOURCE_FIELDS = {'action': 1, 'author': 1, 'to_branch': 1, 'repository': 1, 'tenant': 1,
+                 'created_at': 1}
+
+# The unique upsert key, named per dimension set: one left by an older set is dropped
+KEY_INDEX = 'rollup_key_' + '_'.join(DIMENSIONS)
+
+
+class Rollups:
+    """Hourly and daily counters kept in ``<prefix>_hourly`` / ``<prefix>_daily``.
+
+    Pass ``db`` directly or a ``get_db`` function to resolve it lazily.
+    """
+
+    def __init__(self, db=None, prefix=None, get_db=None):
+        self.prefix = prefix or config.ROLLUP_PREFIX
+        self._get_db = get_db or (lambda: db)
+
+    @property
+    def collections(self):
+        db = self._get_db()
+        return {
+            'hour': db[f'{self.prefix}_hourly'],
+            'day': db[f'{self.prefix}_daily'],
+        }
+
+    def record(self, documents):
+        """Add stored action documents to the hourly and daily counters."""
+        if not documents:
+            return
+        from pymongo import UpdateOne
+
+        for granularity, collection in self.collections.items():
+            counts = Counter(self._key(document, granularity) for document in documents)
+            collection.bulk_write([
+                UpdateOne(dict(zip(('bucket',) + DIMENSIONS, key)),
+                          {'$inc': {'count': count}}, upsert=True)
+                for key, count in counts.items()
+            ], ordered=False)
+
+    def query(self, granularity='hour', group_by='bucket', filters=None, limit=100):
+        """Sum counters matching ``filters``, grouped by one dimension or by bucket.
+
+        ``filters`` may hold the DIMENSIONS plus ``created_after`` /
+        ``created_before`` datetimes. Grouping by bucket gives a time series in
+        ascending order; grouping by a dimension gives the top ``limit`` values.
+        """
+        check_query(granularity, group_by)
+
+        match = {}
+        for name, value in (filters or {}).items():
+            if name == 'created_after':
+                match.setdefault('bucket', {})['$gte'] = truncate(value, granularity)
+            elif name == 'created_before':
+                match.setdefault('bucket', {})['$lt'] = value
+            else:
+                match[name] = value
+
+        sort = {'_id': 1} if group_by == 'bucket' else {'count': -1, '_id': 1}
+        pipeline = [
+            {'$match': match},
+            {'$group': {'_id': f'${group_by}', 'count': {'$sum': '$count'}}},
+            {'$sort': sort},
+            {'$limit': limit},
+        ]
+        return [
+            {group_by: row['_id'], 'count': row['count']}
+            for row in self.collections[granularity].aggregate(pipeline)
+        ]
+
+    def backfill(self, source, chunk_size=None, rebuild=False):
+        """Recount rollups from the raw collection, streaming it in chunks.
+
+        Events ingested while a backfill runs may be counted twice, so run it
+        with ingestion paused when exact numbers matter.
+        """
+        from pymongo import ASCENDING
+
+        chunk_size = chunk_size or config.ROLLUP_BACKFILL_CHUNK
+        if rebuild:
+            for collection in self.collections.values():
+                collection.delete_many({})
+
+        processed = 0
+        chunk = []
+        cursor = source.find({}, SOURCE_FIELDS).sort('_id', ASCENDING).batch_size(chunk_size)
+        for document in cursor:
+            chunk.append(document)
+            if len(chunk) >= chunk_size:
+                self.record(chunk)
+                processed += len(chunk)
+                chunk = []
+                print(f"   {processed} events rolled up...")
+        self.record(chunk)
+        return processed + len(chunk)
+
+    def ensure_indexes(self):
+        """Unique key index for the upserts, plus the common filter orders.
+
+        A key index over fewer dimensions would reject counters that only
+        differ in the new ones, so it goes; ``backfill --rebuild`` then
+        fills the new dimensions in for older counters.
+        """
+        from pymongo import ASCENDING
+        from pymongo.errors import OperationFailure
+
+        from app.storage.mongo import INDEX_NOT_FOUND
+
+        for collection in self.collections.values():
+            for name in collection.index_information():
+                if name.startswith('rollup_key') and name != KEY_INDEX:
+                    try:
+                        collection.drop_index(name)
+                    except OperationFailure as e:
+                        # Another worker dropped it first
+                        if e.code != INDEX_NOT_FOUND:
+                            raise
+            collection.create_index(
+                [('bucket', ASCENDING)] + [(name, ASCENDING) for name in DIMENSIONS],
+                name=KEY_INDEX, unique=True)
+            for name in DIMENSIONS:
+                collection.create_index([(name, ASCENDING), ('bucket', ASCENDING)],
+                                        name=f'{name}_bucket')
+
+    @staticmethod
+    def _key(document, granularity):
+        created_at = document.get('created_at') or datetime.utcnow()
+        return (
+            truncate(created_at, granularity),
+            document.get('action') or 'unknown',
+            document.get('to_branch') or 'unknown',
+            document.get('author') or 'Unknown',
+            document.get('repository') or 'unknown',
+            document.get('tenant') or 'unknown',
+        )
+
+
+class StorageCounts:
+    """Same ``query`` interface as Rollups, answered by the storage backend's ``count``.
+
+    Used for backends without rollup collections (SQLite, memory), where
+    grouping the raw events is cheap enough.
+    """
+
+    def __init__(self, storage):
+        self.storage = storage
+
+    def record(self, documents):
+        """Nothing to maintain: counts are computed at query time."""
+
+    def ensure_indexes(self):
+        """The backend's own indexes already cover the counted fields."""
+
+    def query(self, granularity='hour', group_by='bucket', filters=None, limit=100):
+        check_query(granularity, group_by)
+        filters = {('to_branch' if name == 'branch' else name): value
+                   for name, value in (filters or {}).items()}
+        field = {'bucket': granularity, 'branch': 'to_branch'}.get(group_by, group_by)
+        return [{group_by: row[field], 'count': row['count']}
+                for row in self.storage.count(field, filters, limit)]
+
+
+def rollup_prefix(collection):
+    """Prefix of ``collection``'s rollup collections: ROLLUP_PREFIX for the default
+    collection, ``<collection>_<ROLLUP_PREFIX>`` for any other."""
+    if collection == config.COLLECTION_NAME:
+        return config.ROLLUP_PREFIX
+    return f'{collection}_{config.ROLLUP_PREFIX}'
+
+
+def create_rollups(storage, collection=None):
+    """Rollup collections on MongoDB, query-time counts on every other backend."""
+    if storage.name == 'mongo':
+        return Rollups(prefix=rollup_prefix(collection or config.COLLECTION_NAME),
+                       get_db=lambda: storage.db)
+    return StorageCounts(storage)
+
+
+def check_query(granularity, group_by):
+    """Validate a /api/stats granularity and grouping."""
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"granularity must be one of {', '.join(GRANULARITIES)}")
+    if group_by not in GROUP_BY:
+        raise ValueError(f"group_by must be one of {', '.join(GROUP_BY)}")
+
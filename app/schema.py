@@ -0,0 +1,263 @@
+"""
+The one stored shape of an action, shared by /webhook and /webhook/receiver.
+
+Everything a read shows is computed once, when the action is stored:
+``epoch`` (UTC seconds of ``timestamp``), ``formatted_time`` and
+``display_text``. Reads (``view``) are then a plain projection of stored
+fields. Documents carry ``schema_version``; ``upgrade`` brings an older
+document up to SCHEMA_VERSION one registered migration at a time, reads do
+that on the fly for anything not migrated yet, and
+
+    python -m app.cli schema migrate --collection actions
+    python -m app.cli schema migrate --database webhook_db --collection events
+
+rewrites a collection in place, EXPORT_BATCH_SIZE documents per chunk.
+Already-current documents are skipped, so an interrupted run can simply be
+started again.
+
+Version 1 is everything stored before the field existed: dashboard actions
+formatted on every read, and receiver events with their action in ``type``
+and a pre-built ``message`` line. Version 2 pushes kept only the last
+segment of the branch (``1.2`` for ``release/1.2``); ``migrate`` puts the
+full name back where the repository's other actions name exactly one
+branch ending in that segment, and leaves the rest as they are.
+"""
+from datetime import datetime, timezone
+
+from bson import ObjectId
+
+from app import config
+from app.events import REVIEW_VERBS, branch_name
+from app.queries import utcnow
+
+SCHEMA_VERSION = 3
+
+# How formatted_time reads
+TIME_DISPLAY = '%d %B %Y - %I:%M %p UTC'
+UNKNOWN_TIME = 'Unknown time'
+
+# display_text per action; fields missing from the document read as None
+DISPLAY = {
+    'push': '"{author}" pushed to "{to_branch}" on {time}',
+    'pull_request': '"{author}" submitted a pull request from "{from_branch}" to "{to_branch}" on {time}',
+    'merge': '"{author}" merged branch "{from_branch}" to "{to_branch}" on {time}',
+    'create': '"{author}" created {ref_type} "{to_branch}" on {time}',
+    'delete': '"{author}" deleted {ref_type} "{to_branch}" on {time}',
+    'release': '"{author}" published release "{name}" from "{to_branch}" on {time}',
+    'review': '"{author}" {verb} the pull request from "{from_branch}" to "{to_branch}" on {time}',
+    'workflow_run': 'Workflow "{name}" finished with {state} on "{to_branch}" (run by "{author}") on {time}',
+    'check_suite': 'Check suite from "{name}" finished with {state} on "{to_branch}" on {time}',
+}
+DISPLAY_DEFAULT = '"{author}" performed {action} on {time}'
+
+# Stored only when set
+OPTIONAL_FIELDS = ('ref_type', 'state', 'name', 'commit_messages', 'delivery_id')
+
+# Fields holding a branch name
+BRANCH_FIELDS = ('to_branch', 'from_branch')
+
+# from version -> function upgrading a document of that version by one, in place
+MIGRATIONS = {}
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def migration(version):
+    """Register the upgrade from ``version`` to ``version + 1``."""
+    def register(func):
+        MIGRATIONS[version] = func
+        return func
+    return register
+
+
+def parse_timestamp(value):
+    """An ISO 8601 timestamp (any offset, or ``Z``) as a naive UTC datetime; None if unparseable."""
+    if isinstance(value, datetime):
+        parsed = value
+    else:
+        try:
+            parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except (AttributeError, ValueError):
+            return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def display_fields(document, moment):
+    """Set epoch, formatted_time and display_text from ``moment`` and the document's fields."""
+    if moment is None:
+        document['epoch'] = None
+        document['formatted_time'] = UNKNOWN_TIME
+    else:
+        document['epoch'] = (moment - _EPOCH).total_seconds()
+        document['formatted_time'] = moment.strftime(TIME_DISPLAY)
+    template = DISPLAY.get(document.get('action'), DISPLAY_DEFAULT)
+    document['display_text'] = template.format(
+        author=document.get('author', 'Unknown'), action=document.get('action', 'unknown'),
+        from_branch=document.get('from_branch'), to_branch=document.get('to_branch'),
+        ref_type=document.get('ref_type') or 'ref', name=document.get('name'),
+        state=document.get('state'), verb=REVIEW_VERBS.get(document.get('state'), 'reviewed'),
+        time=document['formatted_time'])
+    return document
+
+
+def build_document(action, author, to_branch=None, from_branch=None, repository=None,
+                   tenant=None, timestamp=None, request_id=None, **optional):
+    """A new action in the current schema, display fields included.
+
+    ``timestamp`` is the action's time (ISO 8601 or a datetime), the time of
+    the call when missing or unparseable. ``optional`` takes the
+    OPTIONAL_FIELDS, left out when None or empty.
+    """
+    now = utcnow()
+    moment = parse_timestamp(timestamp) if timestamp is not None else None
+    if moment is None:
+        moment = now
+    document = {
+        # Assigned here rather than by the database, so the 202 can name the stored record
+        '_id': ObjectId(),
+        'schema_version': SCHEMA_VERSION,
+        'action': action,
+        'author': author,
+        'from_branch': from_branch,
+        'to_branch': to_branch,
+        'repository': repository,
+        'tenant': tenant,
+        'timestamp': moment.isoformat(),
+        'request_id': request_id or str(ObjectId()),
+        'created_at': now,
+    }
+    for field in OPTIONAL_FIELDS:
+        value = optional.pop(field, None)
+        if value:
+            document[field] = value
+    if optional:
+        raise TypeError(f"Unknown fields: {', '.join(optional)}")
+    return display_fields(document, moment)
+
+
+def event_document(event, tenant=None, delivery_id=None):
+    """``build_document`` for a WebhookEvent from ``app.events.extract_event``.
+
+    The action keeps the time GitHub reports for the event, whichever
+    endpoint received it; the time of receipt when the payload has none.
+    """
+    return build_document(
+        event.action, event.author, event.to_branch, event.from_branch, event.repository,
+        tenant=tenant, timestamp=event.timestamp, request_id=delivery_id, ref_type=event.ref_type,
+        state=event.state, name=event.name, commit_messages=event.messages,
+        delivery_id=delivery_id)
+
+
+def version_of(document):
+    return document.get('schema_version', 1)
+
+
+def upgrade(document):
+    """``document`` in the current schema: itself when already current, else an upgraded copy."""
+    version = version_of(document)
+    if version >= SCHEMA_VERSION:
+        return document
+    document = dict(document)
+    while version < SCHEMA_VERSION:
+        MIGRATIONS[version](document)
+        version += 1
+        document['schema_version'] = version
+    return document
+
+
+@migration(1)
+def _display_fields(document):
+    """Receiver events move ``type`` to ``action`` and drop ``message``; everything
+    gets a UTC ``timestamp`` and the precomputed display fields."""
+    if 'action' not in document and 'type' in document:
+        document['action'] = document.pop('type')
+    document.pop('message', None)
+    moment = parse_timestamp(document.get('timestamp'))
+    if moment is not None:
+        document['timestamp'] = moment.isoformat()
+    display_fields(document, moment)
+
+
+@migration(2)
+def _full_branch_names(document):
+    """Branches lose any ``refs/heads/`` or ``refs/tags/`` prefix (the display text follows)."""
+    for field in BRANCH_FIELDS:
+        if document.get(field):
+            document[field] = branch_name(document[field])
+    display_fields(document, parse_timestamp(document.get('timestamp')))
+
+
+def view(document):
+    """A stored action as the API shows it: a projection, upgrading older documents first."""
+    if document.get('schema_version') != SCHEMA_VERSION:
+        document = upgrade(document)
+    return {
+        'id': str(document['_id']),
+        'author': document.get('author', 'Unknown'),
+        'action': document.get('action', 'unknown'),
+        'from_branch': document.get('from_branch'),
+        'to_branch': document.get('to_branch'),
+        'repository': document.get('repository'),
+        'tenant': document.get('tenant'),
+        'timestamp': document.get('timestamp'),
+        'display_text': document['display_text'],
+    }
+
+
+def migrate(storage, batch_size=None, dry_run=False, progress=None):
+    """Rewrite every outdated document of ``storage`` in the current schema.
+
+    Reads the whole collection oldest first in batches and writes back only
+    the outdated documents of each. Pushes from before version 3 get their
+    full branch name back from ``known_branches``, read in a first pass.
+    Returns (scanned, migrated).
+    """
+    batch_size = batch_size or config.EXPORT_BATCH_SIZE
+    branches = known_branches(storage, batch_size)
+    scanned = migrated = 0
+    for batch in storage.scan(None, None, batch_size):
+        scanned += len(batch)
+        outdated = []
+        for document in batch:
+            version = version_of(document)
+            if version < SCHEMA_VERSION:
+                document = upgrade(document)
+                outdated.append(restore_branch(document, branches) if version < 3 else document)
+        if outdated and not dry_run:
+            storage.replace_many(outdated)
+        migrated += len(outdated)
+        if progress:
+            progress(scanned, migrated)
+    return scanned, migrated
+
+
+def known_branches(storage, batch_size=None):
+    """(repository, last path segment) -> the full branch names with a ``/`` stored in it.
+
+    Cut-short push branches never contain a ``/``, so every name that does is a full one.
+    """
+    branches = {}
+    for batch in storage.scan(None, ('repository',) + BRANCH_FIELDS,
+                              batch_size or config.EXPORT_BATCH_SIZE):
+        for document in batch:
+            for field in BRANCH_FIELDS:
+                name = document.get(field)
+                if name and '/' in branch_name(name):
+                    name = branch_name(name)
+                    key = (document.get('repository'), name.rsplit('/', 1)[1])
+                    branches.setdefault(key, set()).add(name)
+    return branches
+
+
+def restore_branch(document, branches):
+    """Give an upgraded pre-version-3 push its full branch name when exactly one is known."""
+    branch = document.get('to_branch')
+    if document.get('action') != 'push' or not branch or '/' in branch:
+        return document
+    names = branches.get((document.get('repository'), branch), ())
+    if len(names) == 1:
+        document['to_branch'] = next(iter(names))
+        display_fields(document, parse_timestamp(document.get('timestamp')))
+    return document
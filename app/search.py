@@ -0,0 +1,127 @@
+"""
+Structured search over stored actions, behind /api/search.
+
+A search is free text (``q``) over authors, branches, the repository,
+release/workflow names and push commit summaries, optionally narrowed to an
+``author``, to a ``branch`` glob (``release/*``, ``hotfix-1.?``) matched
+against both the source and the target branch, and by the usual ``action``,
+``repository`` and ``created_after``/``created_before`` filters, and to the
+tenant asked for with ``tenant`` (named tenants only). Every term
+has to match. Text matches are ranked by relevance (field-weighted term
+frequency times inverse document frequency), newest first on ties; searches
+without text come back newest first.
+
+Each backend answers from an index: MongoDB from a text index plus the
+existing branch indexes (the glob's literal prefix becomes an index range);
+SQLite from an FTS5 table kept in step by triggers; the memory backend from
+``SearchIndex`` (app/storage/index.py), an in-process inverted index
+maintained as documents are stored and evicted. Latency is bounded by looking at no more than
+SEARCH_SCAN_LIMIT candidates, newest first (SEARCH_TIMEOUT_MS on MongoDB).
+"""
+import re
+
+from app import config
+from app.queries import QueryError, parse_time
+
+# Relevance weight of a term found in each indexed field
+FIELD_WEIGHTS = {'author': 5, 'to_branch': 3, 'from_branch': 3, 'name': 2,
+                 'repository': 1, 'commit_messages': 1}
+TEXT_FIELDS = tuple(FIELD_WEIGHTS)
+
+# Longest free-text query, in terms
+MAX_TERMS = 16
+
+# Words are runs of letters and digits: "feature/login-form" is feature, login, form
+_WORD = re.compile(r'[^\W_]+')
+
+
+def tokenize(text):
+    """Lowercased words of ``text``, the unit every backend indexes."""
+    return _WORD.findall(text.lower()) if text else []
+
+
+class BranchPattern:
+    """A branch glob: ``*`` matches any run of characters and ``?`` any one.
+
+    ``prefix`` is the literal text before the first wildcard, which the
+    backends turn into a range scan of their branch index.
+    """
+
+    def __init__(self, pattern):
+        self.pattern = pattern
+        self.prefix = re.split(r'[*?]', pattern, 1)[0]
+        self.exact = self.prefix == pattern
+        self.regex = '^' + ''.join('.*' if char == '*' else '.' if char == '?' else re.escape(char)
+                                   for char in pattern) + '$'
+        self._match = re.compile(self.regex, re.DOTALL).match
+
+    def matches(self, branch):
+        return branch is not None and self._match(branch) is not None
+
+    def upper(self):
+        """Smallest string above every string starting with ``prefix`` (None without one)."""
+        if not self.prefix:
+            return None
+        return self.prefix[:-1] + chr(ord(self.prefix[-1]) + 1)
+
+    def glob(self):
+        """The pattern for SQLite's GLOB, where ``[`` would open a character class."""
+        return self.pattern.replace('[', '[[]')
+
+
+class SearchQuery:
+    """A parsed /api/search request.
+
+    ``terms`` are the tokenized ``q`` words; ``filters`` is a storage filter
+    dict limited to action, repository, tenant and the created_at range.
+    """
+
+    __slots__ = ('terms', 'author', 'branch', 'filters', 'limit')
+
+    def __init__(self, terms=(), author=None, branch=None, filters=None, limit=None):
+        self.terms = list(terms)
+        self.author = author
+        self.branch = BranchPattern(branch) if isinstance(branch, str) else branch
+        self.filters = filters or {}
+        self.limit = limit or config.PAGE_SIZE_DEFAULT
+
+    def __repr__(self):
+        return (f'SearchQuery({self.terms!r}, author={self.author!r}, '
+                f'branch={self.branch.pattern if self.branch else None!r}, limit={self.limit})')
+
+
+def parse_search(args, tenant=None):
+    """Build a SearchQuery from the query string; raises QueryError when malformed.
+
+    ``tenant`` is the resolved tenant name to search within, as in ``build_filter``.
+    """
+    terms = tokenize(args.get('q', ''))
+    if len(terms) > MAX_TERMS:
+        raise QueryError(f"q can have at most {MAX_TERMS} terms")
+    author = args.get('author') or None
+    branch = args.get('branch') or None
+    if not (terms or author or branch):
+        raise QueryError("search needs q, author or branch")
+
+    filters = {name: args[name] for name in ('action', 'repository') if args.get(name)}
+    if tenant:
+        filters['tenant'] = tenant
+    for name in ('created_after', 'created_before'):
+        if args.get(name):
+            filters[name] = parse_time(name, args[name])
+
+    try:
+        limit = int(args.get('limit', config.PAGE_SIZE_DEFAULT))
+    except ValueError:
+        raise QueryError("limit must be an integer")
+    if limit < 1:
+        raise QueryError("limit must be positive")
+    return SearchQuery(terms, author, branch, filters, min(limit, config.SEARCH_LIMIT_MAX))
+
+
+def field_text(document, field):
+    """An indexed field's value as one string (commit summaries are joined)."""
+    value = document.get(field)
+    if isinstance(value, (list, tuple)):
+        return ' '.join(value)
+    return value
@@ -0,0 +1,116 @@
+import hashlib
+import hmac
+import threading
+
+from app import config
+
+SIGNATURE_PREFIX = 'sha256='
+# "sha256=" followed by the 64-character hex digest
+SIGNATURE_LENGTH = len(SIGNATURE_PREFIX) + 64
+HEX_DIGITS = frozenset('0123456789abcdef')
+
+
+class PayloadRejected(Exception):
+    """A delivery refused before its body was parsed; ``status`` is the HTTP answer."""
+
+    def __init__(self, status, reason):
+        super().__init__(reason)
+        self.status = status
+        self.reason = reason
+
+
+class SignatureVerifier:
+    """Reads a webhook body in chunks while computing its HMAC-SHA256.
+
+    The cheap checks come first: a declared Content-Length over ``max_bytes``
+    or a missing/malformed X-Hub-Signature-256 header is refused without
+    reading the body at all. Otherwise the body is streamed through one HMAC
+    per active secret, aborting as soon as it outgrows ``max_bytes``, and
+    the digests are compared in constant time. Nothing is JSON-decoded until
+    a signature matched.
+
+    Several secrets can be active at once so a secret can be rotated: add
+    the new one, update GitHub, then drop the old one. ``matches`` counts
+    deliveries per secret position, which shows when the old one goes quiet.
+    """
+
+    def __init__(self, secrets=None, max_bytes=None, chunk_size=None):
+        secrets = config.WEBHOOK_SECRETS if secrets is None else secrets
+        self.secrets = [secret.encode('utf-8') for secret in secrets if secret]
+        if not self.secrets:
+            raise ValueError("At least one webhook secret is required")
+        self.max_bytes = max_bytes or config.WEBHOOK_MAX_BYTES
+        self.chunk_size = chunk_size or config.WEBHOOK_CHUNK_SIZE
+
+        self._lock = threading.Lock()
+        self.verified = 0
+        self.unsigned = 0
+        self.invalid = 0
+        self.oversized = 0
+        self.matches = [0] * len(self.secrets)
+
+    def read(self, stream, content_length, signature_header):
+        """Return the verified raw body or raise PayloadRejected."""
+        if content_length is not None and content_length > self.max_bytes:
+            self._count('oversized')
+            raise PayloadRejected(413, f"Payload exceeds {self.max_bytes} bytes")
+        signature = self._parse_header(signature_header)
+
+        digests = [hmac.new(secret, digestmod=hashlib.sha256) for secret in self.secrets]
+        chunks = []
+        size = 0
+        while True:
+            chunk = stream.read(self.chunk_size)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > self.max_bytes:
+                # Chunked uploads have no Content-Length to check up front
+                self._count('oversized')
+                raise PayloadRejected(413, f"Payload exceeds {self.max_bytes} bytes")
+            for digest in digests:
+                digest.update(chunk)
+            chunks.append(chunk)
+
+        # Compare against every secret so timing doesn't reveal which one matched
+        matched = None
+        for position, digest in enumerate(digests):
+            if hmac.compare_digest(digest.digest(), signature) and matched is None:
+                matched = position
+        if matched is None:
+            self._count('invalid')
+            raise PayloadRejected(401, "Signature does not match")
+
+        with self._lock:
+            self.verified += 1
+            self.matches[matched] += 1
+        return b''.join(chunks)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'secrets': len(self.secrets),
+                'max_bytes': self.max_bytes,
+                'verified': self.verified,
+                'unsigned': self.unsigned,
+                'invalid': self.invalid,
+                'oversized': self.oversized,
+                'matches': list(self.matches),
+            }
+
+    def _parse_header(self, signature_header):
+        """The raw digest bytes from a well-formed header, else reject."""
+        if not signature_header:
+            self._count('unsigned')
+            raise PayloadRejected(401, "Missing X-Hub-Signature-256 header")
+        hexdigest = signature_header[len(SIGNATURE_PREFIX):].lower()
+        if (len(signature_header) != SIGNATURE_LENGTH
+                or not signature_header.startswith(SIGNATURE_PREFIX)
+                or not HEX_DIGITS.issuperset(hexdigest)):
+            self._count('invalid')
+            raise PayloadRejected(401, "Malformed X-Hub-Signature-256 header")
+        return bytes.fromhex(hexdigest)
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
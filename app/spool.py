@@ -0,0 +1,459 @@
+"""
+Local write-ahead spool for batches the database could not take.
+
+When a write fails because storage is unreachable (``StorageUnavailable``),
+the batch is appended to segment files under SPOOL_DIR (``./logs/spool``, the
+volume mounted into the container) with one fsync per batch, and the spool
+stays in front of storage until a background replayer has drained it.
+
+Layout: one directory per ingest queue, one ``slot-N`` directory per worker
+process (claimed with an exclusive flock, so two processes never share
+files), each holding numbered ``.log`` segments and a ``checkpoint`` with the
+replay position. A record is one line, ``<crc32> <extended JSON>``, so a torn
+write at the end of a segment is detected and skipped.
+
+The replayer writes records back in batches of SPOOL_REPLAY_BATCH at no more
+than SPOOL_REPLAY_RATE documents per second, backing off while storage is
+still down, and deletes segments once they are fully replayed. Slots left
+behind by a crashed or retired worker are adopted and replayed by whichever
+process finds them unlocked. Redeliveries are absorbed by the delivery_id
+and _id unique indexes.
+"""
+import atexit
+import fcntl
+import os
+import threading
+import time
+import zlib
+
+from bson import ObjectId, json_util
+
+from app import config
+from app.batching import BatchResult, StorageUnavailable
+from app.dedup import DELIVERY_FIELD
+
+SEGMENT_SUFFIX = '.log'
+CHECKPOINT_FILE = 'checkpoint'
+LOCK_FILE = 'lock'
+
+# Canonical extended JSON round-trips every BSON type exactly; datetimes come
+# back naive, like the ones the webhook handlers build
+JSON_OPTIONS = json_util.CANONICAL_JSON_OPTIONS.with_options(tz_aware=False)
+
+# How often an idle replayer looks for slots abandoned by other processes
+ORPHAN_SCAN_SECONDS = 30
+
+
+class SpoolFull(Exception):
+    """Raised when appending would grow the spool past its size limit."""
+
+
+class SegmentLog:
+    """Append-only segment files and a replay checkpoint in one slot directory.
+
+    The caller must hold the slot's lock. All methods are thread-safe.
+    """
+
+    def __init__(self, directory, segment_bytes, max_bytes):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._writer = None
+        self._writer_seq = None
+        self.corrupt = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self._position = self._load_checkpoint()
+        self.pending, self.oldest = self._scan()
+
+    @property
+    def segments(self):
+        return sorted(int(name[:-len(SEGMENT_SUFFIX)]) for name in os.listdir(self.directory)
+                      if name.endswith(SEGMENT_SUFFIX))
+
+    @property
+    def size(self):
+        return sum(os.path.getsize(self._path(seq)) for seq in self.segments)
+
+    def append(self, documents):
+        """Write ``documents`` as one fsync'd batch; returns the bytes written."""
+        now = time.time()
+        lines = []
+        for document in documents:
+            # A fixed _id turns a replay after a partial write into a duplicate, not a copy
+            document.setdefault('_id', ObjectId())
+            payload = json_util.dumps({'t': now, 'd': document}, json_options=JSON_OPTIONS).encode('utf-8')
+            lines.append(b'%08x %s\n' % (zlib.crc32(payload), payload))
+        data = b''.join(lines)
+
+        with self._lock:
+            if self.max_bytes and self.size + len(data) > self.max_bytes:
+                raise SpoolFull(f"Spool {self.directory} would exceed {self.max_bytes} bytes")
+            writer = self._open_writer(len(data))
+            writer.write(data)
+            writer.flush()
+            os.fsync(writer.fileno())
+            if not self.pending:
+                self.oldest = now
+            self.pending += len(documents)
+        return len(data)
+
+    def read(self, limit):
+        """Up to ``limit`` unreplayed (spooled_at, document) records and the position after them."""
+        with self._lock:
+            records, position = self._read(self._position, limit)
+        return records, position
+
+    def commit(self, position, count):
+        """Mark everything before ``position`` replayed and delete finished segments."""
+        with self._lock:
+            self.pending = max(0, self.pending - count)
+            segments = self.segments
+            if self.pending:
+                self._position = position
+            else:
+                # Everything replayed: the next append starts a fresh segment
+                # and every existing one can go
+                self._close_writer()
+                self._position = ((segments[-1] + 1) if segments else position[0], 0)
+                self.oldest = None
+            self._save_checkpoint()
+            for seq in segments:
+                if seq < self._position[0] and seq != self._writer_seq:
+                    os.remove(self._path(seq))
+            if self.pending:
+                upcoming, _ = self._read(self._position, 1, count_corrupt=False)
+                self.oldest = upcoming[0][0] if upcoming else None
+
+    def close(self):
+        with self._lock:
+            self._close_writer()
+
+    def _open_writer(self, incoming):
+        if self._writer is not None and self._writer.tell() + incoming > self.segment_bytes:
+            self._close_writer()
+        if self._writer is None:
+            # Never append to a segment from an earlier run: its tail may be torn
+            segments = self.segments
+            seq = max(segments[-1] + 1 if segments else 0, self._position[0])
+            self._writer = open(self._path(seq), 'ab')
+            self._writer_seq = seq
+        return self._writer
+
+    def _close_writer(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+            self._writer_seq = None
+
+    def _read(self, position, limit, count_corrupt=True):
+        seq, offset = position
+        records = []
+        for segment in self.segments:
+            if segment < seq:
+                continue
+            if segment > seq:
+                seq, offset = segment, 0
+            with open(self._path(seq), 'rb') as segment_file:
+                segment_file.seek(offset)
+                while len(records) < limit:
+                    line = segment_file.readline()
+                    if not line:
+                        break
+                    offset += len(line)
+                    record = self._decode(line, count_corrupt)
+                    if record is not None:
+                        records.append(record)
+            if len(records) >= limit:
+                break
+        return records, (seq, offset)
+
+    def _decode(self, line, count_corrupt=True):
+        try:
+            checksum, payload = line.rstrip(b'\n').split(b' ', 1)
+            if int(checksum, 16) != zlib.crc32(payload):
+                raise ValueError("checksum mismatch")
+            record = json_util.loads(payload, json_options=JSON_OPTIONS)
+            return record['t'], record['d']
+        except (ValueError, KeyError, TypeError):
+            # A torn tail from a crash mid-append, or a damaged record
+            if count_corrupt:
+                self.corrupt += 1
+            return None
+
+    def _scan(self):
+        """Count unreplayed records, for depth and lag after a restart."""
+        pending = 0
+        oldest = None
+        position = self._position
+        while True:
+            records, position = self._read(position, 1000, count_corrupt=False)
+            if not records:
+                return pending, oldest
+            if oldest is None:
+                oldest = records[0][0]
+            pending += len(records)
+
+    def _load_checkpoint(self):
+        try:
+            with open(os.path.join(self.directory, CHECKPOINT_FILE)) as checkpoint:
+                seq, offset = checkpoint.read().split()
+                return int(seq), int(offset)
+        except (OSError, ValueError):
+            segments = self.segments
+            return (segments[0] if segments else 0), 0
+
+    def _save_checkpoint(self):
+        path = os.path.join(self.directory, CHECKPOINT_FILE)
+        with open(path + '.tmp', 'w') as checkpoint:
+            checkpoint.write(f'{self._position[0]} {self._position[1]}')
+            checkpoint.flush()
+            os.fsync(checkpoint.fileno())
+        os.replace(path + '.tmp', path)
+
+    def _path(self, seq):
+        return os.path.join(self.directory, f'{seq:010d}{SEGMENT_SUFFIX}')
+
+
+class Spool:
+    """Sink wrapper that parks batches on disk while storage is unreachable.
+
+    Use ``write`` as the IngestQueue sink. While storage is healthy it is a
+    pass-through; once ``sink`` raises StorageUnavailable, that batch and
+    every following one is appended to the spool (reported back in
+    ``BatchResult.spooled``) until the replayer has written the backlog.
+    ``on_replayed(batch, result)`` is called after each replayed batch.
+    """
+
+    def __init__(self, name, sink, directory=None, enabled=None, segment_bytes=None,
+                 max_bytes=None, replay_batch=None, replay_rate=None,
+                 retry_seconds=None, retry_max_seconds=None, on_replayed=None):
+        self.name = name
+        self.sink = sink
+        self.on_replayed = on_replayed
+        self.enabled = config.SPOOL_ENABLED if enabled is None else enabled
+        self.directory = os.path.join(directory or config.SPOOL_DIR, name)
+        self.segment_bytes = segment_bytes or config.SPOOL_SEGMENT_BYTES
+        self.max_bytes = config.SPOOL_MAX_BYTES if max_bytes is None else max_bytes
+        self.replay_batch = replay_batch or config.SPOOL_REPLAY_BATCH
+        self.replay_rate = config.SPOOL_REPLAY_RATE if replay_rate is None else replay_rate
+        self.retry_seconds = retry_seconds or config.SPOOL_RETRY_SECONDS
+        self.retry_max_seconds = retry_max_seconds or config.SPOOL_RETRY_MAX_SECONDS
+
+        self.healthy = True
+        self.last_error = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = False
+        self._thread = None
+        self._pid = None
+        self._log = None
+        self._slot = None
+        self._slot_lock = None
+        self._adopted = None
+        self._counters = {'spooled': 0, 'replayed': 0, 'duplicates': 0, 'failed': 0,
+                          'adopted_slots': 0}
+
+    def write(self, documents):
+        """Write to storage, or to the spool while storage is down or a backlog remains."""
+        if not self.enabled:
+            return self.sink(documents)
+        self.ensure_started()
+
+        result = None
+        pending = documents
+        if self.healthy:
+            try:
+                return self.sink(documents)
+            except StorageUnavailable as e:
+                self._mark_unhealthy(e)
+                result = e.result
+                pending = e.pending if e.pending is not None else documents
+
+        self._own_log().append(pending)
+        self._incr('spooled', len(pending))
+        self._wake.set()
+        result = result or BatchResult()
+        result.spooled.extend(pending)
+        return result
+
+    def ensure_started(self):
+        """Start the replayer in this process (it also picks up leftovers from earlier runs)."""
+        if not self.enabled or (self._pid == os.getpid() and self._thread is not None):
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None:
+                return
+            if self._pid is None:
+                atexit.register(self.close)
+            # Files and locks opened before a fork belong to the parent
+            self._pid = os.getpid()
+            self._log = self._slot = self._slot_lock = self._adopted = None
+            self.healthy = True
+            self._thread = threading.Thread(target=self._run, name=f'{self.name}-spool-replayer',
+                                            daemon=True)
+            self._thread.start()
+
+    def stats(self):
+        logs = [log for log in (self._log, self._adopted and self._adopted[0]) if log]
+        oldest = min((log.oldest for log in logs if log.oldest), default=None)
+        with self._lock:
+            counters = dict(self._counters)
+        return {
+            'enabled': self.enabled,
+            'healthy': self.healthy,
+            'depth': sum(log.pending for log in logs),
+            'lag_seconds': round(time.time() - oldest, 3) if oldest else 0,
+            'bytes': sum(log.size for log in logs),
+            'segments': sum(len(log.segments) for log in logs),
+            'corrupt': sum(log.corrupt for log in logs),
+            'slot': self._slot,
+            'last_error': self.last_error,
+            **counters,
+        }
+
+    def close(self):
+        self._stopping = True
+        self._wake.set()
+        if self._pid == os.getpid():
+            for log in (self._log, self._adopted and self._adopted[0]):
+                if log:
+                    log.close()
+
+    def _run(self):
+        delay = self.retry_seconds
+        next_scan = 0
+        while not self._stopping:
+            log = self._log if self._log and self._log.pending else None
+            if log is None and self._adopted is None and time.monotonic() >= next_scan:
+                next_scan = time.monotonic() + ORPHAN_SCAN_SECONDS
+                self._adopt()
+            if log is None and self._adopted is not None:
+                log = self._adopted[0]
+
+            if log is None:
+                self._wake.wait(ORPHAN_SCAN_SECONDS)
+                self._wake.clear()
+                continue
+
+            started = time.monotonic()
+            try:
+                replayed = self._replay(log)
+            except StorageUnavailable as e:
+                self._mark_unhealthy(e)
+                self._wake.wait(delay)
+                delay = min(delay * 2, self.retry_max_seconds)
+                continue
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"{self.name} spool: replay failed: {str(e)}")
+                self._wake.wait(delay)
+                continue
+
+            delay = self.retry_seconds
+            if log is not self._log and not log.pending:
+                self._release_adopted()
+            if not (self._log and self._log.pending):
+                self.healthy = True
+            if self.replay_rate and replayed:
+                # Pace the replay so a recovering database isn't flooded
+                time.sleep(max(0, replayed / self.replay_rate - (time.monotonic() - started)))
+
+    def _replay(self, log):
+        """Write the next batch of ``log`` to storage; returns the records consumed."""
+        records, position = log.read(self.replay_batch)
+        documents = []
+        seen = set()
+        for _, document in records:
+            delivery_id = document.get(DELIVERY_FIELD)
+            if delivery_id is not None:
+                if delivery_id in seen:
+                    continue
+                seen.add(delivery_id)
+            documents.append(document)
+
+        result = self.sink(documents) if documents else BatchResult()
+        log.commit(position, len(records))
+        if result is not None:
+            for _, message in result.errors:
+                print(f"{self.name} spool: document rejected on replay: {message}")
+            self._incr('failed', len(result.errors))
+            self._incr('duplicates', len(result.duplicates) + len(records) - len(documents))
+            self._incr('replayed', len(result.stored(documents)))
+        else:
+            self._incr('replayed', len(documents))
+
+        if self.on_replayed and documents:
+            try:
+                self.on_replayed(documents, result)
+            except Exception as e:
+                print(f"{self.name} spool: on_replayed hook failed: {str(e)}")
+        return len(records)
+
+    def _own_log(self):
+        if self._log is None:
+            with self._lock:
+                if self._log is None:
+                    self._slot, self._slot_lock = self._claim_slot()
+                    self._log = SegmentLog(os.path.join(self.directory, self._slot),
+                                           self.segment_bytes, self.max_bytes)
+        return self._log
+
+    def _claim_slot(self):
+        os.makedirs(self.directory, exist_ok=True)
+        number = 0
+        while True:
+            slot = f'slot-{number}'
+            lock = self._try_lock(slot)
+            if lock is not None:
+                return slot, lock
+            number += 1
+
+    def _adopt(self):
+        """Take over a slot no live process holds, if it still has records to replay."""
+        try:
+            slots = sorted(name for name in os.listdir(self.directory) if name.startswith('slot-'))
+        except OSError:
+            return
+        for slot in slots:
+            if slot == self._slot:
+                continue
+            lock = self._try_lock(slot)
+            if lock is None:
+                continue
+            log = SegmentLog(os.path.join(self.directory, slot), self.segment_bytes, 0)
+            if log.pending:
+                print(f"{self.name} spool: replaying {log.pending} documents left in {slot}")
+                self._adopted = (log, lock)
+                self._incr('adopted_slots')
+                return
+            log.close()
+            lock.close()
+
+    def _release_adopted(self):
+        log, lock = self._adopted
+        self._adopted = None
+        log.close()
+        lock.close()
+
+    def _try_lock(self, slot):
+        path = os.path.join(self.directory, slot)
+        os.makedirs(path, exist_ok=True)
+        lock = open(os.path.join(path, LOCK_FILE), 'a')
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock.close()
+            return None
+        return lock
+
+    def _mark_unhealthy(self, error):
+        if self.healthy:
+            print(f"{self.name} spool: storage unavailable, spooling to {self.directory}: {str(error)}")
+        self.healthy = False
+        self.last_error = str(error)
+
+    def _incr(self, counter, amount=1):
+        with self._lock:
+            self._counters[counter] += amount
@@ -0,0 +1,120 @@
+"""
+One-off work a worker needs before it is fully warm, kept out of import time.
+
+``create_app`` only wires the app together: nothing connects and no index
+is created while modules are imported. Work like creating indexes or
+pinging MongoDB is registered as a startup task (``@startup.task``) and
+runs once per process, in registration order, when the first of these
+happens:
+
+    STARTUP_WARM_UP=background  a thread create_app starts (the default);
+                                failed tasks are retried every RETRY_SECONDS
+    STARTUP_WARM_UP=request     before the first request is handled
+    STARTUP_WARM_UP=off         an explicit ``startup.warm_up()``, e.g.
+                                ``python -m app.cli startup run`` at deploy time
+
+Tasks must be idempotent: every worker runs them, and so does each deploy.
+"""
+import os
+import threading
+import time
+
+WARM_UP_MODES = ('background', 'request', 'off')
+
+# Pause before a failed task is tried again
+RETRY_SECONDS = 30
+
+
+class StartupTask:
+    """A named function run once per process until it succeeds."""
+
+    def __init__(self, name, func):
+        self.name = name
+        self.func = func
+        self.pid = None
+        self.status = 'pending'
+        self.error = None
+        self.failed_at = None
+        self.seconds = None
+
+    def done(self):
+        return self.pid == os.getpid() and self.status == 'done'
+
+    def due(self):
+        if self.done():
+            return False
+        return self.failed_at is None or time.monotonic() - self.failed_at >= RETRY_SECONDS
+
+    def run(self):
+        started = time.perf_counter()
+        try:
+            self.func()
+        except Exception as e:
+            self.status, self.error, self.failed_at = 'failed', str(e), time.monotonic()
+            print(f"Startup task {self.name} failed: {str(e)}")
+            return False
+        finally:
+            self.seconds = round(time.perf_counter() - started, 3)
+        self.pid, self.status, self.error, self.failed_at = os.getpid(), 'done', None, None
+        return True
+
+
+class Startup:
+    """The registered startup tasks and the per-process warm-up that runs them."""
+
+    def __init__(self):
+        self.tasks = []
+        self._lock = threading.Lock()
+        self._pid = None
+        self._thread = None
+
+    def task(self, name):
+        """Decorator registering ``func`` as the startup task ``name``."""
+        def register(func):
+            self.tasks.append(StartupTask(name, func))
+            return func
+        return register
+
+    def warm_up(self):
+        """Run every task not done in this process yet; True when all are done.
+
+        A task that fails stops the ones after it (they may depend on it)
+        until it is retried, at most every RETRY_SECONDS.
+        """
+        if all(task.done() for task in self.tasks):
+            return True
+        with self._lock:
+            for task in self.tasks:
+                if task.done():
+                    continue
+                if not task.due() or not task.run():
+                    return False
+        return True
+
+    def before_request(self):
+        """Flask hook for STARTUP_WARM_UP=request; the request goes ahead either way."""
+        self.warm_up()
+
+    def ensure_started(self):
+        """Warm up in a background thread in this process (once per process)."""
+        if self._pid == os.getpid() and self._thread is not None:
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None:
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='startup', daemon=True)
+            self._thread.start()
+
+    def stats(self):
+        return {task.name: {'status': task.status if task.pid in (None, os.getpid()) else 'pending',
+                            'seconds': task.seconds, 'error': task.error}
+                for task in self.tasks}
+
+    def _run(self):
+        while not self.warm_up():
+            time.sleep(RETRY_SECONDS)
+
+
+# Process-wide registry; app.main and the webhook blueprint add their tasks
+startup = Startup()
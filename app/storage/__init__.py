@@ -0,0 +1,42 @@
+from app import config
+from app.storage.base import Storage
+from app.storage.memory import MemoryStorage
+from app.storage.sqlite import SQLiteStorage
+
+BACKENDS = ('mongo', 'sqlite', 'memory')
+
+
+def create_storage(backend=None, database=None, collection=None, action_field='action'):
+    """Build the configured storage backend (STORAGE_BACKEND: mongo, sqlite or memory).
+
+    ``database``/``collection`` name the MongoDB namespace; SQLite uses the
+    collection name as its table.
+    """
+    backend = backend or config.STORAGE_BACKEND
+    collection = collection or config.COLLECTION_NAME
+    if backend == 'mongo':
+        from app.extensions import mongo
+        from app.storage.mongo import MongoStorage
+
+        database = database or config.DATABASE_NAME
+        return MongoStorage(
+            action_field=action_field,
+            get_collection=lambda: mongo.get_client()[database][collection],
+            hot_size=config.HOT_TIER_SIZE)
+    if backend == 'sqlite':
+        return SQLiteStorage(config.SQLITE_PATH, table=collection, action_field=action_field)
+    if backend == 'memory':
+        return MemoryStorage(config.MEMORY_CAPACITY, action_field=action_field)
+    raise ValueError(f"Unknown storage backend: {backend} (expected one of {', '.join(BACKENDS)})")
+
+
+def __getattr__(name):
+    # pymongo is only imported once the mongo backend is actually used
+    if name == 'MongoStorage':
+        from app.storage.mongo import MongoStorage
+        return MongoStorage
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+__all__ = ['BACKENDS', 'Storage', 'MongoStorage', 'SQLiteStorage', 'MemoryStorage',
+           'create_storage']
@@ -0,0 +1,142 @@
+from app import config
+from app.queries import FILTER_FIELDS, encode_cursor
+
+# What ``count`` can group by: a document field or a time bucket
+GROUP_FIELDS = FILTER_FIELDS
+TIME_BUCKETS = ('hour', 'day')
+
+
+class Storage:
+    """Interface every storage backend implements.
+
+    Documents are plain dicts with a ``created_at`` datetime; backends assign
+    ``_id``. ``filters`` is the dict built by ``queries.build_filter``.
+    ``action_field`` names the document field the ``action`` filter applies
+    to, since the blueprint's events store it as ``type``.
+    """
+
+    name = None
+
+    def __init__(self, action_field='action'):
+        self.action_field = action_field
+
+    def insert(self, document):
+        """Store one document; returns a BatchResult like ``insert_many``."""
+        return self.insert_many([document])
+
+    def insert_many(self, documents):
+        """Store documents, reporting per-document failures in a BatchResult."""
+        raise NotImplementedError
+
+    def latest(self, limit):
+        """Newest ``limit`` documents, newest first."""
+        raise NotImplementedError
+
+    def find_page(self, filters=None, cursor=None, limit=None):
+        """One keyset page of matching documents, newest first, and the next cursor."""
+        raise NotImplementedError
+
+    def count(self, group_by, filters=None, limit=100):
+        """Number of matching documents per value of ``group_by``.
+
+        Time buckets come back oldest first; fields come back as top-N by count.
+        """
+        raise NotImplementedError
+
+    def search(self, query):
+        """(document, score) pairs for an ``app.search.SearchQuery``, best first.
+
+        At most ``query.limit`` of them; may be a lazy iterator over a database cursor.
+        """
+        raise NotImplementedError
+
+    def scan(self, filters=None, fields=None, batch_size=None):
+        """Every matching document, oldest first, in lists of up to ``batch_size``.
+
+        ``fields`` (filter names, so ``action`` means ``action_field``, or any
+        other stored field) cuts documents down to those plus ``_id`` and
+        ``created_at``. A lazy iterator: one batch is held at a time.
+        """
+        raise NotImplementedError
+
+    def oldest(self, before, limit):
+        """Up to ``limit`` documents created before ``before``, oldest first."""
+        raise NotImplementedError
+
+    def replace_many(self, documents):
+        """Overwrite stored documents by ``_id`` (index fields included); returns how many."""
+        raise NotImplementedError
+
+    def delete(self, ids):
+        """Delete the documents with these ``_id``s; returns how many went."""
+        raise NotImplementedError
+
+    def expire(self, before):
+        """Delete every document created before ``before``; returns how many went."""
+        raise NotImplementedError
+
+    def ensure_ttl(self, seconds):
+        """Let the backend expire documents ``seconds`` after created_at by itself.
+
+        Returns False when it can't, and ``expire`` has to be called instead.
+        ``seconds`` None removes the expiry.
+        """
+        return False
+
+    def ensure_indexes(self):
+        """Create whatever indexes or tables the backend needs; idempotent."""
+
+    def close(self):
+        """Release connections or files held by the backend."""
+
+    def stats(self):
+        """Backend-specific counters for /health."""
+        return {'backend': self.name}
+
+    def _page(self, documents, limit):
+        """Trim a ``limit + 1`` fetch to a page and derive the next cursor."""
+        if len(documents) > limit:
+            documents = documents[:limit]
+            return documents, encode_cursor(documents[-1])
+        return documents, None
+
+
+def check_group_by(group_by):
+    """Reject a ``count`` grouping no backend supports."""
+    if group_by not in GROUP_FIELDS + TIME_BUCKETS:
+        raise ValueError(f"group_by must be one of {', '.join(GROUP_FIELDS + TIME_BUCKETS)}")
+
+
+def truncate(moment, bucket):
+    """Start of the hour or day that ``moment`` falls in."""
+    if bucket == 'hour':
+        return moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def matches(document, filters, action_field='action'):
+    """Python evaluation of a filter dict, for backends without a query engine."""
+    for name, value in filters.items():
+        if name == 'created_after':
+            if document['created_at'] < value:
+                return False
+        elif name == 'created_before':
+            if document['created_at'] >= value:
+                return False
+        elif document.get(action_field if name == 'action' else name) != value:
+            return False
+    return True
+
+
+def after_cursor(document, cursor_key):
+    """True when ``document`` sorts strictly after the (created_at, _id) cursor key."""
+    created_at, last_id = cursor_key
+    if document['created_at'] != created_at:
+        return document['created_at'] < created_at
+    return str(document['_id']) < last_id
+
+
+def default_limit(limit):
+    """Page size to use when the caller gave none."""
+    return limit or config.PAGE_SIZE_DEFAULT
+
@@ -0,0 +1,162 @@
+import bisect
+import heapq
+import itertools
+import math
+
+from app import config
+from app.search import FIELD_WEIGHTS, field_text, tokenize
+from app.storage.base import matches
+
+
+class SearchIndex:
+    """In-process inverted index over the TEXT_FIELDS of stored documents.
+
+    Postings map each key to the sequence numbers of the documents holding
+    it, oldest first: the words of the text fields, plus ``author:<login>``
+    and ``branch:<name>`` keys for exact author and branch matches (words
+    never contain a colon). Distinct branch names are also kept sorted, so a
+    glob only looks at the names in its prefix range. Removal is lazy: dead
+    sequence numbers are skipped and the postings compacted once they
+    outnumber the live documents.
+
+    Not thread-safe; the owning storage serializes calls.
+    """
+
+    def __init__(self, action_field='action', scan_limit=None):
+        self.action_field = action_field
+        self.scan_limit = scan_limit or config.SEARCH_SCAN_LIMIT
+        self._postings = {}
+        # seq -> (document, {word: field-weighted count})
+        self._documents = {}
+        self._seqs = {}
+        self._branches = []
+        self._next_seq = 0
+        self._dead = 0
+        self.compactions = 0
+
+    def __len__(self):
+        return len(self._documents)
+
+    def add(self, document):
+        seq = self._next_seq
+        self._next_seq += 1
+        weights = {}
+        for field, weight in FIELD_WEIGHTS.items():
+            for word in tokenize(field_text(document, field)):
+                weights[word] = weights.get(word, 0) + weight
+
+        keys = set(weights)
+        if document.get('author') is not None:
+            keys.add(f"author:{document['author']}")
+        for field in ('to_branch', 'from_branch'):
+            branch = document.get(field)
+            if branch is not None:
+                if f'branch:{branch}' not in self._postings:
+                    bisect.insort(self._branches, branch)
+                keys.add(f'branch:{branch}')
+        for key in keys:
+            postings = self._postings.get(key)
+            if postings is None:
+                postings = self._postings[key] = []
+            postings.append(seq)
+
+        self._documents[seq] = (document, weights)
+        self._seqs[document['_id']] = seq
+
+    def remove(self, document):
+        seq = self._seqs.pop(document.get('_id'), None)
+        if seq is None:
+            return
+        del self._documents[seq]
+        self._dead += 1
+        if self._dead > max(len(self._documents), 1000):
+            self._compact()
+
+    def search(self, query):
+        """Up to ``query.limit`` (document, score) pairs, best first."""
+        # Each condition's postings lists: one per word or author, one per matching branch
+        sources = [[self._postings.get(word, [])] for word in query.terms]
+        if query.author is not None:
+            sources.append([self._postings.get(f'author:{query.author}', [])])
+        if query.branch is not None:
+            sources.append([self._postings[f'branch:{name}']
+                            for name in self._branch_names(query.branch)])
+
+        # The rarest condition drives the scan; the others are checked per document
+        driver = min(sources, key=lambda lists: sum(len(postings) for postings in lists))
+        if not any(driver):
+            return []
+        candidates = reversed(driver[0]) if len(driver) == 1 else _newest_first_union(driver)
+
+        live = len(self._documents)
+        idf = [(word, math.log(1 + live / len(self._postings[word]))) for word in query.terms]
+        documents = self._documents
+        checked = query.author is not None or query.branch is not None or query.filters
+        hits = []
+        for seq in itertools.islice(candidates, self.scan_limit):
+            entry = documents.get(seq)
+            if entry is None:
+                continue
+            document, weights = entry
+            score = 0.0
+            for word, weight in idf:
+                count = weights.get(word)
+                if count is None:
+                    break
+                score += count * weight
+            else:
+                if checked and not self._accepts(document, query):
+                    continue
+                hits.append((score, seq, document))
+                if not idf and len(hits) >= query.limit:
+                    break
+
+        if idf:
+            hits = heapq.nlargest(query.limit, hits)
+        return [(document, round(score, 4)) for score, _, document in hits]
+
+    def stats(self):
+        return {'documents': len(self._documents), 'keys': len(self._postings),
+                'branches': len(self._branches), 'dead': self._dead,
+                'compactions': self.compactions}
+
+    def _accepts(self, document, query):
+        if query.author is not None and document.get('author') != query.author:
+            return False
+        if query.branch is not None and not (query.branch.matches(document.get('to_branch'))
+                                             or query.branch.matches(document.get('from_branch'))):
+            return False
+        return matches(document, query.filters, self.action_field)
+
+    def _branch_names(self, pattern):
+        if pattern.exact:
+            return [pattern.pattern] if f'branch:{pattern.pattern}' in self._postings else []
+        names = []
+        for index in range(bisect.bisect_left(self._branches, pattern.prefix), len(self._branches)):
+            name = self._branches[index]
+            if not name.startswith(pattern.prefix):
+                break
+            if pattern.matches(name):
+                names.append(name)
+        return names
+
+    def _compact(self):
+        alive = self._documents
+        for key in list(self._postings):
+            postings = [seq for seq in self._postings[key] if seq in alive]
+            if postings:
+                self._postings[key] = postings
+            else:
+                del self._postings[key]
+        self._branches = [name for name in self._branches if f'branch:{name}' in self._postings]
+        self._dead = 0
+        self.compactions += 1
+
+
+def _newest_first_union(postings_lists):
+    """Merge several oldest-first postings lists into one newest-first stream, without repeats."""
+    previous = None
+    for seq in heapq.merge(*(reversed(postings) for postings in postings_lists), reverse=True):
+        if seq != previous:
+            yield seq
+            previous = seq
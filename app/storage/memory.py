@@ -0,0 +1,173 @@
+import threading
+from collections import Counter, deque
+
+from bson import ObjectId
+
+from app import config
+from app.batching import BatchResult
+from app.dedup import DELIVERY_FIELD
+from app.queries import FILTER_FIELDS, decode_cursor
+from app.storage.base import (Storage, after_cursor, check_group_by, default_limit,
+                              matches, truncate)
+from app.storage.index import SearchIndex
+
+
+class MemoryStorage(Storage):
+    """Ring buffer of the newest ``capacity`` documents, for tests and small deployments.
+
+    Documents are kept in insertion order, which is created_at order for
+    documents stamped at ingest. Nothing survives a restart. ``search`` is
+    answered from an in-process inverted index kept alongside the buffer.
+    """
+
+    name = 'memory'
+
+    def __init__(self, capacity=None, action_field='action'):
+        super().__init__(action_field)
+        self.capacity = capacity or config.MEMORY_CAPACITY
+        self._documents = deque()
+        self._deliveries = set()
+        self._lock = threading.Lock()
+        self._index = SearchIndex(action_field)
+        self.evicted = 0
+
+    def insert_many(self, documents):
+        result = BatchResult()
+        with self._lock:
+            for document in documents:
+                delivery_id = document.get(DELIVERY_FIELD)
+                if delivery_id is not None and delivery_id in self._deliveries:
+                    result.duplicates.append(document)
+                    continue
+                document.setdefault('_id', ObjectId())
+                if len(self._documents) >= self.capacity:
+                    self._evict()
+                self._documents.append(document)
+                self._index.add(document)
+                if delivery_id is not None:
+                    self._deliveries.add(delivery_id)
+                result.inserted += 1
+        return result
+
+    def latest(self, limit):
+        with self._lock:
+            return [self._documents[-i] for i in range(1, min(limit, len(self._documents)) + 1)]
+
+    def find_page(self, filters=None, cursor=None, limit=None):
+        limit = default_limit(limit)
+        filters = filters or {}
+        cursor_key = decode_cursor(cursor) if cursor else None
+
+        page = []
+        with self._lock:
+            for document in reversed(self._documents):
+                if cursor_key and not after_cursor(document, cursor_key):
+                    continue
+                if matches(document, filters, self.action_field):
+                    page.append(document)
+                    if len(page) > limit:
+                        break
+        return self._page(page, limit)
+
+    def scan(self, filters=None, fields=None, batch_size=None):
+        batch_size = batch_size or config.EXPORT_BATCH_SIZE
+        filters = filters or {}
+        keep = None
+        if fields:
+            keep = ['_id', 'created_at'] + [self.action_field if name == 'action' else name
+                                            for name in fields if name not in ('_id', 'created_at')]
+        with self._lock:
+            # References only, so later inserts and evictions don't disturb the scan
+            documents = list(self._documents)
+
+        batch = []
+        for document in documents:
+            if matches(document, filters, self.action_field):
+                batch.append({name: document[name] for name in keep if name in document}
+                             if keep else document)
+                if len(batch) == batch_size:
+                    yield batch
+                    batch = []
+        if batch:
+            yield batch
+
+    def oldest(self, before, limit):
+        with self._lock:
+            documents = []
+            for document in self._documents:
+                if document['created_at'] >= before or len(documents) >= limit:
+                    break
+                documents.append(document)
+            return documents
+
+    def replace_many(self, documents):
+        replacements = {document['_id']: document for document in documents}
+        replaced = 0
+        with self._lock:
+            for position, document in enumerate(self._documents):
+                replacement = replacements.get(document['_id'])
+                if replacement is not None:
+                    self._index.remove(document)
+                    self._documents[position] = replacement
+                    self._index.add(replacement)
+                    replaced += 1
+        return replaced
+
+    def delete(self, ids):
+        ids = set(ids)
+        with self._lock:
+            kept = deque(document for document in self._documents if document['_id'] not in ids)
+            deleted = len(self._documents) - len(kept)
+            for document in self._documents:
+                if document['_id'] in ids:
+                    self._deliveries.discard(document.get(DELIVERY_FIELD))
+                    self._index.remove(document)
+            self._documents = kept
+        return deleted
+
+    def expire(self, before):
+        deleted = 0
+        with self._lock:
+            # Insertion order is created_at order, so expired documents are all at the front
+            while self._documents and self._documents[0]['created_at'] < before:
+                document = self._documents.popleft()
+                self._deliveries.discard(document.get(DELIVERY_FIELD))
+                self._index.remove(document)
+                deleted += 1
+        return deleted
+
+    def count(self, group_by, filters=None, limit=100):
+        check_group_by(group_by)
+        filters = filters or {}
+        with self._lock:
+            if group_by in FILTER_FIELDS:
+                field = self.action_field if group_by == 'action' else group_by
+                counts = Counter(document.get(field) for document in self._documents
+                                 if matches(document, filters, self.action_field))
+                rows = sorted(counts.items(), key=lambda row: (-row[1], str(row[0])))[:limit]
+            else:
+                counts = Counter(truncate(document['created_at'], group_by)
+                                 for document in self._documents
+                                 if matches(document, filters, self.action_field))
+                rows = sorted(counts.items())[:limit]
+        return [{group_by: key, 'count': count} for key, count in rows]
+
+    def search(self, query):
+        with self._lock:
+            return self._index.search(query)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'backend': self.name,
+                'documents': len(self._documents),
+                'capacity': self.capacity,
+                'evicted': self.evicted,
+                'search_index': self._index.stats(),
+            }
+
+    def _evict(self):
+        oldest = self._documents.popleft()
+        self._deliveries.discard(oldest.get(DELIVERY_FIELD))
+        self._index.remove(oldest)
+        self.evicted += 1
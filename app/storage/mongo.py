@@ -0,0 +1,312 @@
+import os
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, TEXT, ReplaceOne
+from pymongo.errors import BulkWriteError, OperationFailure, PyMongoError
+
+from app import config
+from app.batching import DUPLICATE_KEY, BatchWriter
+from app.dedup import ensure_delivery_index
+from app.queries import FILTER_FIELDS, decode_cursor
+from app.search import FIELD_WEIGHTS, TEXT_FIELDS
+from app.storage.base import Storage, check_group_by, default_limit
+
+# Newest first; _id breaks ties between documents created in the same instant
+SORT = [('created_at', DESCENDING), ('_id', DESCENDING)]
+
+TTL_INDEX = 'created_at_ttl'
+# The one text index a collection may have, behind search()
+SEARCH_INDEX = 'search_text'
+# Server error codes for an index that exists with other options, and for a missing index
+INDEX_OPTIONS_CONFLICT = 85
+INDEX_NOT_FOUND = 27
+# Room reserved per document in the capped hot collection
+HOT_DOCUMENT_BYTES = 4096
+
+
+class MongoStorage(Storage):
+    """Storage on a MongoDB collection.
+
+    Pass either a ``collection`` or a ``get_collection`` function; the latter
+    is called lazily, once per process, so no client exists before it is
+    needed and none survives a fork.
+
+    With ``hot_size``, stored documents are also copied into a capped
+    ``<collection>_hot`` collection holding the newest ``hot_size``, and
+    ``latest`` reads it in natural (insertion) order: the dashboard feed
+    then costs the same however large the main collection grows.
+    """
+
+    name = 'mongo'
+
+    def __init__(self, collection=None, action_field='action', get_collection=None, hot_size=0):
+        super().__init__(action_field)
+        self._get_collection = get_collection
+        self._collection = collection
+        self._pid = os.getpid() if collection is not None else None
+        self._writer = BatchWriter(collection) if collection is not None else None
+        self.hot_size = hot_size
+        self.hot_errors = 0
+
+    @property
+    def collection(self):
+        return self._resolve()
+
+    @property
+    def db(self):
+        return self.collection.database
+
+    @property
+    def hot_collection(self):
+        collection = self.collection
+        return collection.database[f'{collection.name}_hot']
+
+    def insert_many(self, documents):
+        self._resolve()
+        result = self._writer(documents)
+        if self.hot_size:
+            self._write_hot(result.stored(documents))
+        return result
+
+    def latest(self, limit):
+        if self.hot_size >= limit:
+            documents = list(self.hot_collection.find().sort('$natural', DESCENDING).limit(limit))
+            if len(documents) == limit:
+                # Spool replays can land out of created_at order
+                return sorted(documents, key=lambda document: (document['created_at'], document['_id']),
+                              reverse=True)
+        return list(self.collection.find().sort(SORT).limit(limit))
+
+    def find_page(self, filters=None, cursor=None, limit=None):
+        """Keyset page: the cursor's (created_at, _id) is sought in the index,
+        so deep pages cost the same as the first one."""
+        limit = default_limit(limit)
+        query = self.query(filters or {})
+        if cursor:
+            created_at, last_id = decode_cursor(cursor)
+            last_id = ObjectId(last_id)
+            # The outer $lte bounds the index scan; the $or settles ties on created_at
+            after_cursor = {
+                'created_at': {'$lte': created_at},
+                '$or': [
+                    {'created_at': {'$lt': created_at}},
+                    {'created_at': created_at, '_id': {'$lt': last_id}},
+                ],
+            }
+            query = {'$and': [query, after_cursor]} if query else after_cursor
+
+        documents = list(self.collection.find(query).sort(SORT).limit(limit + 1))
+        return self._page(documents, limit)
+
+    def count(self, group_by, filters=None, limit=100):
+        check_group_by(group_by)
+        if group_by in FILTER_FIELDS:
+            key = f'${self._field(group_by)}'
+            sort = {'count': -1, '_id': 1}
+        else:
+            key = {'$dateTrunc': {'date': '$created_at', 'unit': group_by}}
+            sort = {'_id': 1}
+
+        pipeline = [
+            {'$match': self.query(filters or {})},
+            {'$group': {'_id': key, 'count': {'$sum': 1}}},
+            {'$sort': sort},
+            {'$limit': limit},
+        ]
+        return [{group_by: row['_id'], 'count': row['count']}
+                for row in self.collection.aggregate(pipeline)]
+
+    def search(self, query):
+        """Text matches ranked by textScore, or newest first without text.
+
+        Branch globs become a range on the glob's prefix over the
+        ``to_branch``/``from_branch`` indexes, checked against the full pattern.
+        """
+        conditions = self.query(query.filters)
+        if query.author is not None:
+            conditions['author'] = query.author
+        if query.branch is not None:
+            if query.branch.exact:
+                branch = query.branch.pattern
+            else:
+                branch = {'$regex': query.branch.regex}
+                if query.branch.prefix:
+                    branch.update({'$gte': query.branch.prefix, '$lt': query.branch.upper()})
+            conditions['$or'] = [{'to_branch': branch}, {'from_branch': branch}]
+
+        if query.terms:
+            # Quoting every word makes them all required instead of any one
+            conditions['$text'] = {'$search': ' '.join(f'"{word}"' for word in query.terms)}
+            score = {'$meta': 'textScore'}
+            cursor = (self.collection.find(conditions, {'score': score})
+                      .sort([('score', score), ('created_at', DESCENDING), ('_id', DESCENDING)]))
+        else:
+            cursor = self.collection.find(conditions).sort(SORT)
+        cursor = (cursor.limit(query.limit).batch_size(min(query.limit, 100))
+                  .max_time_ms(config.SEARCH_TIMEOUT_MS))
+        for document in cursor:
+            yield document, round(document.pop('score', 0), 4)
+
+    def scan(self, filters=None, fields=None, batch_size=None):
+        """Batches off one cursor in (created_at, _id) order, projected by the server.
+
+        The cursor's getMore batches are ``batch_size`` documents too, so no
+        more than about two batches are in memory at a time.
+        """
+        batch_size = batch_size or config.EXPORT_BATCH_SIZE
+        projection = None
+        if fields:
+            projection = dict.fromkeys([self._field(name) for name in fields], 1)
+            projection['created_at'] = 1
+        cursor = (self.collection.find(self.query(filters or {}), projection)
+                  .sort([('created_at', ASCENDING), ('_id', ASCENDING)])
+                  .batch_size(batch_size))
+        batch = []
+        for document in cursor:
+            batch.append(document)
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def query(self, filters):
+        """MongoDB filter document for a backend-neutral filter dict."""
+        query = {}
+        created = {}
+        for name, value in filters.items():
+            if name == 'created_after':
+                created['$gte'] = value
+            elif name == 'created_before':
+                created['$lt'] = value
+            else:
+                query[self._field(name)] = value
+        if created:
+            query['created_at'] = created
+        return query
+
+    def oldest(self, before, limit):
+        return list(self.collection.find({'created_at': {'$lt': before}})
+                    .sort([('created_at', ASCENDING), ('_id', ASCENDING)]).limit(limit))
+
+    def replace_many(self, documents):
+        if not documents:
+            return 0
+        result = self.collection.bulk_write(
+            [ReplaceOne({'_id': document['_id']}, document) for document in documents],
+            ordered=False)
+        return result.modified_count
+
+    def delete(self, ids):
+        query = {'_id': {'$in': list(ids)}}
+        deleted = self.collection.delete_many(query).deleted_count
+        self._prune_hot(query)
+        return deleted
+
+    def expire(self, before):
+        query = {'created_at': {'$lt': before}}
+        deleted = self.collection.delete_many(query).deleted_count
+        self._prune_hot(query)
+        return deleted
+
+    def ensure_ttl(self, seconds):
+        """TTL index on created_at, so mongod's TTL monitor deletes expired documents.
+
+        The TTL monitor never touches the capped hot tier, so with one this
+        returns False: retention keeps calling ``expire``, which prunes both.
+        """
+        collection = self.collection
+        if seconds is None:
+            try:
+                collection.drop_index(TTL_INDEX)
+            except OperationFailure as e:
+                if e.code != INDEX_NOT_FOUND:
+                    raise
+            return True
+
+        seconds = int(seconds)
+        try:
+            collection.create_index([('created_at', ASCENDING)], name=TTL_INDEX,
+                                    expireAfterSeconds=seconds)
+        except OperationFailure as e:
+            if e.code != INDEX_OPTIONS_CONFLICT:
+                raise
+            # Retention changed: update the index in place instead of rebuilding it
+            collection.database.command('collMod', collection.name,
+                                        index={'name': TTL_INDEX, 'expireAfterSeconds': seconds})
+        return not self.hot_size
+
+    def ensure_hot_tier(self):
+        """Create the capped hot collection, seeded with the newest documents."""
+        if not self.hot_size:
+            return
+        database = self.collection.database
+        name = self.hot_collection.name
+        if name in database.list_collection_names(filter={'name': name}):
+            return
+        database.create_collection(name, capped=True, max=self.hot_size,
+                                   size=self.hot_size * HOT_DOCUMENT_BYTES)
+        newest = list(self.collection.find().sort(SORT).limit(self.hot_size))
+        if newest:
+            # Oldest first, so natural order is insertion order
+            self.hot_collection.insert_many(newest[::-1], ordered=False)
+
+    def ensure_indexes(self):
+        """Compound indexes backing every filter + keyset sort, the search text index
+        and the delivery guard."""
+        self.collection.create_index([('created_at', DESCENDING), ('_id', DESCENDING)],
+                                     name='created_at_id')
+        for name in FILTER_FIELDS:
+            field = self._field(name)
+            self.collection.create_index(
+                [(field, ASCENDING), ('created_at', DESCENDING), ('_id', DESCENDING)],
+                name=f'{field}_created_at_id')
+        # No stemming or stop words, so a word matches exactly as in the other backends
+        self.collection.create_index([(field, TEXT) for field in TEXT_FIELDS], name=SEARCH_INDEX,
+                                     weights=FIELD_WEIGHTS, default_language='none')
+        ensure_delivery_index(self.collection)
+        self.ensure_hot_tier()
+
+    def stats(self):
+        return {'backend': self.name, 'hot_size': self.hot_size, 'hot_errors': self.hot_errors}
+
+    def close(self):
+        if self._get_collection is None:
+            self.collection.database.client.close()
+
+    def _resolve(self):
+        if self._get_collection is not None and self._pid != os.getpid():
+            self._collection = self._get_collection()
+            self._writer = BatchWriter(self._collection)
+            self._pid = os.getpid()
+        return self._collection
+
+    def _write_hot(self, documents):
+        if not documents:
+            return
+        try:
+            self.hot_collection.insert_many(documents, ordered=False)
+        except BulkWriteError as e:
+            # A replayed batch may already be there
+            errors = (e.details or {}).get('writeErrors', [])
+            if any(error.get('code') != DUPLICATE_KEY for error in errors):
+                self.hot_errors += 1
+                print(f"Hot tier write failed for {len(documents)} documents: {str(e)}")
+        except PyMongoError as e:
+            # The main collection has the documents; latest() falls back to it
+            self.hot_errors += 1
+            print(f"Hot tier write failed for {len(documents)} documents: {str(e)}")
+
+    def _prune_hot(self, query):
+        """Delete what ``query`` matches from the hot tier too, so ``latest`` never serves it."""
+        if not self.hot_size:
+            return
+        try:
+            # Capped collections take deletes from MongoDB 5.0 on
+            self.hot_collection.delete_many(query)
+        except PyMongoError as e:
+            self.hot_errors += 1
+            print(f"Hot tier prune failed: {str(e)}")
+
+    def _field(self, name):
+        return self.action_field if name == 'action' else name
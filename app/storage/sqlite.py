@@ -0,0 +1,351 @@
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+from bson import ObjectId
+
+from app import config
+from app.batching import BatchResult, StorageUnavailable
+from app.dedup import DELIVERY_FIELD
+from app.queries import FILTER_FIELDS, decode_cursor
+from app.search import FIELD_WEIGHTS, TEXT_FIELDS, tokenize
+from app.storage.base import Storage, check_group_by, default_limit
+
+# Fixed-width timestamps so text order is time order
+TIME_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
+
+# Length of the created_at prefix that identifies each time bucket
+BUCKET_PREFIX = {'hour': 13, 'day': 10}
+
+
+class SQLiteStorage(Storage):
+    """Embedded storage in one SQLite file, in WAL mode.
+
+    Filterable fields live in their own indexed columns and the full document
+    is kept as JSON. Every thread (request handlers, the ingest writer) gets
+    its own connection; SQL text is constant so sqlite3's statement cache
+    reuses the prepared statements, and a batch is one transaction.
+
+    ``search`` reads an FTS5 table, ``<table>_search``, which triggers keep
+    in step with every insert and delete, whichever process makes them.
+    """
+
+    name = 'sqlite'
+
+    def __init__(self, path=None, table='actions', action_field='action'):
+        super().__init__(action_field)
+        self.path = path or config.SQLITE_PATH
+        self.table = table
+        self._local = threading.local()
+        self._schema_ready = False
+        self._schema_lock = threading.Lock()
+
+        columns = ', '.join(FILTER_FIELDS)
+        self._insert_sql = (
+            f"INSERT INTO {table} (_id, created_at, {columns}, delivery_id, document) "
+            f"VALUES (?, ?, {', '.join('?' for _ in FILTER_FIELDS)}, ?, ?)"
+        )
+        self._select_sql = f"SELECT _id, created_at, document FROM {table}"
+        # The newest SEARCH_SCAN_LIMIT text matches are ranked; bm25 is lower for better matches
+        self._search_sql = (
+            f"SELECT a._id, a.created_at, a.document, m.score FROM "
+            f"(SELECT rowid, -bm25({table}_search, "
+            f"{', '.join(str(FIELD_WEIGHTS[field]) for field in TEXT_FIELDS)}) AS score "
+            f"FROM {table}_search WHERE {table}_search MATCH ? ORDER BY rowid DESC LIMIT ?) AS m "
+            f"JOIN {table} AS a ON a.rowid = m.rowid"
+        )
+
+    def insert_many(self, documents):
+        result = BatchResult()
+        try:
+            connection = self._connection()
+            with connection:
+                for document in documents:
+                    document.setdefault('_id', ObjectId())
+                    try:
+                        connection.execute(self._insert_sql, self._row(document))
+                        result.inserted += 1
+                    except sqlite3.IntegrityError as e:
+                        if self._is_duplicate(document, str(e)):
+                            result.duplicates.append(document)
+                        else:
+                            result.errors.append((document, str(e)))
+        except sqlite3.OperationalError as e:
+            # Locked, unreadable or out of space: the transaction rolled back
+            raise StorageUnavailable(str(e), pending=documents) from e
+        return result
+
+    def latest(self, limit):
+        rows = self._connection().execute(
+            f"{self._select_sql} ORDER BY created_at DESC, _id DESC LIMIT ?", (limit,))
+        return [self._document(row) for row in rows]
+
+    def find_page(self, filters=None, cursor=None, limit=None):
+        limit = default_limit(limit)
+        where, params = self._where(filters or {})
+        if cursor:
+            created_at, last_id = decode_cursor(cursor)
+            # Row-value comparison seeks straight to the cursor in the index
+            where.append("(created_at, _id) < (?, ?)")
+            params += [created_at.strftime(TIME_FORMAT), last_id]
+
+        sql = self._select_sql
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY created_at DESC, _id DESC LIMIT ?"
+        rows = self._connection().execute(sql, params + [limit + 1])
+        return self._page([self._document(row) for row in rows], limit)
+
+    def count(self, group_by, filters=None, limit=100):
+        check_group_by(group_by)
+        where, params = self._where(filters or {})
+        if group_by in FILTER_FIELDS:
+            key, order = group_by, "count DESC, key"
+        else:
+            key, order = f"substr(created_at, 1, {BUCKET_PREFIX[group_by]})", "key"
+
+        sql = f"SELECT {key} AS key, COUNT(*) AS count FROM {self.table}"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += f" GROUP BY key ORDER BY {order} LIMIT ?"
+        rows = self._connection().execute(sql, params + [limit])
+
+        if group_by in FILTER_FIELDS:
+            return [{group_by: key, 'count': count} for key, count in rows]
+        pad = '0000-01-01T00:00:00'
+        return [{group_by: datetime.fromisoformat(key + pad[len(key):]), 'count': count}
+                for key, count in rows]
+
+    def search(self, query):
+        where, params = self._where(query.filters)
+        if query.author is not None:
+            where.append("author = ?")
+            params.append(query.author)
+        if query.branch is not None:
+            # GLOB with a literal prefix is a range scan of the branch indexes
+            where.append("(to_branch GLOB ? OR from_branch GLOB ?)")
+            params += [query.branch.glob()] * 2
+
+        if query.terms:
+            # Words are quoted, so nothing in them is read as FTS5 syntax; the
+            # author's words narrow the scan before the exact comparison
+            match = ' '.join([f'"{word}"' for word in query.terms] +
+                             [f'author : "{word}"' for word in tokenize(query.author)])
+            sql, params = self._search_sql, [match, config.SEARCH_SCAN_LIMIT] + params
+            order = "m.score DESC, a.created_at DESC, a._id DESC"
+        else:
+            sql = f"SELECT _id, created_at, document, 0 FROM {self.table}"
+            order = "created_at DESC, _id DESC"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += f" ORDER BY {order} LIMIT ?"
+        rows = self._connection().execute(sql, params + [query.limit])
+        return [(self._document(row[:3]), round(row[3], 4)) for row in rows]
+
+    def scan(self, filters=None, fields=None, batch_size=None):
+        """Keyset batches in (created_at, _id) order.
+
+        With ``fields``, SQLite builds a JSON object of just those fields per
+        row, so Python parses no more than that.
+        """
+        batch_size = batch_size or config.EXPORT_BATCH_SIZE
+        body, body_params = "document", []
+        if fields:
+            pairs = []
+            for name in fields:
+                if name in ('_id', 'created_at'):
+                    continue
+                if name in FILTER_FIELDS:
+                    pairs.append(f"?, {name}")
+                    body_params.append(self.action_field if name == 'action' else name)
+                else:
+                    pairs.append("?, json_extract(document, ?)")
+                    body_params += [name, f'$.{name}']
+            body = f"json_object({', '.join(pairs)})"
+        where, params = self._where(filters or {})
+
+        connection = self._connection()
+        last = None
+        while True:
+            conditions, values = list(where), list(params)
+            if last:
+                conditions.append("(created_at, _id) > (?, ?)")
+                values += last
+            sql = f"SELECT _id, created_at, {body} FROM {self.table}"
+            if conditions:
+                sql += " WHERE " + " AND ".join(conditions)
+            sql += " ORDER BY created_at, _id LIMIT ?"
+            rows = connection.execute(sql, body_params + values + [batch_size]).fetchall()
+            if rows:
+                yield [self._document(row) for row in rows]
+            if len(rows) < batch_size:
+                return
+            last = [rows[-1][1], rows[-1][0]]
+
+    def oldest(self, before, limit):
+        rows = self._connection().execute(
+            f"{self._select_sql} WHERE created_at < ? ORDER BY created_at, _id LIMIT ?",
+            (before.strftime(TIME_FORMAT), limit))
+        return [self._document(row) for row in rows]
+
+    def replace_many(self, documents):
+        rows = []
+        for document in documents:
+            _id, _, *fields, _, body = self._row(document)
+            rows.append(fields + [body, _id])
+        columns = ', '.join(f"{name} = ?" for name in FILTER_FIELDS)
+        connection = self._connection()
+        with connection:
+            # The search table follows through the update trigger
+            cursor = connection.executemany(
+                f"UPDATE {self.table} SET {columns}, document = ? WHERE _id = ?", rows)
+        return cursor.rowcount
+
+    def delete(self, ids):
+        connection = self._connection()
+        with connection:
+            cursor = connection.executemany(f"DELETE FROM {self.table} WHERE _id = ?",
+                                            [(str(_id),) for _id in ids])
+        return cursor.rowcount
+
+    def expire(self, before):
+        connection = self._connection()
+        with connection:
+            cursor = connection.execute(f"DELETE FROM {self.table} WHERE created_at < ?",
+                                        (before.strftime(TIME_FORMAT),))
+        return cursor.rowcount
+
+    def ensure_indexes(self):
+        self._connection()
+
+    def close(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+    def stats(self):
+        row = self._connection().execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()
+        return {'backend': self.name, 'path': self.path, 'documents': row[0]}
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None and self._local.pid == os.getpid():
+            return connection
+
+        connection = sqlite3.connect(self.path, timeout=30, cached_statements=256,
+                                     check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        self._local.connection = connection
+        self._local.pid = os.getpid()
+        self._create_schema(connection)
+        return connection
+
+    def _create_schema(self, connection):
+        with self._schema_lock:
+            if self._schema_ready:
+                return
+            columns = ', '.join(f"{name} TEXT" for name in FILTER_FIELDS)
+            with connection:
+                connection.execute(
+                    f"CREATE TABLE IF NOT EXISTS {self.table} ("
+                    f"_id TEXT PRIMARY KEY, created_at TEXT NOT NULL, {columns}, "
+                    f"delivery_id TEXT UNIQUE, document TEXT NOT NULL)")
+                existing = {row[1] for row in connection.execute(f"PRAGMA table_info({self.table})")}
+                for name in FILTER_FIELDS:
+                    if name not in existing:
+                        # Filter fields added after the table was created are filled in from the documents
+                        connection.execute(f"ALTER TABLE {self.table} ADD COLUMN {name} TEXT")
+                        field = self.action_field if name == 'action' else name
+                        connection.execute(f"UPDATE {self.table} SET {name} = "
+                                           f"json_extract(document, ?)", (f'$.{field}',))
+                connection.execute(
+                    f"CREATE INDEX IF NOT EXISTS {self.table}_created_at_id "
+                    f"ON {self.table} (created_at DESC, _id DESC)")
+                for name in FILTER_FIELDS:
+                    connection.execute(
+                        f"CREATE INDEX IF NOT EXISTS {self.table}_{name}_created_at_id "
+                        f"ON {self.table} ({name}, created_at DESC, _id DESC)")
+                self._create_search_table(connection)
+            self._schema_ready = True
+
+    def _create_search_table(self, connection):
+        """FTS5 table over the TEXT_FIELDS plus the triggers that maintain it."""
+        search = f"{self.table}_search"
+        exists = connection.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (search,)).fetchone()
+        connection.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {search} USING fts5({', '.join(TEXT_FIELDS)})")
+        values = {field: f"{{row}}.{field}" for field in TEXT_FIELDS}
+        values['name'] = "json_extract({row}.document, '$.name')"
+        values['commit_messages'] = (
+            "(SELECT group_concat(value, ' ') FROM json_each({row}.document, '$.commit_messages'))")
+        columns = ', '.join(TEXT_FIELDS)
+        connection.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {search}_insert AFTER INSERT ON {self.table} BEGIN "
+            f"INSERT INTO {search} (rowid, {columns}) VALUES (new.rowid, "
+            f"{', '.join(value.format(row='new') for value in values.values())}); END")
+        connection.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {search}_delete AFTER DELETE ON {self.table} BEGIN "
+            f"DELETE FROM {search} WHERE rowid = old.rowid; END")
+        # Rewrites that leave the indexed text alone (schema migrations) skip the search table
+        changed = ' OR '.join(f"({value.format(row='old')}) IS NOT ({value.format(row='new')})"
+                              for value in values.values())
+        connection.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {search}_update AFTER UPDATE ON {self.table} "
+            f"WHEN {changed} BEGIN "
+            f"DELETE FROM {search} WHERE rowid = old.rowid; "
+            f"INSERT INTO {search} (rowid, {columns}) VALUES (new.rowid, "
+            f"{', '.join(value.format(row='new') for value in values.values())}); END")
+        if not exists:
+            # Tables from before search was added are indexed once, here
+            connection.execute(
+                f"INSERT INTO {search} (rowid, {columns}) SELECT rowid, "
+                f"{', '.join(value.format(row=self.table) for value in values.values())} "
+                f"FROM {self.table}")
+
+    def _where(self, filters):
+        where, params = [], []
+        for name, value in filters.items():
+            if name == 'created_after':
+                where.append("created_at >= ?")
+                params.append(value.strftime(TIME_FORMAT))
+            elif name == 'created_before':
+                where.append("created_at < ?")
+                params.append(value.strftime(TIME_FORMAT))
+            else:
+                where.append(f"{name} = ?")
+                params.append(value)
+        return where, params
+
+    def _is_duplicate(self, document, message):
+        """Whether an IntegrityError means the document is already stored.
+
+        A replayed spool batch repeats its _id; a redelivery repeats its delivery_id.
+        """
+        if f'{self.table}._id' in message:
+            return True
+        return document.get(DELIVERY_FIELD) is not None and 'delivery_id' in message
+
+    def _row(self, document):
+        fields = [document.get(self.action_field if name == 'action' else name)
+                  for name in FILTER_FIELDS]
+        return [
+            str(document['_id']),
+            document['created_at'].strftime(TIME_FORMAT),
+            *fields,
+            document.get(DELIVERY_FIELD),
+            json.dumps(document, default=str),
+        ]
+
+    @staticmethod
+    def _document(row):
+        _id, created_at, body = row
+        document = json.loads(body)
+        document['_id'] = ObjectId(_id)
+        # TIME_FORMAT is ISO 8601, and fromisoformat parses it far faster than strptime
+        document['created_at'] = datetime.fromisoformat(created_at)
+        return document
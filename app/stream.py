@@ -0,0 +1,138 @@
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+
+from app import config
+
+
+class Broadcaster:
+    """In-process fan-out of newly ingested actions to streaming clients.
+
+    Published items go into one bounded history shared by all clients; each
+    client only holds a cursor, so a thousand listeners cost a thousand
+    integers rather than a thousand queues or database queries.
+
+    Cursors look like ``<token>:<seq>``. The token is unique to this
+    broadcaster, so a cursor handed out by another worker (or before a
+    restart) is recognised as foreign and the client is told to resync.
+    """
+
+    def __init__(self, history=None):
+        self.history = history or config.STREAM_HISTORY
+        self.token = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+        self._cond = threading.Condition()
+        self._events = deque(maxlen=self.history)
+        self._seq = 0
+        self.published = 0
+        self.clients = 0
+        self.peak_clients = 0
+
+    @property
+    def cursor(self):
+        """Cursor pointing just past the newest published item."""
+        return self._format_cursor(self._seq)
+
+    def publish(self, items):
+        """Append items to the history and wake every waiting client."""
+        if not items:
+            return
+        with self._cond:
+            for item in items:
+                self._seq += 1
+                self._events.append((self._seq, item))
+            self.published += len(items)
+            self._cond.notify_all()
+
+    def wait(self, cursor, timeout):
+        """Block until there is something newer than ``cursor`` or ``timeout`` passes.
+
+        Returns ``(cursor, items, reset)``. ``reset`` is True when the client
+        fell behind the retained history or holds a foreign cursor and must
+        reload the full feed instead of applying deltas.
+        """
+        seq = self._parse_cursor(cursor)
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            if seq is None or seq > self._seq:
+                return self._format_cursor(self._seq), [], True
+
+            while self._seq <= seq:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return self._format_cursor(seq), [], False
+                self._cond.wait(remaining)
+
+            oldest = self._events[0][0] if self._events else self._seq + 1
+            if seq + 1 < oldest:
+                return self._format_cursor(self._seq), [], True
+
+            items = [item for item_seq, item in self._events if item_seq > seq]
+            return self._format_cursor(self._seq), items, False
+
+    def connect(self):
+        """Count a client in; pair with ``disconnect``."""
+        with self._cond:
+            self.clients += 1
+            self.peak_clients = max(self.peak_clients, self.clients)
+
+    def disconnect(self):
+        """Count a client out."""
+        with self._cond:
+            self.clients -= 1
+
+    def stats(self):
+        """Return client and publish counters."""
+        with self._cond:
+            return {
+                'cursor': self._format_cursor(self._seq),
+                'history': len(self._events),
+                'history_limit': self.history,
+                'published': self.published,
+                'clients': self.clients,
+                'peak_clients': self.peak_clients,
+            }
+
+    def _format_cursor(self, seq):
+        return f"{self.token}:{seq}"
+
+    def _parse_cursor(self, cursor):
+        if not cursor:
+            return self._seq
+        token, _, seq = cursor.rpartition(':')
+        if token != self.token or not seq.isdigit():
+            return None
+        return int(seq)
+
+
+def sse_events(broadcaster, cursor, keepalive=None, max_duration=None):
+    """Yield Server-Sent Events frames with deltas after ``cursor``.
+
+    The stream ends after ``max_duration`` seconds; EventSource reconnects on
+    its own and resumes from the ``Last-Event-ID`` it was last sent.
+    """
+    keepalive = config.STREAM_KEEPALIVE if keepalive is None else keepalive
+    max_duration = config.STREAM_MAX_SECONDS if max_duration is None else max_duration
+    ends_at = time.monotonic() + max_duration
+
+    broadcaster.connect()
+    try:
+        yield f"retry: {config.STREAM_RETRY_MS}\n\n"
+        if not cursor:
+            cursor = broadcaster.cursor
+            yield f"id: {cursor}\nevent: ready\ndata: {{}}\n\n"
+
+        while time.monotonic() < ends_at:
+            cursor, items, reset = broadcaster.wait(cursor, keepalive)
+            if reset:
+                yield f"id: {cursor}\nevent: reset\ndata: {{}}\n\n"
+            elif items:
+                data = json.dumps({'actions': items}, separators=(',', ':'), default=str)
+                yield f"id: {cursor}\nevent: actions\ndata: {data}\n\n"
+            else:
+                yield ": keepalive\n\n"
+    finally:
+        broadcaster.disconnect()
@@ -0,0 +1,173 @@
+"""
+Tenant registry: who may deliver webhooks, with which secret, and where to.
+
+A tenant is a name plus its own webhook secrets, target collection,
+repository allowlist, retention and rate limit. The registry is read from
+TENANTS_FILE once per process and kept in memory; requests only do a dict
+lookup. The "default" tenant always exists and is built from the
+WEBHOOK_SECRETS / COLLECTION_NAME settings unless the file overrides it.
+
+    {
+      "acme": {
+        "secrets_env": "ACME_WEBHOOK_SECRETS",
+        "collection": "acme_actions",
+        "repositories": ["acme/*"],
+        "retention_days": 90,
+        "rate_limit": 5,
+        "burst": 20
+      }
+    }
+
+``secrets`` may be given inline (list or comma-separated string) or, better,
+named through ``secrets_env``. Repository patterns use shell-style wildcards
+and are matched against ``repository.full_name``; without any, every
+repository is accepted.
+"""
+import json
+import os
+import re
+from fnmatch import fnmatchcase
+
+from app import config
+from app.signatures import SignatureVerifier
+
+DEFAULT_TENANT = 'default'
+
+# Tenant names appear in URLs; collection names become MongoDB collections and SQLite tables
+NAME_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+COLLECTION_PATTERN = re.compile(r'^[A-Za-z_][A-Za-z0-9_]{0,63}$')
+# Paths under /webhook taken by the receiver blueprint
+RESERVED_NAMES = frozenset({'receiver', 'events'})
+
+SETTINGS = frozenset({'secrets', 'secrets_env', 'collection', 'repositories',
+                      'retention_days', 'rate_limit', 'burst'})
+
+
+class Tenant:
+    """One tenant's settings and its signature verifier."""
+
+    __slots__ = ('name', 'collection', 'repositories', 'retention_days', 'rate_limit',
+                 'burst', 'verifier')
+
+    def __init__(self, name, secrets, collection, repositories=(), retention_days=None,
+                 rate_limit=0, burst=0):
+        self.name = name
+        self.collection = collection
+        self.repositories = tuple(repositories)
+        self.retention_days = retention_days
+        self.rate_limit = rate_limit
+        self.burst = burst
+        self.verifier = SignatureVerifier(secrets)
+
+    def __repr__(self):
+        return f'Tenant({self.name!r}, collection={self.collection!r})'
+
+    def accepts(self, repository):
+        """Whether deliveries from ``repository`` (owner/name) belong to this tenant."""
+        if not self.repositories:
+            return True
+        return repository is not None and any(
+            fnmatchcase(repository, pattern) for pattern in self.repositories)
+
+    def stats(self):
+        return {
+            'collection': self.collection,
+            'repositories': list(self.repositories),
+            'retention_days': self.retention_days,
+            'rate_limit': self.rate_limit,
+            'burst': self.burst,
+            'signatures': self.verifier.stats(),
+        }
+
+
+class TenantRegistry:
+    """Every configured tenant by name, loaded once from ``path`` (TENANTS_FILE).
+
+    Raises ValueError at load time for an unreadable file or invalid settings,
+    so a bad deploy fails at startup rather than on the first delivery.
+    """
+
+    def __init__(self, path=None):
+        self.path = config.TENANTS_FILE if path is None else path
+        self.tenants = self._load()
+
+    def __iter__(self):
+        return iter(self.tenants.values())
+
+    def __len__(self):
+        return len(self.tenants)
+
+    def get(self, name):
+        return self.tenants.get(name)
+
+    @property
+    def default(self):
+        return self.tenants[DEFAULT_TENANT]
+
+    def stats(self):
+        return {tenant.name: tenant.stats() for tenant in self}
+
+    def _load(self):
+        entries = {}
+        if self.path:
+            try:
+                with open(self.path) as tenants_file:
+                    entries = json.load(tenants_file)
+            except (OSError, ValueError) as e:
+                raise ValueError(f"Cannot load tenants from {self.path}: {str(e)}")
+            if not isinstance(entries, dict):
+                raise ValueError(f"{self.path} must hold a JSON object of tenant name -> settings")
+
+        defaults = {
+            'secrets': config.WEBHOOK_SECRETS,
+            'collection': config.COLLECTION_NAME,
+            'rate_limit': config.TENANT_RATE_LIMIT,
+            'burst': config.TENANT_BURST,
+        }
+        tenants = {DEFAULT_TENANT: self._tenant(DEFAULT_TENANT, {
+            **defaults, **entries.pop(DEFAULT_TENANT, {})})}
+        for name, settings in entries.items():
+            if not isinstance(settings, dict):
+                raise ValueError(f"Tenant {name}: settings must be a JSON object")
+            # Tenants share the default limits unless they set their own
+            tenants[name] = self._tenant(name, {
+                'collection': config.COLLECTION_NAME,
+                'rate_limit': config.TENANT_RATE_LIMIT,
+                'burst': config.TENANT_BURST,
+                **settings,
+            })
+        return tenants
+
+    @staticmethod
+    def _tenant(name, settings):
+        if not NAME_PATTERN.match(name) or name in RESERVED_NAMES:
+            raise ValueError(f"Invalid tenant name: {name!r}")
+        unknown = set(settings) - SETTINGS
+        if unknown:
+            raise ValueError(f"Tenant {name}: unknown settings {', '.join(sorted(unknown))}")
+
+        secrets = settings.get('secrets')
+        if settings.get('secrets_env'):
+            secrets = os.getenv(settings['secrets_env'], '')
+        if isinstance(secrets, str):
+            secrets = [secret.strip() for secret in secrets.split(',')]
+        if not secrets or not any(secrets):
+            raise ValueError(f"Tenant {name}: no webhook secret configured")
+
+        collection = settings['collection']
+        if not isinstance(collection, str) or not COLLECTION_PATTERN.match(collection):
+            raise ValueError(f"Tenant {name}: invalid collection name {collection!r}")
+
+        repositories = settings.get('repositories') or []
+        if isinstance(repositories, str):
+            repositories = [repositories]
+
+        try:
+            retention_days = settings.get('retention_days')
+            retention_days = float(retention_days) if retention_days is not None else None
+            rate_limit = float(settings.get('rate_limit') or 0)
+            burst = float(settings.get('burst') or 0)
+        except (TypeError, ValueError):
+            raise ValueError(f"Tenant {name}: retention_days, rate_limit and burst must be numbers")
+
+        return Tenant(name, secrets, collection, repositories, retention_days, rate_limit, burst)
@@ -1,81 +1,105 @@
+import math
+
 from flask import Blueprint, jsonify, request
-from pymongo import MongoClient
-from datetime import datetime
-from flask_cors import CORS
 
-# MongoDB setup
-client = MongoClient("mongodb://localhost:27017/")
-db = client["webhook_db"]
-collection = db["events"]
+from app import config
+from app.admission import Overloaded, admission
+from app.dedup import DeliveryCache
+from app.events import extract_event
+from app.ingest import IngestQueue, QueueFull
+from app.queries import QueryError, build_filter, parse_limit
+from app.ratelimit import rate_limiter
+from app.retention import Retention
+from app.schema import event_document, view
+from app.signatures import PayloadRejected, SignatureVerifier
+from app.spool import Spool
+from app.startup import startup
+from app.storage import create_storage
+
+# Storage setup; events are stored in the canonical schema (app/schema.py), like actions
+storage = create_storage(database="webhook_db", collection="events")
+
+# Events are written in the background so the receiver can acknowledge right
+# away, and spooled to disk while the database is unreachable
+spool = Spool("events", admission.timed(storage.insert_many))
+ingest_queue = IngestQueue(spool.write, name="events")
+admission.watch(ingest_queue)
+# Expiry and archiving per RETENTION_DAYS / ARCHIVE_AFTER_DAYS
+retention = Retention(storage, "events")
+delivery_cache = DeliveryCache()
+signature_verifier = SignatureVerifier()
 
 webhook = Blueprint('Webhook', __name__, url_prefix='/webhook')
-CORS(webhook)  # Enable CORS for the frontend
+
+@startup.task('event-indexes')
+def ensure_indexes():
+    """Indexes behind /webhook/events and the X-GitHub-Delivery guard."""
+    storage.ensure_indexes()
+
+@webhook.before_request
+def start_background_workers():
+    spool.ensure_started()
+    retention.ensure_started()
 
 @webhook.route('/receiver', methods=['POST'])
 def receiver():
     if not request.is_json:
         return jsonify({"error": "Content type must be application/json"}), 400
 
-    data = request.get_json()
-    event = request.headers.get('X-GitHub-Event')
-    timestamp = datetime.utcnow().isoformat()
-
-    if event == 'push':
-        author = data['pusher']['name']
-        to_branch = data['ref'].split('/')[-1]
-        timestamp = data['head_commit']['timestamp']
-
-        event_data = {
-            "type": "push",
-            "author": author,
-            "to_branch": to_branch,
-            "timestamp": timestamp,
-            "message": f"{author} pushed to {to_branch} on {timestamp}",
-            "created_at": datetime.utcnow()
-        }
-        collection.insert_one(event_data)
-
-    elif event == 'pull_request':
-        action = data['action']
-        pr_data = data['pull_request']
-        author = pr_data['user']['login']
-        from_branch = pr_data['head']['ref']
-        to_branch = pr_data['base']['ref']
-
-        if action == 'opened':
-            timestamp = pr_data['created_at']
-            event_data = {
-                "type": "pull_request",
-                "author": author,
-                "from_branch": from_branch,
-                "to_branch": to_branch,
-                "timestamp": timestamp,
-                "message": f"{author} submitted a pull request from {from_branch} to {to_branch} on {timestamp}",
-                "created_at": datetime.utcnow()
-            }
-            collection.insert_one(event_data)
-
-        elif action == 'closed' and pr_data['merged']:
-            timestamp = pr_data['merged_at']
-            event_data = {
-                "type": "merge",
-                "author": author,
-                "from_branch": from_branch,
-                "to_branch": to_branch,
-                "timestamp": timestamp,
-                "message": f"{author} merged branch {from_branch} to {to_branch} on {timestamp}",
-                "created_at": datetime.utcnow()
-            }
-            collection.insert_one(event_data)
-
-    return jsonify({"status": "success"}), 200
+    # Oversized or badly signed deliveries are refused before the body is parsed
+    try:
+        body = signature_verifier.read(request.stream, request.content_length,
+                                       request.headers.get('X-Hub-Signature-256'))
+    except PayloadRejected as e:
+        return jsonify({"error": e.reason}), e.status
+
+    delivery_id = request.headers.get('X-GitHub-Delivery')
+    if delivery_id and delivery_cache.check(delivery_id):
+        return jsonify({"status": "duplicate"}), 200
+
+    try:
+        event = extract_event(request.headers.get('X-GitHub-Event'), body)
+    except ValueError:
+        return jsonify({"error": "Invalid JSON payload"}), 400
+
+    if event is None:
+        return jsonify({"status": "ignored"}), 200
+
+    # Limited like the default tenant, per repository of the verified payload
+    wait = rate_limiter.acquire(('receiver', event.repository),
+                                config.TENANT_RATE_LIMIT, config.TENANT_BURST)
+    if wait:
+        return jsonify({"error": "Rate limit exceeded"}), 429, {"Retry-After": str(math.ceil(wait))}
+
+    # Pull requests are recorded when opened and when merged
+    if event.action == 'pull_request' and event.event_action != 'opened':
+        return jsonify({"status": "ignored"}), 200
+
+    event_data = event_document(event, delivery_id=delivery_id)
+
+    try:
+        admission.put(ingest_queue, event_data)
+    except Overloaded as e:
+        return jsonify({"error": "Overloaded, retry later"}), 503, {"Retry-After": str(e.retry_after)}
+    except QueueFull:
+        return jsonify({"error": "Ingest queue is full"}), 503, {"Retry-After": "1"}
+
+    if delivery_id:
+        delivery_cache.add(delivery_id)
+
+    return jsonify({"status": "accepted"}), 202
 
 @webhook.route('/events', methods=['GET'])
 def get_events():
-    # Add CORS headers
-    events = list(collection.find(
-        {},
-        {'_id': 0}
-    ).sort('created_at', -1).limit(50))
+    # Filters and paging share the actions API's parameters
+    try:
+        filters = build_filter(request.args)
+        limit = parse_limit(request.args)
+        events, next_cursor = storage.find_page(filters, request.args.get('cursor'), limit)
+    except QueryError as e:
+        return jsonify({"error": str(e)}), 400
 
-    return jsonify({"events": events}), 200
+    # "type" and "message" are what this endpoint returned before the canonical schema
+    events = [dict(action, type=action['action'], message=action['display_text'])
+              for action in map(view, events)]
+    return jsonify({"events": events, "next_cursor": next_cursor}), 200
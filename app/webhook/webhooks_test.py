@@ -1,5 +1,8 @@
 import requests
+import hashlib
+import hmac
 import json
+import os
 import time
 from datetime import datetime
 
@@ -52,7 +55,7 @@ def test_webhook_events():
                 timeout=10
             )
             
-            if response.status_code == 200:
+            if response.status_code in (200, 202):
                 print(f"✅ Event {i} sent successfully")
                 print(f"   Response: {response.json()}")
             else:
@@ -128,19 +131,25 @@ def simulate_github_webhook():
         ]
     }
     
+    # Signed like GitHub does, with the server's WEBHOOK_SECRET
+    body = json.dumps(github_push_payload).encode("utf-8")
+    secret = os.getenv("WEBHOOK_SECRET", "your-webhook-secret-here")
+    signature = hmac.new(secret.encode("utf-8"), body, hashlib.sha256).hexdigest()
+    
     print("\n🚀 Simulating real GitHub webhook...")
     try:
         response = requests.post(
             "http://localhost:5000/webhook",
-            json=github_push_payload,
+            data=body,
             headers={
                 "Content-Type": "application/json",
-                "X-GitHub-Event": "push"
+                "X-GitHub-Event": "push",
+                "X-Hub-Signature-256": f"sha256={signature}"
             },
             timeout=10
         )
         
-        if response.status_code == 200:
+        if response.status_code in (200, 202):
             print("✅ GitHub webhook simulation successful")
             print(f"   Response: {response.json()}")
         else:
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Benchmark: per-event insert_one vs batched insert_many through the ingest queue.
+
+Uses an in-memory collection that charges a fixed round-trip latency per call,
+so the numbers show how much of the write cost is network round trips.
+
+    python benchmarks/bench_batch_writes.py --events 5000 --rtt-ms 1.0
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pymongo.errors import BulkWriteError
+
+from app.batching import BatchWriter
+from app.ingest import IngestQueue
+
+
+class _InsertManyResult:
+    def __init__(self, inserted_ids):
+        self.inserted_ids = inserted_ids
+
+
+class SlowCollection:
+    """In-memory stand-in for a Mongo collection with a simulated round trip."""
+
+    def __init__(self, rtt_ms, per_doc_us=5, fail_every=0):
+        self.rtt = rtt_ms / 1000
+        self.per_doc = per_doc_us / 1000000
+        self.fail_every = fail_every
+        self.documents = []
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def insert_one(self, document):
+        self.insert_many([document])
+
+    def insert_many(self, documents, ordered=True):
+        time.sleep(self.rtt + self.per_doc * len(documents))
+        errors = []
+        with self._lock:
+            self.calls += 1
+            for index, document in enumerate(documents):
+                if self.fail_every and len(self.documents) % self.fail_every == self.fail_every - 1:
+                    self.documents.append(None)
+                    errors.append({'index': index, 'code': 121, 'errmsg': 'Document failed validation'})
+                    if ordered:
+                        break
+                    continue
+                self.documents.append(document)
+        if errors:
+            raise BulkWriteError({'writeErrors': errors,
+                                  'nInserted': len(documents) - len(errors)})
+        return _InsertManyResult(list(range(len(documents))))
+
+
+def make_documents(count):
+    return [{'author': f'user{i % 50}', 'action': 'push', 'to_branch': 'main', 'seq': i}
+            for i in range(count)]
+
+
+def bench_insert_one(events, rtt_ms):
+    collection = SlowCollection(rtt_ms)
+    started = time.perf_counter()
+    for document in make_documents(events):
+        collection.insert_one(document)
+    elapsed = time.perf_counter() - started
+    return elapsed, collection.calls, events
+
+
+def bench_batched(events, rtt_ms, batch_size, delay_ms, fail_every=0):
+    collection = SlowCollection(rtt_ms, fail_every=fail_every)
+    ingest = IngestQueue(BatchWriter(collection), name='bench', maxsize=events + 1,
+                         policy='block', batch_size=batch_size, batch_delay_ms=delay_ms)
+    started = time.perf_counter()
+    for document in make_documents(events):
+        ingest.put(document)
+    ingest.close(timeout=600)
+    elapsed = time.perf_counter() - started
+    stats = ingest.stats()
+    return elapsed, collection.calls, stats['written'], stats['failed']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--events', type=int, default=5000)
+    parser.add_argument('--rtt-ms', type=float, default=1.0)
+    parser.add_argument('--batch-size', type=int, default=100)
+    parser.add_argument('--delay-ms', type=float, default=50)
+    parser.add_argument('--fail-every', type=int, default=0,
+                        help='reject every Nth document to exercise partial failures')
+    args = parser.parse_args()
+
+    print(f"📊 {args.events} events, simulated round trip {args.rtt_ms} ms")
+    print("=" * 60)
+
+    elapsed, calls, written = bench_insert_one(args.events, args.rtt_ms)
+    baseline = args.events / elapsed
+    print(f"insert_one per event : {baseline:10.0f} events/sec  "
+          f"({calls} round trips, {written} written)")
+
+    elapsed, calls, written, failed = bench_batched(
+        args.events, args.rtt_ms, args.batch_size, args.delay_ms, args.fail_every)
+    batched = args.events / elapsed
+    print(f"batched insert_many  : {batched:10.0f} events/sec  "
+          f"({calls} round trips, {written} written, {failed} failed)")
+
+    print("=" * 60)
+    print(f"Speedup: {batched / baseline:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
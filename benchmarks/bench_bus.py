@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+Benchmark: cross-worker event bus propagation latency, across processes.
+
+``bus`` mode forks ``--subscribers`` processes, each with a SocketBus in a
+scratch BUS_DIR, and has the parent publish ``--rate`` actions/sec for
+``--seconds`` with each flush interval in ``--flush-ms``. Every action
+carries its publish time, so subscribers measure publish-to-receive latency
+(coalescing delay included); the parent reports p50/p95/p99, the share of
+actions every subscriber received and how many messages the coalescing
+turned them into.
+
+``server`` mode starts gunicorn (gthread, ``--workers`` workers) once with
+EVENT_BUS=none and once with EVENT_BUS=socket, opens ``--streams``
+dashboard connections on /api/actions/stream (spread over the workers by the
+kernel; the report says over how many), POSTs signed pushes to /webhook,
+each on a new connection, and reports which share of (delivery, stream)
+pairs arrived and how long it took from the POST.
+Without the bus a stream only sees what its own worker ingested.
+
+    python benchmarks/bench_bus.py
+    python benchmarks/bench_bus.py --modes bus --subscribers 8 --rate 5000 --flush-ms 0 5 20 50
+    python benchmarks/bench_bus.py --modes server --workers 4 --streams 16 --deliveries 200
+"""
+import argparse
+import hashlib
+import hmac
+import http.client
+import json
+import multiprocessing
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_servers import SECRET, free_port, start_server, stop_server
+
+
+def percentile(samples, fraction):
+    if not samples:
+        return None
+    samples = sorted(samples)
+    return samples[min(int(len(samples) * fraction), len(samples) - 1)]
+
+
+def latency_row(samples):
+    return {name: round(percentile(samples, fraction) * 1000, 2) if samples else None
+            for name, fraction in (('p50_ms', 0.50), ('p95_ms', 0.95), ('p99_ms', 0.99))}
+
+
+def subscriber(directory, flush_ms, ready, results, duration):
+    from app.bus import SocketBus
+
+    latencies = []
+    bus = SocketBus(directory, flush_ms=flush_ms)
+
+    def received(collection, actions):
+        now = time.time()
+        latencies.extend(now - action['published_at'] for action in actions)
+
+    bus.subscribe(received)
+    bus.ensure_started()
+    ready.put(os.getpid())
+    time.sleep(duration)
+    bus.close()
+    results.put((len(latencies), latencies))
+
+
+def run_bus(args, flush_ms):
+    from app.bus import SocketBus
+
+    directory = tempfile.mkdtemp(prefix='bus-', dir='/tmp')
+    context = multiprocessing.get_context('fork')
+    ready, results = context.Queue(), context.Queue()
+    # Subscribers outlive the publishing window by a margin for the last flush
+    duration = args.seconds + 1 + flush_ms / 1000
+    processes = [context.Process(target=subscriber,
+                                 args=(directory, flush_ms, ready, results, duration))
+                 for _ in range(args.subscribers)]
+    try:
+        for process in processes:
+            process.start()
+        for _ in processes:
+            ready.get(timeout=10)
+
+        bus = SocketBus(directory, flush_ms=flush_ms)
+        bus.ensure_started()
+        time.sleep(0.2)
+        total = int(args.rate * args.seconds)
+        started = time.monotonic()
+        for i in range(total):
+            # Paced in small bursts, like ingest batches landing
+            due = started + i / args.rate
+            delay = due - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            bus.publish('actions', [{'id': str(i), 'published_at': time.time(),
+                                     'display_text': 'x' * args.action_bytes}])
+        bus.close()
+        stats = bus.stats()
+
+        received, latencies = 0, []
+        for _ in processes:
+            count, samples = results.get(timeout=duration + 30)
+            received += count
+            latencies.extend(samples)
+        for process in processes:
+            process.join()
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.kill()
+        shutil.rmtree(directory, ignore_errors=True)
+
+    return dict(latency_row(latencies), flush_ms=flush_ms, published=total,
+                delivered_pct=round(received / (total * args.subscribers) * 100, 2),
+                messages=stats['sent_messages'], dropped=stats['dropped'],
+                actions_per_message=round(total / max(stats['sent_messages'], 1), 1))
+
+
+class StreamReader(threading.Thread):
+    """One /api/actions/stream connection, recording when each author's action arrives."""
+
+    def __init__(self, port):
+        super().__init__(daemon=True)
+        self.seen = {}
+        self.worker = None
+        self.ready = threading.Event()
+        self.sock = socket.create_connection(('127.0.0.1', port), timeout=60)
+        self.sock.sendall(b'GET /api/actions/stream HTTP/1.1\r\nHost: localhost\r\n'
+                          b'Accept: text/event-stream\r\n\r\n')
+
+    def run(self):
+        buffer = b''
+        try:
+            while True:
+                chunk = self.sock.recv(65536)
+                if not chunk:
+                    return
+                buffer += chunk
+                *lines, buffer = buffer.split(b'\n')
+                for line in lines:
+                    if line.startswith(b'id: ') and self.worker is None:
+                        # Stream cursors start with the serving worker's pid
+                        self.worker = line[4:].split(b'-', 1)[0].decode()
+                    elif line.startswith(b'event: ready'):
+                        self.ready.set()
+                    elif line.startswith(b'data: {"actions"'):
+                        now = time.time()
+                        for action in json.loads(line[6:])['actions']:
+                            self.seen.setdefault(action['author'], now)
+        except OSError:
+            return
+
+    def close(self):
+        self.sock.close()
+
+
+def push(number):
+    body = json.dumps({
+        'ref': 'refs/heads/main',
+        'pusher': {'name': f'bus-{number}'},
+        'repository': {'full_name': 'bench/bus'},
+        'head_commit': {'message': f'Bench push {number}', 'timestamp': '2024-01-01T00:00:00Z'},
+    }).encode('utf-8')
+    signature = 'sha256=' + hmac.new(SECRET.encode(), body, hashlib.sha256).hexdigest()
+    return body, {'Content-Type': 'application/json', 'X-GitHub-Event': 'push',
+                  'X-GitHub-Delivery': f'bench-bus-{number}-{os.urandom(4).hex()}',
+                  'X-Hub-Signature-256': signature}
+
+
+def run_server(args, bus_backend, directory):
+    port = free_port()
+    os.environ.update(EVENT_BUS=bus_backend, BUS_DIR=os.path.join(directory, 'bus'))
+    options = argparse.Namespace(workers=args.workers, threads=args.threads, storage='memory')
+    server = start_server('gthread', port, options, os.path.join(directory, bus_backend))
+    streams = []
+    try:
+        streams = [StreamReader(port) for _ in range(args.streams)]
+        for stream in streams:
+            stream.start()
+        for stream in streams:
+            stream.ready.wait(10)
+
+        sent = {}
+        for number in range(args.deliveries):
+            body, headers = push(number)
+            # A connection per push, so the pushes are spread over the workers too
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+            sent[f'bus-{number}'] = time.time()
+            connection.request('POST', '/webhook', body=body, headers=headers)
+            connection.getresponse().read()
+            connection.close()
+            time.sleep(1 / args.delivery_rate)
+        time.sleep(args.settle)
+    finally:
+        for stream in streams:
+            stream.close()
+        stop_server(server)
+
+    latencies = [stream.seen[author] - at for stream in streams
+                 for author, at in sent.items() if author in stream.seen]
+    return dict(latency_row(latencies), bus=bus_backend,
+                stream_workers=len({stream.worker for stream in streams if stream.worker}),
+                delivered_pct=round(len(latencies) / (len(sent) * len(streams)) * 100, 2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--modes', nargs='+', choices=('bus', 'server'), default=['bus', 'server'])
+    parser.add_argument('--subscribers', type=int, default=4, help='bus mode: subscriber processes')
+    parser.add_argument('--rate', type=float, default=2000, help='bus mode: actions published/sec')
+    parser.add_argument('--seconds', type=float, default=3, help='bus mode: publishing time')
+    parser.add_argument('--action-bytes', type=int, default=300, help='bus mode: size of each action')
+    parser.add_argument('--flush-ms', type=float, nargs='+', default=[0, 20],
+                        help='bus mode: BUS_FLUSH_MS values to compare')
+    parser.add_argument('--workers', type=int, default=4, help='server mode: gunicorn workers')
+    parser.add_argument('--threads', type=int, default=32, help='server mode: threads per worker')
+    parser.add_argument('--streams', type=int, default=16, help='server mode: open streams')
+    parser.add_argument('--deliveries', type=int, default=100, help='server mode: pushes POSTed')
+    parser.add_argument('--delivery-rate', type=float, default=50,
+                        help='server mode: pushes per second')
+    parser.add_argument('--settle', type=float, default=2,
+                        help='server mode: seconds to wait for the last actions')
+    parser.add_argument('--output', help='write the results as JSON')
+    args = parser.parse_args()
+
+    results = {}
+    if 'bus' in args.modes:
+        print(f"📡 Socket bus: {args.subscribers} subscriber processes, {args.rate:.0f} actions/s "
+              f"for {args.seconds}s")
+        print("=" * 72)
+        print(f"{'flush ms':>8} {'delivered':>10} {'messages':>9} {'per msg':>8} {'dropped':>8} "
+              f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+        results['bus'] = []
+        for flush_ms in args.flush_ms:
+            row = run_bus(args, flush_ms)
+            results['bus'].append(row)
+            print(f"{flush_ms:>8g} {row['delivered_pct']:>9}% {row['messages']:>9} "
+                  f"{row['actions_per_message']:>8} {row['dropped']:>8} {row['p50_ms']:>8} "
+                  f"{row['p95_ms']:>8} {row['p99_ms']:>8}")
+
+    if 'server' in args.modes:
+        print(f"\n🖥️  gunicorn: {args.workers} workers, {args.streams} streams, "
+              f"{args.deliveries} pushes at {args.delivery_rate:.0f}/s")
+        print("=" * 72)
+        print(f"{'EVENT_BUS':<10} {'workers':>8} {'seen':>8} {'p50 ms':>8} {'p95 ms':>8} "
+              f"{'p99 ms':>8}")
+        results['server'] = []
+        directory = tempfile.mkdtemp(prefix='bench-bus-', dir='/tmp')
+        try:
+            for backend in ('none', 'socket'):
+                row = run_server(args, backend, directory)
+                results['server'].append(row)
+                print(f"{backend:<10} {row['stream_workers']:>8} {row['delivered_pct']:>7}% "
+                      f"{row['p50_ms']!s:>8} {row['p95_ms']!s:>8} {row['p99_ms']!s:>8}")
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump({'options': vars(args), 'results': results}, output, indent=2)
+        print(f"Results saved to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,400 @@
+#!/usr/bin/env python3
+"""
+Load test: the ingest and read endpoints under a concurrent, mixed workload.
+
+Drives POST /webhook, POST /webhook/receiver (the receiver blueprint) and
+GET /api/actions with realistic GitHub deliveries (see payloads.py) and
+reports p50/p95/p99 latency per endpoint, accepted events/sec and memory.
+By default everything runs in-process through Flask's test client with the
+in-memory storage backend; ``--url`` drives a running server instead.
+
+With ``--rate`` requests follow a fixed schedule and latency is measured
+from each request's scheduled start, so a stalled server shows up as
+latency instead of silently lowering the offered load.
+
+Results are written as JSON; ``--baseline`` compares against an earlier
+result file and exits non-zero on a regression.
+
+    python benchmarks/bench_endpoints.py --requests 20000 --concurrency 16
+    python benchmarks/bench_endpoints.py --rate 500 --baseline benchmarks/results/before.json
+    python benchmarks/bench_endpoints.py --url http://localhost:5000 --receiver-url http://localhost:5001
+"""
+import argparse
+import contextlib
+import http.client
+import io
+import itertools
+import json
+import os
+import platform
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from payloads import EVENT_KINDS, PayloadFactory, parse_mix
+
+TARGETS = {
+    'webhook': ('POST', '/webhook'),
+    'receiver': ('POST', '/webhook/receiver'),
+    'actions': ('GET', '/api/actions'),
+}
+INGEST_TARGETS = ('webhook', 'receiver')
+
+# Throughput drops / latency rises beyond --tolerance count as regressions
+COMPARED = (('requests_per_sec', 'higher'), ('p95_ms', 'lower'), ('p99_ms', 'lower'))
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def rss_mb():
+    """Current resident set size, from /proc where available."""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class InProcessTarget:
+    """Flask test clients for the create_app() app."""
+
+    def __init__(self):
+        from app import create_app, main
+        self.main = main
+        app = create_app()
+        app.testing = True
+        self.apps = {'webhook': app, 'receiver': app, 'actions': app}
+
+    def session(self):
+        clients = {name: app.test_client() for name, app in self.apps.items()}
+
+        def send(target, body=None, headers=None):
+            method, path = TARGETS[target]
+            response = clients[target].open(path, method=method, data=body, headers=headers)
+            response.close()
+            return response.status_code, response.headers
+        return send
+
+    def drain(self):
+        """Wait for both ingest queues to reach storage; returns seconds waited."""
+        from app.webhook import routes
+        started = time.perf_counter()
+        self.main.ingest_queue.flush()
+        routes.ingest_queue.flush()
+        return time.perf_counter() - started
+
+    def stats(self):
+        from app.webhook import routes
+        return {
+            'actions': {'ingest': self.main.ingest_queue.stats(), 'storage': self.main.storage.stats()},
+            'events': {'ingest': routes.ingest_queue.stats(), 'storage': routes.storage.stats()},
+        }
+
+
+class HTTPTarget:
+    """Keep-alive HTTP connections (one per thread) to a running server."""
+
+    def __init__(self, url, receiver_url=None):
+        self.urls = {'webhook': urlsplit(url), 'actions': urlsplit(url),
+                     'receiver': urlsplit(receiver_url or url)}
+
+    def session(self):
+        connections = {}
+
+        def send(target, body=None, headers=None):
+            url = self.urls[target]
+            connection = connections.get(url.netloc)
+            if connection is None:
+                connection = connections[url.netloc] = http.client.HTTPConnection(
+                    url.hostname, url.port or 80, timeout=30)
+            method, path = TARGETS[target]
+            try:
+                connection.request(method, url.path.rstrip('/') + path, body=body,
+                                   headers=headers or {})
+                response = connection.getresponse()
+                response.read()
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                del connections[url.netloc]
+                return 'error', {}
+            return response.status, response.headers
+        return send
+
+    def drain(self):
+        return None
+
+    def stats(self):
+        return None
+
+
+def build_plan(args):
+    """Pre-generate every request so payload building is not timed."""
+    targets, target_weights = parse_mix(args.mix, tuple(TARGETS))
+    kinds, kind_weights = parse_mix(args.events, EVENT_KINDS)
+    chooser = random.Random(args.seed)
+    factory = PayloadFactory(seed=args.seed, size=args.payload_bytes, secret=args.secret,
+                             redelivery=args.redelivery)
+
+    plan = []
+    for _ in range(args.warmup + args.requests):
+        target = chooser.choices(targets, target_weights)[0]
+        if target in INGEST_TARGETS:
+            _, body, headers = factory.delivery(chooser.choices(kinds, kind_weights)[0])
+            plan.append((target, body, headers))
+        else:
+            plan.append((target, None, None))
+    return plan
+
+
+def worker(session, plan, counter, started, rate, warmup, samples, lock, conditional):
+    etag = None
+    recorded = []
+    while True:
+        index = next(counter)
+        if index >= len(plan):
+            break
+        target, body, headers = plan[index]
+
+        scheduled = None
+        if rate:
+            scheduled = started + index / rate
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+        if target == 'actions' and conditional and etag:
+            headers = {'If-None-Match': etag}
+        sent = time.perf_counter()
+        status, response_headers = session(target, body, headers)
+        finished = time.perf_counter()
+        if target == 'actions' and conditional:
+            etag = response_headers.get('ETag') or etag
+
+        if index >= warmup:
+            recorded.append((target, status, finished - (scheduled or sent), finished))
+    with lock:
+        samples.extend(recorded)
+
+
+def summarize(samples, elapsed):
+    targets = {}
+    for name in TARGETS:
+        rows = [row for row in samples if row[0] == name]
+        if not rows:
+            continue
+        latencies = [row[2] for row in rows]
+        targets[name] = {
+            'requests': len(rows),
+            'statuses': dict(Counter(str(row[1]) for row in rows)),
+            'requests_per_sec': round(len(rows) / elapsed, 1),
+            'mean_ms': round(statistics.fmean(latencies) * 1000, 3),
+            'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+            'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+            'max_ms': round(max(latencies) * 1000, 3),
+        }
+    return targets
+
+
+def run(args, target):
+    plan = build_plan(args)
+    counter = itertools.count()
+    samples = []
+    lock = threading.Lock()
+
+    rss_before = rss_mb()
+    if args.trace_memory:
+        tracemalloc.start()
+
+    started = time.perf_counter()
+    threads = [
+        threading.Thread(target=worker, args=(target.session(), plan, counter, started,
+                                              args.rate, args.warmup, samples, lock,
+                                              not args.unconditional), daemon=True)
+        for _ in range(args.concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Measure from the first recorded request, so warm-up doesn't dilute the rates
+    first = min((row[3] - row[2] for row in samples), default=started)
+    last = max((row[3] for row in samples), default=started)
+    elapsed = max(last - first, 1e-9)
+    drain = target.drain()
+
+    accepted = sum(1 for row in samples if row[0] in INGEST_TARGETS and row[1] == 202)
+    result = {
+        'meta': metadata(args),
+        'totals': {
+            'requests': len(samples),
+            'elapsed_s': round(elapsed, 3),
+            'requests_per_sec': round(len(samples) / elapsed, 1),
+            'events_accepted': accepted,
+            'events_per_sec': round(accepted / elapsed, 1),
+            'drain_s': round(drain, 3) if drain is not None else None,
+        },
+        'targets': summarize(samples, elapsed),
+        'memory': {
+            'rss_before_mb': round(rss_before, 1),
+            'rss_after_mb': round(rss_mb(), 1),
+            'max_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        },
+        'server': target.stats(),
+    }
+    if args.trace_memory:
+        result['memory']['traced_peak_mb'] = round(tracemalloc.get_traced_memory()[1] / 1024 / 1024, 1)
+        tracemalloc.stop()
+    return result
+
+
+def metadata(args):
+    try:
+        revision = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                  capture_output=True, text=True, timeout=5).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        revision = ''
+    options = vars(args).copy()
+    options.pop('secret', None)
+    return {
+        'benchmark': 'endpoints',
+        'revision': revision or None,
+        'recorded_at': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'options': options,
+    }
+
+
+def compare(result, baseline, tolerance):
+    """Regressions of ``result`` against ``baseline`` beyond ``tolerance`` (a fraction)."""
+    regressions = []
+    for name, current in result['targets'].items():
+        before = baseline.get('targets', {}).get(name)
+        if not before:
+            continue
+        for metric, better in COMPARED:
+            old, new = before.get(metric), current.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if (better == 'lower' and change > tolerance) or (better == 'higher' and change < -tolerance):
+                regressions.append(f"{name} {metric}: {old} -> {new} ({change:+.1%})")
+    return regressions
+
+
+def print_result(result):
+    print(f"{'endpoint':<10} {'requests':>9} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} "
+          f"{'p99 ms':>9} {'max ms':>9}  statuses")
+    for name, row in result['targets'].items():
+        statuses = ' '.join(f'{status}×{count}' for status, count in sorted(row['statuses'].items()))
+        print(f"{name:<10} {row['requests']:>9} {row['requests_per_sec']:>9.0f} {row['p50_ms']:>9.2f} "
+              f"{row['p95_ms']:>9.2f} {row['p99_ms']:>9.2f} {row['max_ms']:>9.2f}  {statuses}")
+    totals, memory = result['totals'], result['memory']
+    print("=" * 72)
+    print(f"{totals['requests']} requests in {totals['elapsed_s']}s: "
+          f"{totals['requests_per_sec']:.0f} req/s, {totals['events_per_sec']:.0f} events accepted/s")
+    if totals['drain_s'] is not None:
+        print(f"Ingest queues drained {totals['drain_s'] * 1000:.0f} ms after the last request")
+    print(f"RSS {memory['rss_before_mb']} -> {memory['rss_after_mb']} MB "
+          f"(peak {memory['max_rss_mb']} MB)"
+          + (f", traced peak {memory['traced_peak_mb']} MB" if 'traced_peak_mb' in memory else ''))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--requests', type=int, default=10000, help='recorded requests')
+    parser.add_argument('--warmup', type=int, default=500, help='unrecorded requests first')
+    parser.add_argument('--concurrency', type=int, default=8, help='client threads')
+    parser.add_argument('--rate', type=float, default=0,
+                        help='offered load in requests/sec across all threads (0: unthrottled)')
+    parser.add_argument('--mix', default='webhook=4,receiver=4,actions=2',
+                        help='endpoint weights: webhook, receiver, actions')
+    parser.add_argument('--events', default='push=6,pull_request=3,merge=1',
+                        help='delivery weights by kind (see payloads.EVENT_KINDS)')
+    parser.add_argument('--payload-bytes', type=int, default=6144,
+                        help='approximate size of each delivery body')
+    parser.add_argument('--redelivery', type=float, default=0.01,
+                        help='fraction of deliveries that repeat an earlier delivery id')
+    parser.add_argument('--unconditional', action='store_true',
+                        help='poll /api/actions without If-None-Match')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--secret', default=os.getenv('WEBHOOK_SECRET', 'your-webhook-secret-here'),
+                        help='signs deliveries with X-Hub-Signature-256')
+    parser.add_argument('--url', help='drive a running server instead of the in-process apps')
+    parser.add_argument('--receiver-url', help='server for /webhook/receiver (default: --url)')
+    parser.add_argument('--storage', default='memory',
+                        help='STORAGE_BACKEND for the in-process apps (default: memory)')
+    parser.add_argument('--trace-memory', action='store_true',
+                        help='also report the tracemalloc peak (slows requests down)')
+    parser.add_argument('--output', help='result file (default: benchmarks/results/endpoints-<time>.json)')
+    parser.add_argument('--baseline', help='earlier result file to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.15,
+                        help='allowed relative regression against --baseline')
+    args = parser.parse_args()
+
+    if args.url:
+        target = HTTPTarget(args.url, args.receiver_url)
+    else:
+        # Must be set before the app modules read their config
+        os.environ['STORAGE_BACKEND'] = args.storage
+        target = InProcessTarget()
+
+    where = args.url or f'in-process ({args.storage} storage)'
+    pace = f'{args.rate:g} req/s' if args.rate else 'unthrottled'
+    print(f"🚦 Endpoint load test: {args.requests} requests, {args.concurrency} threads, {pace}, {where}")
+    print("=" * 72)
+    # The in-process apps log every delivery; keep that out of the report
+    quiet = contextlib.redirect_stdout(io.StringIO()) if not args.url else contextlib.nullcontext()
+    with quiet:
+        result = run(args, target)
+    print_result(result)
+
+    output = args.output or os.path.join(
+        ROOT, 'benchmarks', 'results',
+        f"endpoints-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as results_file:
+        json.dump(result, results_file, indent=2, default=str)
+    print(f"Results saved to {output}")
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        ignored = ('output', 'baseline', 'tolerance')
+        changed = sorted(name for name, value in result['meta']['options'].items()
+                         if name not in ignored
+                         and baseline.get('meta', {}).get('options', {}).get(name) != value)
+        if changed:
+            print(f"\n⚠️  Options differ from the baseline ({', '.join(changed)}); "
+                  f"the comparison may not be like for like")
+        regressions = compare(result, baseline, args.tolerance)
+        if regressions:
+            print(f"\n❌ {len(regressions)} regression(s) beyond {args.tolerance:.0%} against {args.baseline}:")
+            for line in regressions:
+                print(f"   {line}")
+            sys.exit(1)
+        print(f"\n✅ Within {args.tolerance:.0%} of {args.baseline}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Benchmark: bulk export and summary throughput against paging /api/actions.
+
+Loads ``--events`` generated actions into each backend, then reads all of
+them back three ways: paging with ``find_page`` ``--page-size`` at a time
+(what pulling history through /api/actions amounts to, minus the request
+per page), ``Storage.scan`` + ``Export`` in every format with and without
+compression, and ``summarize`` against the same counts taken one document
+dict at a time. Reports rows/sec,
+output size and the peak memory traced while exporting, which should stay
+near one EXPORT_BATCH_SIZE batch whatever ``--events`` is. The arrow and
+parquet formats are skipped when pyarrow is not installed; MongoDB is
+included when MONGO_URI points at a reachable server (a scratch collection
+is used and dropped afterwards).
+
+    python benchmarks/bench_export.py --events 200000 --backends memory sqlite
+    python benchmarks/bench_export.py --events 100000 --output before.json
+    python benchmarks/bench_export.py --events 100000 --baseline before.json
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.export import BINARY_FORMATS, FORMATS, HAS_PYARROW, Export, Summary, summarize
+from bench_search import make_documents, open_backend
+
+
+def page_through(storage, page_size):
+    """Every page serialized as JSON; the HTTP round trip per page comes on top."""
+    cursor, rows = None, 0
+    while True:
+        documents, cursor = storage.find_page({}, cursor, page_size)
+        json.dumps({'actions': documents, 'next_cursor': cursor}, default=str)
+        rows += len(documents)
+        if cursor is None:
+            return rows
+
+
+def export_once(storage, export, batch_size):
+    size = 0
+    for chunk in export.write(storage.scan({}, export.storage_fields(), batch_size),
+                              storage.action_field):
+        size += len(chunk)
+    return size
+
+
+def export_peak(storage, export, batch_size):
+    """Peak memory allocated while exporting, in MB (a separate, slower run)."""
+    tracemalloc.start()
+    try:
+        export_once(storage, export, batch_size)
+        return round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 1)
+    finally:
+        tracemalloc.stop()
+
+
+def summarize_by_document(storage, batch_size):
+    """The same counts as Summary, updated one document at a time."""
+    actions, authors, histogram = Counter(), Counter(), Counter()
+    for batch in storage.scan({}, Summary.FIELDS, batch_size):
+        for document in batch:
+            actions[document.get(storage.action_field)] += 1
+            authors[document.get('author')] += 1
+            histogram[(document.get('to_branch'), document['created_at'].date())] += 1
+    return actions, authors, histogram
+
+
+def timed(function, *args):
+    started = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - started
+
+
+def run(storage, documents, args):
+    storage.ensure_indexes()
+    for start in range(0, len(documents), 1000):
+        storage.insert_many(documents[start:start + 1000])
+    count = len(documents)
+    rows = {}
+
+    paged, seconds = timed(page_through, storage, args.page_size)
+    rows[f'paged ({args.page_size})'] = {'rows_per_sec': round(paged / seconds), 'mb': None,
+                                         'peak_mb': None}
+
+    for format in args.formats:
+        if format in BINARY_FORMATS and not HAS_PYARROW:
+            continue
+        for compress in (False, True):
+            export = Export(format, compress=compress)
+            size, seconds = timed(export_once, storage, export, args.batch_size)
+            rows[f'{format}{" +compress" if compress else ""}'] = {
+                'rows_per_sec': round(count / seconds),
+                'mb': round(size / 2 ** 20, 1),
+                'peak_mb': export_peak(storage, export, args.batch_size) if args.memory else None,
+            }
+
+    _, seconds = timed(summarize_by_document, storage, args.batch_size)
+    rows['summary (per document)'] = {'rows_per_sec': round(count / seconds), 'mb': None,
+                                      'peak_mb': None}
+    _, seconds = timed(summarize, storage, {}, Summary(), args.batch_size)
+    rows['summary (columns)'] = {'rows_per_sec': round(count / seconds), 'mb': None,
+                                 'peak_mb': None}
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--events', type=int, default=100000)
+    parser.add_argument('--batch-size', type=int, default=5000, help='EXPORT_BATCH_SIZE')
+    parser.add_argument('--page-size', type=int, default=50, help='find_page limit to compare')
+    parser.add_argument('--formats', nargs='+', choices=list(FORMATS), default=list(FORMATS))
+    parser.add_argument('--backends', nargs='+', default=['memory', 'sqlite', 'mongo'])
+    parser.add_argument('--no-memory', dest='memory', action='store_false',
+                        help='skip the traced peak-memory runs')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='write the results as JSON')
+    parser.add_argument('--baseline', help='earlier --output file to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed relative drop of rows/sec against --baseline')
+    args = parser.parse_args()
+
+    print(f"📦 Export benchmark: {args.events:,} events, batches of {args.batch_size}")
+    if not HAS_PYARROW:
+        print("(pyarrow is not installed, skipping arrow and parquet)")
+    print("=" * 72)
+    documents = make_documents(args.events, args.seed)
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for name in args.backends:
+            try:
+                storage = open_backend(name, workdir, args.events)
+            except Exception as e:
+                print(f"\n{name}: skipped ({e})")
+                continue
+
+            result = run(storage, [dict(document) for document in documents], args)
+            results[name] = result
+            print(f"\n{name}")
+            print(f"   {'read':<24} {'rows/sec':>10} {'MB':>8} {'peak MB':>8}")
+            for read, row in result.items():
+                print(f"   {read:<24} {row['rows_per_sec']:>10,} {row['mb']!s:>8} "
+                      f"{row['peak_mb']!s:>8}")
+
+            if name == 'mongo':
+                storage.collection.drop()
+            storage.close()
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump({'options': vars(args), 'results': results}, output, indent=2)
+        print(f"Results saved to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)['results']
+        failures = []
+        for name, result in results.items():
+            for read, row in result.items():
+                before = baseline.get(name, {}).get(read)
+                if before and row['rows_per_sec'] < before['rows_per_sec'] * (1 - args.tolerance):
+                    failures.append(f"{name} {read}: {before['rows_per_sec']:,} -> "
+                                    f"{row['rows_per_sec']:,} rows/sec")
+        if failures:
+            print("\n❌ Export throughput regressions:")
+            for line in failures:
+                print(f"   {line}")
+            sys.exit(1)
+        print(f"\n✅ Within {args.tolerance:.0%} of {args.baseline}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Benchmark: extracting an action from large push deliveries.
+
+Compares CPU time and peak traced memory of the old path (decode the whole
+body with json.loads, as request.get_json() did, then read three fields)
+with app.events.extract_event using each WEBHOOK_DECODER: stdlib, the
+pruning stdlib decoder and, when installed, orjson (what ``auto`` picks).
+
+    python benchmarks/bench_extraction.py --commits 1000 5000 --repeat 20
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.events import extract_event, normalize_push, orjson
+from payloads import PayloadFactory
+
+
+def full_decode(body):
+    return normalize_push(json.loads(body))
+
+
+PATHS = [
+    ('json.loads (full document)', full_decode),
+    ('stdlib', lambda body: extract_event('push', body, decoder='stdlib')),
+    ('pruning', lambda body: extract_event('push', body, decoder='pruning')),
+]
+if orjson is not None:
+    PATHS.append(('orjson', lambda body: extract_event('push', body, decoder='orjson')))
+
+
+def measure(func, body, repeat):
+    func(body)  # warm up
+    started = time.process_time()
+    for _ in range(repeat):
+        func(body)
+    cpu = (time.process_time() - started) / repeat
+
+    tracemalloc.start()
+    func(body)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return cpu, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--commits', type=int, nargs='+', default=[1000, 5000])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    if orjson is None:
+        print("(orjson is not installed, skipping it)")
+    factory = PayloadFactory(seed=1, size=0)
+    for commits in args.commits:
+        body = json.dumps(factory.push(commits), separators=(',', ':')).encode('utf-8')
+        print(f"\n📦 push with {commits} commits ({len(body) / 1024 / 1024:.1f} MB)")
+        print("=" * 72)
+        print(f"{'path':<30} {'CPU ms':>10} {'peak MB':>10} {'vs full':>10}")
+
+        baseline = None
+        for label, func in PATHS:
+            cpu, peak = measure(func, body, args.repeat)
+            baseline = baseline or (cpu, peak)
+            print(f"{label:<30} {cpu * 1000:>10.2f} {peak / 1024 / 1024:>10.2f} "
+                  f"{cpu / baseline[0]:>9.2f}x")
+
+
+if __name__ == '__main__':
+    main()
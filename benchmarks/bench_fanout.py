@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Benchmark: outbound fan-out against local stand-in receivers.
+
+Starts one keep-alive HTTP server per target on 127.0.0.1, each with its
+own response latency and failure rate, then publishes formatted actions
+through a Dispatcher exactly as the ingest writer does. Reports publish
+cost (what the writer pays), delivery throughput, latency/lag percentiles,
+retries and dead letters per target, and checks that every action reached
+its receiver exactly once or the dead-letter store.
+
+    python benchmarks/bench_fanout.py --actions 5000
+    python benchmarks/bench_fanout.py --targets fast:0:0,slow:50:0,flaky:5:0.2 --concurrency 8
+    python benchmarks/bench_fanout.py --output fanout.json
+"""
+import argparse
+import hashlib
+import hmac
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.fanout import DeadLetterStore, Dispatcher, Subscription
+
+SECRET = 'bench-forward-secret'
+
+
+class StandIn(ThreadingHTTPServer):
+    """A receiver that sleeps ``latency`` seconds and answers 503 with probability ``failure``."""
+
+    daemon_threads = True
+
+    def __init__(self, latency, failure, seed):
+        super().__init__(('127.0.0.1', 0), StandInHandler)
+        self.latency = latency
+        self.failure = failure
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.received = {}
+        self.bad_signatures = 0
+        self.connections = 0
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}/hook'
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        server = self.server
+        if server.latency:
+            time.sleep(server.latency)
+        with server.lock:
+            fail = server.random.random() < server.failure
+        if fail:
+            self._answer(503)
+            return
+
+        expected = 'sha256=' + hmac.new(SECRET.encode(), body, hashlib.sha256).hexdigest()
+        with server.lock:
+            if not hmac.compare_digest(expected, self.headers.get('X-Forward-Signature-256', '')):
+                server.bad_signatures += 1
+            forward_id = self.headers['X-Forward-Id']
+            server.received[forward_id] = server.received.get(forward_id, 0) + 1
+        self._answer(204)
+
+    def _answer(self, status):
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def parse_targets(spec):
+    """``name:latency_ms:failure_rate,...`` into (name, latency seconds, failure rate) tuples."""
+    targets = []
+    for part in spec.split(','):
+        name, latency, failure = part.split(':')
+        targets.append((name, float(latency) / 1000, float(failure)))
+    return targets
+
+
+def action(number):
+    return {
+        'id': f'bench-{number:08d}',
+        'action': random.choice(('push', 'pull_request', 'merge')),
+        'author': f'dev{number % 200:03d}',
+        'to_branch': 'main',
+        'repository': 'acme/api',
+        'timestamp': '2024-01-01T00:00:00',
+        'display_text': 'bench',
+    }
+
+
+def run(args):
+    servers = {}
+    for number, (name, latency, failure) in enumerate(parse_targets(args.targets)):
+        server = StandIn(latency, failure, args.seed + number)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers[name] = server
+
+    dead_letter_dir = tempfile.mkdtemp(prefix='fanout-dead-letters-')
+    subscriptions = [Subscription(name, server.url, SECRET, concurrency=args.concurrency,
+                                  timeout=5, max_attempts=args.max_attempts)
+                     for name, server in servers.items()]
+    dispatcher = Dispatcher(subscriptions, DeadLetterStore(dead_letter_dir),
+                            queue_size=args.queue_size, retry_seconds=args.retry_seconds,
+                            retry_max_seconds=args.retry_seconds * 8, shutdown_timeout=5)
+
+    actions = [action(number) for number in range(args.actions)]
+    started = time.perf_counter()
+    publish_seconds = 0.0
+    for start in range(0, len(actions), args.batch):
+        batch_started = time.perf_counter()
+        dispatcher.publish(actions[start:start + args.batch])
+        publish_seconds += time.perf_counter() - batch_started
+
+    # Wait until every target has delivered or dead-lettered everything
+    finished = {}
+    deadline = time.monotonic() + args.timeout
+    while len(finished) < len(servers) and time.monotonic() < deadline:
+        for name, row in dispatcher.stats().items():
+            if name not in finished and (
+                    row['delivered'] + row['dead_lettered'] + row['dropped'] >= args.actions):
+                finished[name] = time.perf_counter() - started
+        time.sleep(0.01)
+    elapsed = time.perf_counter() - started
+    stats = dispatcher.stats()
+    dispatcher.close()
+
+    results = {}
+    for name, server in servers.items():
+        row = stats[name]
+        dead = DeadLetterStore(dead_letter_dir).count(name)
+        duplicates = sum(count - 1 for count in server.received.values() if count > 1)
+        missing = args.actions - len(server.received) - dead
+        results[name] = {
+            'latency_ms': server.latency * 1000,
+            'failure_rate': server.failure,
+            'delivered': row['delivered'],
+            'per_sec': round(row['delivered'] / finished.get(name, elapsed), 1),
+            'retries': row['retries'],
+            'dead_lettered': dead,
+            'duplicates': duplicates,
+            'missing': missing,
+            'connections': server.connections,
+            'bad_signatures': server.bad_signatures,
+            'delivery_ms': row['latency_ms'],
+            'lag_ms': row['lag_ms'],
+        }
+        server.shutdown()
+    shutil.rmtree(dead_letter_dir, ignore_errors=True)
+    return {
+        'elapsed_seconds': round(elapsed, 3),
+        'publish_us_per_action': round(publish_seconds / args.actions * 1e6, 2),
+        'targets': results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--actions', type=int, default=2000)
+    parser.add_argument('--batch', type=int, default=100, help='actions per publish call')
+    parser.add_argument('--targets', default='fast:0:0,slow:20:0,flaky:2:0.2',
+                        help='name:latency_ms:failure_rate, comma-separated')
+    parser.add_argument('--concurrency', type=int, default=4, help='sender threads per target')
+    parser.add_argument('--max-attempts', type=int, default=6)
+    parser.add_argument('--retry-seconds', type=float, default=0.01)
+    parser.add_argument('--queue-size', type=int, default=100000)
+    parser.add_argument('--timeout', type=float, default=120, help='give up waiting after this')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='write the results as JSON')
+    args = parser.parse_args()
+
+    print(f"📤 Fan-out: {args.actions} actions to {args.targets} "
+          f"({args.concurrency} senders per target)")
+    print("=" * 72)
+    report = run(args)
+    print(f"publish cost: {report['publish_us_per_action']} µs/action, "
+          f"elapsed {report['elapsed_seconds']} s")
+    print(f"{'target':<10} {'delivered':>9} {'/s':>8} {'retries':>8} {'dead':>6} {'dup':>5} "
+          f"{'miss':>5} {'conns':>6} {'p50 ms':>8} {'p99 ms':>8}")
+    failed = False
+    for name, row in report['targets'].items():
+        delivery = row['delivery_ms'] or {}
+        print(f"{name:<10} {row['delivered']:>9} {row['per_sec'] or 0:>8} {row['retries']:>8} "
+              f"{row['dead_lettered']:>6} {row['duplicates']:>5} {row['missing']:>5} "
+              f"{row['connections']:>6} {delivery.get('p50', '-'):>8} {delivery.get('p99', '-'):>8}")
+        failed = failed or row['missing'] or row['bad_signatures']
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump({'options': vars(args), 'results': report}, output, indent=2)
+        print(f"Results saved to {args.output}")
+
+    if failed:
+        print("\n❌ Some actions neither reached their receiver nor the dead-letter store")
+        sys.exit(1)
+    print("\n✅ Every action was delivered or dead-lettered")
+
+
+if __name__ == '__main__':
+    main()
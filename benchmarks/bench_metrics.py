@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Benchmark: cost of the /metrics instrumentation.
+
+Measures, per call, a counter increment, a histogram observation and a
+timed block with metrics enabled and disabled against an empty loop; then
+the same signed push delivery through the in-process /webhook handler
+(memory storage) with the registry switched on and off, which is what the
+ingest path pays per request; then rendering /metrics when it merges the
+snapshot files of ``--workers`` other live processes.
+
+    python benchmarks/bench_metrics.py
+    python benchmarks/bench_metrics.py --requests 5000 --workers 4 8 16
+    python benchmarks/bench_metrics.py --output before.json
+    python benchmarks/bench_metrics.py --baseline before.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+SECRET = 'bench-metrics-secret'
+
+
+def per_call_ns(func, count, rounds):
+    """Best-of-``rounds`` nanoseconds per ``func()`` call."""
+    best = float('inf')
+    for _ in range(rounds):
+        started = time.perf_counter()
+        for _ in range(count):
+            func()
+        best = min(best, time.perf_counter() - started)
+    return round(best / count * 1e9, 1)
+
+
+def primitives(count, rounds):
+    from app.metrics import Registry
+
+    results = {}
+    results['empty_call'] = per_call_ns(lambda: None, count, rounds)
+    for enabled in (True, False):
+        registry = Registry(enabled=enabled, directory='')
+        counter = registry.counter('bench_total', 'bench', ('outcome',))
+        histogram = registry.histogram('bench_seconds', 'bench', ('stage',))
+
+        def timed():
+            with histogram.time('parse'):
+                pass
+
+        state = 'enabled' if enabled else 'disabled'
+        results[f'counter_{state}'] = per_call_ns(lambda: counter.inc('accepted'), count, rounds)
+        results[f'observe_{state}'] = per_call_ns(lambda: histogram.observe(0.003, 'parse'),
+                                                  count, rounds)
+        results[f'timer_{state}'] = per_call_ns(timed, count, rounds)
+    return results
+
+
+def requests(count, rounds):
+    """Microseconds per /webhook delivery with metrics on and off, interleaved."""
+    from payloads import PayloadFactory
+
+    from app import create_app, metrics
+    from app.main import ingest_queue
+
+    client = create_app().test_client()
+    factory = PayloadFactory(seed=1, size=4096, secret=SECRET)
+    deliveries = [factory.delivery('push') for _ in range(count)]
+
+    def one_round():
+        started = time.perf_counter()
+        for _, body, headers in deliveries:
+            # A fresh delivery id each time, so no request is answered as a duplicate
+            headers = dict(headers, **{'X-GitHub-Delivery': os.urandom(8).hex()})
+            client.post('/webhook', data=body, headers=headers)
+        ingest_queue.flush()
+        return (time.perf_counter() - started) / count * 1e6
+
+    best = {True: float('inf'), False: float('inf')}
+    with contextlib.redirect_stdout(io.StringIO()):
+        one_round()  # warm up
+        for _ in range(rounds):
+            for enabled in (False, True):
+                metrics.registry.enabled = enabled
+                best[enabled] = min(best[enabled], one_round())
+    metrics.registry.enabled = True
+    return {
+        'request_us_disabled': round(best[False], 2),
+        'request_us_enabled': round(best[True], 2),
+        'overhead_us': round(best[True] - best[False], 2),
+        'overhead_pct': round((best[True] - best[False]) / best[False] * 100, 2),
+    }
+
+
+def render(workers, rounds):
+    """Milliseconds to render /metrics with ``workers`` other processes' snapshots."""
+    from app import metrics
+
+    registry = metrics.registry
+    own = registry._snapshot()
+    results = {}
+    for count in workers:
+        # Live processes, so their snapshots are merged rather than folded away
+        sleepers = [subprocess.Popen(['sleep', '60']) for _ in range(count)]
+        try:
+            for sleeper in sleepers:
+                metrics._write(registry._path(sleeper.pid), own)
+            best = float('inf')
+            for _ in range(rounds):
+                started = time.perf_counter()
+                body = registry.render()
+                best = min(best, time.perf_counter() - started)
+            results[count] = {'render_ms': round(best * 1000, 3), 'bytes': len(body)}
+        finally:
+            for sleeper in sleepers:
+                sleeper.kill()
+                sleeper.wait()
+                os.remove(registry._path(sleeper.pid))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--calls', type=int, default=200000, help='calls per primitive round')
+    parser.add_argument('--requests', type=int, default=2000, help='deliveries per request round')
+    parser.add_argument('--workers', type=int, nargs='+', default=[4, 16])
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--output', help='write the results as JSON')
+    parser.add_argument('--baseline', help='earlier --output file to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed relative growth of enabled per-call costs against --baseline')
+    args = parser.parse_args()
+
+    # Must be set before the app modules read their config
+    directory = tempfile.mkdtemp(prefix='bench-metrics-')
+    os.environ.update({
+        'STORAGE_BACKEND': 'memory',
+        'WEBHOOK_SECRETS': SECRET,
+        'METRICS_DIR': os.path.join(directory, 'metrics'),
+        'SPOOL_DIR': os.path.join(directory, 'spool'),
+        'SUBSCRIPTIONS_FILE': '',
+    })
+
+    print(f"📈 Metrics overhead: {args.calls:,} calls, {args.requests:,} deliveries, "
+          f"best of {args.rounds}")
+    print("=" * 72)
+    try:
+        calls = primitives(args.calls, args.rounds)
+        print(f"{'per call':<20} {'enabled ns':>12} {'disabled ns':>12}")
+        print(f"{'empty call':<20} {calls['empty_call']:>12} {calls['empty_call']:>12}")
+        for name in ('counter', 'observe', 'timer'):
+            print(f"{name:<20} {calls[f'{name}_enabled']:>12} {calls[f'{name}_disabled']:>12}")
+
+        request = requests(args.requests, args.rounds)
+        print(f"\n/webhook delivery: {request['request_us_disabled']} µs disabled, "
+              f"{request['request_us_enabled']} µs enabled "
+              f"(+{request['overhead_us']} µs, {request['overhead_pct']}%)")
+
+        rendering = render(args.workers, args.rounds)
+        for count, row in rendering.items():
+            print(f"/metrics with {count} other workers: {row['render_ms']} ms, {row['bytes']:,} bytes")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    results = {'calls': calls, 'request': request, 'render': rendering}
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump({'options': vars(args), 'results': results}, output, indent=2)
+        print(f"Results saved to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)['results']['calls']
+        regressions = []
+        for name in ('counter_enabled', 'observe_enabled', 'timer_enabled'):
+            before = baseline.get(name)
+            if before and calls[name] > before * (1 + args.tolerance):
+                regressions.append(f"{name}: {before} -> {calls[name]} ns")
+        if regressions:
+            print(f"\n❌ Slower than {args.baseline} by more than {args.tolerance:.0%}:")
+            for line in regressions:
+                print(f"   {line}")
+            sys.exit(1)
+        print(f"\n✅ Within {args.tolerance:.0%} of {args.baseline}")
+
+
+if __name__ == '__main__':
+    main()
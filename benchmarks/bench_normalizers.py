@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Benchmark: per-event-type throughput of the normalizer dispatch table.
+
+For every event kind the payload generator knows, measures
+extract_event (pruning decode + dispatch + normalize) on generated
+deliveries, and the normalizer alone on an already decoded payload. Run it
+before and after adding an event type: the push and pull_request rows are
+the hot path and should not move.
+
+    python benchmarks/bench_normalizers.py --payload-bytes 6144 --count 2000
+    python benchmarks/bench_normalizers.py --output before.json
+    python benchmarks/bench_normalizers.py --baseline before.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.events import NORMALIZERS, decode, extract_event, find_normalizer
+from payloads import EVENT_KINDS, PayloadFactory
+
+
+def rate(func, items, rounds):
+    """Best-of-``rounds`` calls per second of ``func`` over ``items``."""
+    best = float('inf')
+    for _ in range(rounds):
+        started = time.perf_counter()
+        for item in items:
+            func(*item)
+        best = min(best, time.perf_counter() - started)
+    return len(items) / best if best else float('inf')
+
+
+def run(payload_bytes, count, rounds, seed):
+    factory = PayloadFactory(seed=seed, size=payload_bytes)
+    results = {}
+    for kind in EVENT_KINDS:
+        deliveries = [factory.delivery(kind) for _ in range(count)]
+        event = deliveries[0][0]
+        bodies = [(event, body) for _, body, _ in deliveries]
+
+        decoded = [decode(body, event) for _, body in bodies]
+        normalizer = find_normalizer(event, decoded[0].get('action'))
+        assert extract_event(event, bodies[0][1]) is not None, kind
+
+        results[kind] = {
+            'event': event,
+            'normalizer': normalizer.__name__,
+            'extract_per_sec': round(rate(extract_event, bodies, rounds)),
+            'normalize_per_sec': round(rate(normalizer, [(payload,) for payload in decoded], rounds)),
+            'dispatch_per_sec': round(rate(find_normalizer,
+                                           [(event, payload.get('action')) for payload in decoded],
+                                           rounds)),
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--payload-bytes', type=int, default=6144)
+    parser.add_argument('--count', type=int, default=2000, help='deliveries per event kind')
+    parser.add_argument('--rounds', type=int, default=5, help='best of this many passes')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='write the results as JSON')
+    parser.add_argument('--baseline', help='earlier --output file to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.15,
+                        help='allowed relative drop in extract_per_sec against --baseline')
+    args = parser.parse_args()
+
+    print(f"🧭 Normalizers: {len(NORMALIZERS)} dispatch entries, "
+          f"{args.count} × ~{args.payload_bytes} B deliveries per kind")
+    print("=" * 72)
+    print(f"{'kind':<22} {'extract/s':>12} {'normalize/s':>12} {'dispatch/s':>12}")
+    results = run(args.payload_bytes, args.count, args.rounds, args.seed)
+    for kind, row in results.items():
+        print(f"{kind:<22} {row['extract_per_sec']:>12,} {row['normalize_per_sec']:>12,} "
+              f"{row['dispatch_per_sec']:>12,}")
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump({'options': vars(args), 'results': results}, output, indent=2)
+        print(f"Results saved to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)['results']
+        regressions = []
+        for kind, row in results.items():
+            before = baseline.get(kind, {}).get('extract_per_sec')
+            if before and row['extract_per_sec'] < before * (1 - args.tolerance):
+                regressions.append(f"{kind}: {before:,} -> {row['extract_per_sec']:,} extract/s")
+        if regressions:
+            print(f"\n❌ Slower than {args.baseline} by more than {args.tolerance:.0%}:")
+            for line in regressions:
+                print(f"   {line}")
+            sys.exit(1)
+        print(f"\n✅ Within {args.tolerance:.0%} of {args.baseline}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Benchmark: a push storm against a slow database, with and without admission control.
+
+Simulates one gthread worker (``--threads`` request threads) in-process:
+deliveries to /webhook arrive at ``--ingest-rate`` per second and dashboard
+reads of /api/actions (the feed, plus ``--paged-share`` paged queries) at
+``--read-rate``, on a fixed schedule that does not slow down when the
+worker does. Latency is measured from each request's scheduled arrival, so
+time spent waiting for a free thread counts.
+
+The memory backend is slowed into a stand-in for an overloaded database:
+every call holds one of ``--db-connections`` slots for ``--read-ms``
+(reads) or ``--write-ms`` plus ``--write-ms-per-doc`` per document
+(the writer's batches). The storm is sized to exceed what that database can
+write, so the ingest queue (``--queue-size``) fills up.
+
+Both runs use a fresh interpreter, first with ADMISSION_ENABLED=false (the
+behaviour before admission control: deliveries block on the full queue and
+reads queue up behind them), then with it on. The report shows per route
+the status counts and the p50/p99/max latency, plus deliveries accepted per
+second and how many feed reads were answered from the stale cache.
+
+    python benchmarks/bench_overload.py
+    python benchmarks/bench_overload.py --seconds 20 --ingest-rate 1500 --read-rate 100
+    python benchmarks/bench_overload.py --output overload.json
+    python benchmarks/bench_overload.py --baseline overload.json
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+SECRET = 'bench-overload-secret'
+MODES = {'before': 'false', 'admission': 'true'}
+PAGED_QUERY = '/api/actions?action=push&limit=20'
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+class SlowDatabase:
+    """Limited connections and fixed service times, patched over MemoryStorage."""
+
+    def __init__(self, connections, read_ms, write_ms, write_ms_per_doc):
+        self.slots = threading.BoundedSemaphore(connections)
+        self.read_seconds = read_ms / 1000
+        self.write_seconds = write_ms / 1000
+        self.write_seconds_per_doc = write_ms_per_doc / 1000
+
+    def read(self, func):
+        def slowed(storage, *args, **kwargs):
+            with self.slots:
+                time.sleep(self.read_seconds)
+                return func(storage, *args, **kwargs)
+        return slowed
+
+    def write(self, func):
+        def slowed(storage, documents):
+            with self.slots:
+                time.sleep(self.write_seconds + self.write_seconds_per_doc * len(documents))
+                return func(storage, documents)
+        return slowed
+
+    def install(self):
+        # Before the app is imported, so the spool and feed cache pick up the slowed methods
+        from app.storage import MemoryStorage
+        MemoryStorage.insert_many = self.write(MemoryStorage.insert_many)
+        MemoryStorage.latest = self.read(MemoryStorage.latest)
+        MemoryStorage.find_page = self.read(MemoryStorage.find_page)
+
+
+def schedule(args):
+    """(arrival offset, route) for every request of the storm, in arrival order."""
+    chooser = random.Random(args.seed)
+    arrivals = []
+    for route, rate in (('webhook', args.ingest_rate), ('actions', args.read_rate)):
+        for index in range(int(rate * args.seconds)):
+            paged = route == 'actions' and chooser.random() < args.paged_share
+            arrivals.append((index / rate, 'paged' if paged else route))
+    return sorted(arrivals)
+
+
+def child(args):
+    """One run in this interpreter; prints its result as JSON."""
+    SlowDatabase(args.db_connections, args.read_ms, args.write_ms, args.write_ms_per_doc).install()
+
+    from payloads import PayloadFactory
+    from app import create_app, main
+
+    app = create_app(warm_up='off')
+    app.testing = True
+    factory = PayloadFactory(seed=args.seed, size=args.payload_bytes, secret=SECRET)
+    arrivals = schedule(args)
+    deliveries = [factory.delivery('push') for _, route in arrivals if route == 'webhook']
+    clients = threading.local()
+
+    # Fill the feed cache once, like a dashboard that was open before the storm
+    app.test_client().get('/api/actions')
+
+    samples = []
+    lock = threading.Lock()
+
+    def request(scheduled, route, delivery):
+        client = getattr(clients, 'client', None)
+        if client is None:
+            client = clients.client = app.test_client()
+        if route == 'webhook':
+            _, body, headers = delivery
+            response = client.post('/webhook', data=body, headers=headers)
+        else:
+            response = client.get(PAGED_QUERY if route == 'paged' else '/api/actions')
+        response.close()
+        finished = time.perf_counter()
+        with lock:
+            samples.append((route, response.status_code, finished - scheduled))
+
+    deliveries = iter(deliveries)
+    with ThreadPoolExecutor(args.threads) as pool:
+        started = time.perf_counter()
+        for offset, route in arrivals:
+            scheduled = started + offset
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(request, scheduled, route, next(deliveries) if route == 'webhook' else None)
+    elapsed = time.perf_counter() - started
+
+    routes = {}
+    for route in ('webhook', 'actions', 'paged'):
+        rows = [row for row in samples if row[0] == route]
+        if not rows:
+            continue
+        latencies = [row[2] for row in rows]
+        routes[route] = {
+            'requests': len(rows),
+            'statuses': dict(Counter(str(row[1]) for row in rows)),
+            'p50_ms': round(percentile(latencies, 50) * 1000, 1),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 1),
+            'max_ms': round(max(latencies) * 1000, 1),
+            'mean_ms': round(statistics.fmean(latencies) * 1000, 1),
+        }
+    accepted = routes['webhook']['statuses'].get('202', 0)
+    print(json.dumps({
+        'routes': routes,
+        'accepted_per_sec': round(accepted / elapsed, 1),
+        'stale_feed_reads': main.feed_cache.stats()['stale'],
+        'queue_high_watermark': main.ingest_queue.stats()['high_watermark'],
+    }))
+    # The backlog is not drained: the point is the storm itself
+    os._exit(0)
+
+
+def run(mode, args, workdir):
+    env = dict(os.environ,
+               ADMISSION_ENABLED=MODES[mode],
+               STORAGE_BACKEND='memory',
+               INGEST_QUEUE_SIZE=str(args.queue_size),
+               WEBHOOK_SECRETS=SECRET,
+               SPOOL_DIR=os.path.join(workdir, mode, 'spool'),
+               METRICS_DIR=os.path.join(workdir, mode, 'metrics'),
+               METRICS_ENABLED='false',
+               SUBSCRIPTIONS_FILE='',
+               EVENT_BUS='none')
+    command = [sys.executable, os.path.abspath(__file__), '--child'] + sys.argv[1:]
+    result = subprocess.run(command, env=env, capture_output=True, text=True, cwd=workdir)
+    if result.returncode != 0:
+        raise RuntimeError(f"{mode} run failed:\n{result.stderr[-2000:]}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def print_result(mode, result):
+    print(f"\n{mode}: {result['accepted_per_sec']:.0f} deliveries accepted/s, "
+          f"{result['stale_feed_reads']} stale feed reads, "
+          f"queue high watermark {result['queue_high_watermark']}")
+    print(f"   {'route':<9} {'requests':>8} {'p50 ms':>9} {'p99 ms':>9} {'max ms':>9}  statuses")
+    for route, row in result['routes'].items():
+        statuses = ' '.join(f'{status}×{count}' for status, count in sorted(row['statuses'].items()))
+        print(f"   {route:<9} {row['requests']:>8} {row['p50_ms']:>9.1f} {row['p99_ms']:>9.1f} "
+              f"{row['max_ms']:>9.1f}  {statuses}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--seconds', type=float, default=10, help='length of the storm')
+    parser.add_argument('--ingest-rate', type=float, default=1000, help='deliveries per second')
+    parser.add_argument('--read-rate', type=float, default=50, help='dashboard reads per second')
+    parser.add_argument('--paged-share', type=float, default=0.2,
+                        help='fraction of reads that are paged queries')
+    parser.add_argument('--threads', type=int, default=32, help='WEB_THREADS of the worker')
+    parser.add_argument('--queue-size', type=int, default=2000, help='INGEST_QUEUE_SIZE')
+    parser.add_argument('--db-connections', type=int, default=4)
+    parser.add_argument('--read-ms', type=float, default=20)
+    parser.add_argument('--write-ms', type=float, default=20)
+    parser.add_argument('--write-ms-per-doc', type=float, default=1.5)
+    parser.add_argument('--payload-bytes', type=int, default=2048)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--output', help='write the results as JSON')
+    parser.add_argument('--baseline', help='earlier --output file to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed relative growth of the admission p99s against --baseline')
+    args = parser.parse_args()
+    if args.child:
+        return child(args)
+
+    print(f"🌩  Overload benchmark: {args.ingest_rate:.0f} deliveries/s and "
+          f"{args.read_rate:.0f} reads/s for {args.seconds:.0f}s on {args.threads} threads, "
+          f"{args.db_connections} database connections")
+    print("=" * 72)
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for mode in MODES:
+            results[mode] = run(mode, args, workdir)
+            print_result(mode, results[mode])
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump({'options': vars(args), 'results': results}, output, indent=2)
+        print(f"Results saved to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)['results']['admission']['routes']
+        failures = [f"{route} p99: {baseline[route]['p99_ms']} -> {row['p99_ms']} ms"
+                    for route, row in results['admission']['routes'].items()
+                    if route in baseline
+                    and row['p99_ms'] > baseline[route]['p99_ms'] * (1 + args.tolerance)]
+        if failures:
+            print("\n❌ Tail latency regressions under overload:")
+            for line in failures:
+                print(f"   {line}")
+            sys.exit(1)
+        print(f"\n✅ Within {args.tolerance:.0%} of {args.baseline}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Benchmark: read-path CPU per action before and after the canonical schema,
+and the batch migration's throughput.
+
+``view`` is timed on ``--actions`` documents stored the old way (version 1,
+so every read parses the timestamp, formats it and builds display_text, as
+the dashboard used to on every poll) and on the same actions stored in the
+current schema (a projection of stored fields). Then ``--migrate`` old
+documents are loaded into each backend and rewritten with ``migrate``.
+
+    python benchmarks/bench_schema.py
+    python benchmarks/bench_schema.py --actions 50 --polls 20000 --migrate 200000
+    python benchmarks/bench_schema.py --output before.json
+    python benchmarks/bench_schema.py --baseline before.json
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bson import ObjectId
+
+from app.schema import migrate, upgrade, view
+from app.storage import MemoryStorage, SQLiteStorage
+
+ACTIONS = ['push', 'pull_request', 'merge', 'review', 'release']
+
+
+def legacy_documents(count):
+    """Version 1 documents, as /webhook stored them before display fields were precomputed."""
+    started = datetime(2024, 1, 1)
+    return [{
+        '_id': ObjectId(),
+        'id': str(ObjectId()),
+        'author': f'dev{i % 50}',
+        'action': ACTIONS[i % len(ACTIONS)],
+        'from_branch': f'feature/{i % 97}',
+        'to_branch': 'main',
+        'repository': f'org/repo{i % 20}',
+        'tenant': 'default',
+        'state': 'approved' if i % 5 == 3 else None,
+        'name': f'v1.{i}' if i % 5 == 4 else None,
+        'timestamp': (started + timedelta(seconds=i)).isoformat() + 'Z',
+        'request_id': str(ObjectId()),
+        'created_at': started + timedelta(seconds=i),
+    } for i in range(count)]
+
+
+def time_views(documents, polls):
+    started = time.perf_counter()
+    for _ in range(polls):
+        [view(document) for document in documents]
+    return (time.perf_counter() - started) / (polls * len(documents)) * 1e6
+
+
+def time_migration(storage, documents, batch_size):
+    storage.ensure_indexes()
+    for start in range(0, len(documents), 1000):
+        storage.insert_many(documents[start:start + 1000])
+    started = time.perf_counter()
+    scanned, migrated = migrate(storage, batch_size)
+    seconds = time.perf_counter() - started
+    assert migrated == len(documents), (scanned, migrated)
+    return round(migrated / seconds)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--actions', type=int, default=50, help='actions per poll (FEED_CACHE_SIZE)')
+    parser.add_argument('--polls', type=int, default=5000)
+    parser.add_argument('--migrate', type=int, default=100000, help='documents to migrate')
+    parser.add_argument('--batch-size', type=int, default=5000, help='EXPORT_BATCH_SIZE')
+    parser.add_argument('--backends', nargs='+', default=['memory', 'sqlite'])
+    parser.add_argument('--output', help='write the results as JSON')
+    parser.add_argument('--baseline', help='earlier --output file to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed relative growth of µs per action against --baseline')
+    args = parser.parse_args()
+
+    print(f"🧾 Schema benchmark: {args.polls} polls of {args.actions} actions, "
+          f"{args.migrate:,} documents migrated")
+    print("=" * 72)
+    legacy = legacy_documents(args.actions)
+    current = [upgrade(document) for document in legacy]
+    results = {'read_us': {'version 1': round(time_views(legacy, args.polls), 3),
+                           'current': round(time_views(current, args.polls), 3)}}
+    print(f"{'read path':<20} {'µs/action':>10} {'ms/poll':>10}")
+    for name, micros in results['read_us'].items():
+        print(f"{name:<20} {micros:>10.3f} {micros * args.actions / 1000:>10.3f}")
+
+    results['migrate_per_sec'] = {}
+    print(f"\n{'backend':<20} {'migrated/sec':>12}")
+    with tempfile.TemporaryDirectory() as workdir:
+        for name in args.backends:
+            storage = (MemoryStorage(capacity=args.migrate) if name == 'memory' else
+                       SQLiteStorage(os.path.join(workdir, 'schema.db'), table='bench_schema'))
+            rate = time_migration(storage, legacy_documents(args.migrate), args.batch_size)
+            storage.close()
+            results['migrate_per_sec'][name] = rate
+            print(f"{name:<20} {rate:>12,}")
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump({'options': vars(args), 'results': results}, output, indent=2)
+        print(f"Results saved to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            before = json.load(baseline_file)['results']['read_us']['current']
+        after = results['read_us']['current']
+        if after > before * (1 + args.tolerance):
+            print(f"\n❌ Read path regression: {before} -> {after} µs per action")
+            sys.exit(1)
+        print(f"\n✅ Read path within {args.tolerance:.0%} of {args.baseline}")
+
+
+if __name__ == '__main__':
+    main()
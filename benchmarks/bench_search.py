@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Benchmark: /api/search latency against a large history, per backend.
+
+Loads ``--events`` generated actions (authors, branch families, push commit
+summaries with a skewed vocabulary) into each backend, then times a mix of
+searches: a rare and a common word, two-word queries, author + word, branch
+prefix globs with and without text, and an exact branch with an action
+filter. Reports p50/p95/p99 per query kind and fails when any p95 exceeds
+``--budget-ms``. MongoDB is included when MONGO_URI points at a reachable
+server (a scratch collection is used and dropped afterwards).
+
+    python benchmarks/bench_search.py --events 1000000 --backends memory sqlite
+    python benchmarks/bench_search.py --events 200000 --output before.json
+    python benchmarks/bench_search.py --events 200000 --baseline before.json
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import config
+from app.search import SearchQuery
+from app.storage import MemoryStorage, MongoStorage, SQLiteStorage
+
+AUTHORS = [f'dev{i}' for i in range(500)]
+FAMILIES = ['feature', 'bugfix', 'release', 'hotfix', 'chore']
+VERBS = ['fix', 'add', 'update', 'remove', 'refactor', 'bump', 'revert', 'document']
+NOUNS = ['login', 'parser', 'cache', 'search', 'webhook', 'metrics', 'spool', 'retention',
+         'dashboard', 'stream', 'tenant', 'signature', 'rollup', 'archive', 'config']
+
+# name -> SearchQuery arguments; the word and branch choices are filled in per run
+QUERIES = {
+    'rare word': lambda rng: {'terms': ['zeppelin']},
+    'common word': lambda rng: {'terms': [rng.choice(VERBS)]},
+    'two words': lambda rng: {'terms': [rng.choice(VERBS), rng.choice(NOUNS)]},
+    'author + word': lambda rng: {'terms': [rng.choice(NOUNS)], 'author': rng.choice(AUTHORS)},
+    'branch glob': lambda rng: {'branch': f'{rng.choice(FAMILIES)}/{rng.choice(NOUNS)}-*'},
+    'glob + word': lambda rng: {'terms': [rng.choice(NOUNS)], 'branch': 'release/*'},
+    'branch + action': lambda rng: {'branch': 'main', 'filters': {'action': 'merge'}},
+}
+
+
+def make_documents(count, seed):
+    rng = random.Random(seed)
+    started = datetime(2024, 1, 1)
+    documents = []
+    for i in range(count):
+        family = rng.choice(FAMILIES)
+        noun = NOUNS[min(int(rng.expovariate(0.3)), len(NOUNS) - 1)]
+        action = rng.choice(['push', 'push', 'push', 'pull_request', 'merge'])
+        document = {
+            'author': AUTHORS[min(int(rng.paretovariate(1.2)) - 1, len(AUTHORS) - 1)],
+            'action': action,
+            'to_branch': 'main' if action != 'push' else f'{family}/{noun}-{i % 97}',
+            'from_branch': f'{family}/{noun}-{i % 97}' if action != 'push' else None,
+            'repository': f'org/repo{i % 20}',
+            'timestamp': (started + timedelta(seconds=i)).isoformat(),
+            'created_at': started + timedelta(seconds=i),
+        }
+        if action == 'push':
+            document['commit_messages'] = [
+                f'{rng.choice(VERBS).capitalize()} {rng.choice(NOUNS)} {rng.choice(NOUNS)}'
+                for _ in range(rng.randint(1, 3))]
+            if i % 50000 == 0:
+                document['commit_messages'].append('Remove zeppelin workaround')
+        documents.append(document)
+    return documents
+
+
+def open_backend(name, workdir, events):
+    if name == 'memory':
+        return MemoryStorage(capacity=events)
+    if name == 'sqlite':
+        return SQLiteStorage(os.path.join(workdir, 'search.db'), table='bench_search')
+    if name == 'mongo':
+        from pymongo import MongoClient
+        client = MongoClient(config.MONGO_URI, serverSelectionTimeoutMS=2000)
+        client.admin.command('ping')
+        collection = client[config.DATABASE_NAME]['bench_search']
+        collection.drop()
+        return MongoStorage(collection)
+    raise ValueError(name)
+
+
+def percentile(samples, fraction):
+    samples = sorted(samples)
+    return samples[min(int(len(samples) * fraction), len(samples) - 1)]
+
+
+def run(storage, documents, batch_size, repeats, limit, seed):
+    storage.ensure_indexes()
+    started = time.perf_counter()
+    for start in range(0, len(documents), batch_size):
+        storage.insert_many(documents[start:start + batch_size])
+    load_seconds = time.perf_counter() - started
+    # A full collection left pending by the load would otherwise land on one timed query
+    gc.collect()
+
+    rng = random.Random(seed)
+    rows = {}
+    for name, make in QUERIES.items():
+        samples, returned = [], 0
+        for _ in range(repeats):
+            query = SearchQuery(limit=limit, **make(rng))
+            started = time.perf_counter()
+            results = list(storage.search(query))
+            samples.append((time.perf_counter() - started) * 1000)
+            returned += len(results)
+        rows[name] = {
+            'p50_ms': round(percentile(samples, 0.50), 3),
+            'p95_ms': round(percentile(samples, 0.95), 3),
+            'p99_ms': round(percentile(samples, 0.99), 3),
+            'avg_results': round(returned / repeats, 1),
+        }
+    return {'load_per_sec': round(len(documents) / load_seconds), 'queries': rows}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--events', type=int, default=200000)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--repeats', type=int, default=50, help='timed runs per query kind')
+    parser.add_argument('--limit', type=int, default=50, help='results per search')
+    parser.add_argument('--backends', nargs='+', default=['memory', 'sqlite', 'mongo'])
+    parser.add_argument('--budget-ms', type=float, default=50, help='p95 every query must stay under')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='write the results as JSON')
+    parser.add_argument('--baseline', help='earlier --output file to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed relative growth of p95 against --baseline')
+    args = parser.parse_args()
+
+    print(f"🔎 Search benchmark: {args.events:,} events, {args.repeats} runs per query, "
+          f"limit {args.limit}")
+    print("=" * 72)
+    documents = make_documents(args.events, args.seed)
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for name in args.backends:
+            try:
+                storage = open_backend(name, workdir, args.events)
+            except Exception as e:
+                print(f"\n{name}: skipped ({e})")
+                continue
+
+            # Each backend stores its own copies (they get an _id assigned)
+            result = run(storage, [dict(document) for document in documents], args.batch_size,
+                         args.repeats, args.limit, args.seed)
+            results[name] = result
+            print(f"\n{name} (loaded at {result['load_per_sec']:,} docs/sec)")
+            print(f"   {'query':<18} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'results':>9}")
+            for query, row in result['queries'].items():
+                print(f"   {query:<18} {row['p50_ms']:>9.2f} {row['p95_ms']:>9.2f} "
+                      f"{row['p99_ms']:>9.2f} {row['avg_results']:>9}")
+
+            if name == 'mongo':
+                storage.collection.drop()
+            storage.close()
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump({'options': vars(args), 'results': results}, output, indent=2)
+        print(f"Results saved to {args.output}")
+
+    failures = [f"{name} {query}: p95 {row['p95_ms']} ms over the {args.budget_ms} ms budget"
+                for name, result in results.items()
+                for query, row in result['queries'].items() if row['p95_ms'] > args.budget_ms]
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)['results']
+        for name, result in results.items():
+            for query, row in result['queries'].items():
+                before = baseline.get(name, {}).get('queries', {}).get(query)
+                if before and row['p95_ms'] > before['p95_ms'] * (1 + args.tolerance):
+                    failures.append(f"{name} {query}: p95 {before['p95_ms']} -> {row['p95_ms']} ms")
+    if failures:
+        print("\n❌ Search latency regressions:")
+        for line in failures:
+            print(f"   {line}")
+        sys.exit(1)
+    print(f"\n✅ Every p95 under {args.budget_ms} ms"
+          + (f" and within {args.tolerance:.0%} of {args.baseline}" if args.baseline else ""))
+
+
+if __name__ == '__main__':
+    main()
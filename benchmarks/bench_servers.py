@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Benchmark: the sync, gthread and gevent serving profiles under mixed load.
+
+For each profile, starts ``gunicorn -c gunicorn.conf.py "app:create_app()"``
+on a free local port with SERVER_PROFILE set, opens ``--stream-clients``
+dashboard connections on /api/actions/stream (each holds a sync worker for
+as long as it stays open), then drives the same mixed /webhook,
+/webhook/receiver and /api/actions load as bench_endpoints.py and reports
+requests/sec and p50/p95/p99 latency per endpoint. The gevent profile is
+skipped when gevent is not installed.
+
+    python benchmarks/bench_servers.py
+    python benchmarks/bench_servers.py --profiles sync gevent --stream-clients 3 --concurrency 64
+    python benchmarks/bench_servers.py --storage mongo --output servers.json
+"""
+import argparse
+import contextlib
+import http.client
+import importlib.util
+import json
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_endpoints import HTTPTarget, run
+
+PROFILES = ('sync', 'gthread', 'gevent')
+SECRET = 'bench-servers-secret'
+
+
+def free_port():
+    with contextlib.closing(socket.socket()) as probe:
+        probe.bind(('127.0.0.1', 0))
+        return probe.getsockname()[1]
+
+
+def start_server(profile, port, args, directory):
+    os.makedirs(directory, exist_ok=True)
+    env = dict(os.environ,
+               SERVER_PROFILE=profile,
+               WEB_BIND=f'127.0.0.1:{port}',
+               WEB_WORKERS=str(args.workers),
+               WEB_THREADS=str(args.threads),
+               STORAGE_BACKEND=args.storage,
+               SQLITE_PATH=os.path.join(directory, 'webhooks.db'),
+               WEBHOOK_SECRETS=SECRET,
+               SPOOL_DIR=os.path.join(directory, 'spool'),
+               METRICS_DIR=os.path.join(directory, 'metrics'),
+               SUBSCRIPTIONS_FILE='')
+    log = open(os.path.join(directory, 'server.log'), 'w')
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', os.path.join(ROOT, 'gunicorn.conf.py'),
+         '--chdir', ROOT, 'app:create_app()'],
+        env=env, stdout=log, stderr=subprocess.STDOUT)
+
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"{profile} server exited, see {log.name}")
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+            connection.request('GET', '/health')
+            if connection.getresponse().status == 200:
+                connection.close()
+                return server
+        except OSError:
+            pass
+        time.sleep(0.2)
+    stop_server(server)
+    raise RuntimeError(f"{profile} server did not answer /health within 30s, see {log.name}")
+
+
+def stop_server(server):
+    server.send_signal(signal.SIGTERM)
+    try:
+        server.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        server.kill()
+        server.wait()
+
+
+def open_streams(port, count):
+    """Dashboard connections left open on /api/actions/stream."""
+    streams = []
+    for _ in range(count):
+        stream = socket.create_connection(('127.0.0.1', port), timeout=5)
+        stream.sendall(b'GET /api/actions/stream HTTP/1.1\r\nHost: localhost\r\n'
+                       b'Accept: text/event-stream\r\n\r\n')
+        streams.append(stream)
+    # Give each stream time to be picked up by a worker
+    time.sleep(0.5)
+    return streams
+
+
+def load_options(args):
+    """The bench_endpoints.py options for one run."""
+    return argparse.Namespace(
+        requests=args.requests, warmup=args.warmup, concurrency=args.concurrency, rate=args.rate,
+        mix=args.mix, events='push=6,pull_request=3,merge=1', payload_bytes=args.payload_bytes,
+        redelivery=0.01, unconditional=False, seed=args.seed, secret=SECRET, trace_memory=False,
+        url=None, receiver_url=None, storage=args.storage, output=None, baseline=None,
+        tolerance=None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--profiles', nargs='+', choices=PROFILES, default=list(PROFILES))
+    parser.add_argument('--workers', type=int, default=4, help='gunicorn workers per profile')
+    parser.add_argument('--threads', type=int, default=32, help='threads per gthread worker')
+    parser.add_argument('--stream-clients', type=int, default=2,
+                        help='open /api/actions/stream connections during the run')
+    parser.add_argument('--requests', type=int, default=5000, help='recorded requests')
+    parser.add_argument('--warmup', type=int, default=300, help='unrecorded requests first')
+    parser.add_argument('--concurrency', type=int, default=32, help='client threads')
+    parser.add_argument('--rate', type=float, default=0,
+                        help='offered load in requests/sec (0: unthrottled)')
+    parser.add_argument('--mix', default='webhook=4,receiver=2,actions=4',
+                        help='endpoint weights: webhook, receiver, actions')
+    parser.add_argument('--payload-bytes', type=int, default=6144)
+    parser.add_argument('--storage', default='memory', help='STORAGE_BACKEND for the servers')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='write the results as JSON')
+    args = parser.parse_args()
+
+    profiles = args.profiles
+    if 'gevent' in profiles and importlib.util.find_spec('gevent') is None:
+        print("⚠️  gevent is not installed, skipping the gevent profile")
+        profiles = [profile for profile in profiles if profile != 'gevent']
+    if 'sync' in profiles and args.stream_clients >= args.workers:
+        print(f"⚠️  {args.stream_clients} streams hold every sync worker: "
+              f"expect timeouts until gunicorn recycles them")
+
+    print(f"🖥️  Serving profiles: {args.requests} requests, {args.concurrency} client threads, "
+          f"{args.stream_clients} open streams, {args.workers} workers, {args.storage} storage")
+    print("=" * 72)
+    results = {}
+    directory = tempfile.mkdtemp(prefix='bench-servers-')
+    try:
+        for profile in profiles:
+            port = free_port()
+            server = start_server(profile, port, args, os.path.join(directory, profile))
+            streams = []
+            try:
+                streams = open_streams(port, args.stream_clients)
+                result = run(load_options(args), HTTPTarget(f'http://127.0.0.1:{port}'))
+            finally:
+                for stream in streams:
+                    stream.close()
+                stop_server(server)
+            results[profile] = {'totals': result['totals'], 'targets': result['targets']}
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    print(f"{'profile':<8} {'endpoint':<10} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} "
+          f"{'p99 ms':>9}  statuses")
+    for profile, result in results.items():
+        for name, row in result['targets'].items():
+            statuses = ' '.join(f'{status}×{count}' for status, count in sorted(row['statuses'].items()))
+            print(f"{profile:<8} {name:<10} {row['requests_per_sec']:>9.0f} {row['p50_ms']:>9.2f} "
+                  f"{row['p95_ms']:>9.2f} {row['p99_ms']:>9.2f}  {statuses}")
+        totals = result['totals']
+        print(f"{profile:<8} {'total':<10} {totals['requests_per_sec']:>9.0f} "
+              f"({totals['events_per_sec']:.0f} events accepted/s)")
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump({'options': vars(args), 'results': results}, output, indent=2)
+        print(f"Results saved to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
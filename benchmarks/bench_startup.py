@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Benchmark: import time and time to first request of a fresh worker.
+
+Each measurement runs in a new interpreter, ``--runs`` times, and reports
+the median:
+
+    import        ``python -X importtime -c "import app.config"``: what the
+                  CLI, the benchmarks and every ``from app import config`` pay
+    create_app    ``python -X importtime -c "create_app()"``, broken down by
+                  the heaviest top-level packages (flask, pymongo, pyarrow...)
+    first request interpreter start to the first /api/actions response from
+                  the Flask test client, and with ``--gunicorn`` from starting
+                  ``gunicorn "app:create_app()"`` (one sync worker) to its
+                  first 200 on /api/actions
+
+``--root`` points at another checkout of the repository, so the same
+numbers can be taken before and after a change:
+
+    git worktree add /tmp/before HEAD~1
+    python benchmarks/bench_startup.py --root /tmp/before --output before.json
+    python benchmarks/bench_startup.py --baseline before.json
+    python benchmarks/bench_startup.py --storage mongo --gunicorn
+"""
+import argparse
+import contextlib
+import http.client
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCRIPTS = {
+    'import': 'import app.config',
+    'create_app': 'from app import create_app; create_app()',
+}
+FIRST_REQUEST = (
+    "from app import create_app\n"
+    "response = create_app().test_client().get('/api/actions')\n"
+    "assert response.status_code == 200, response.status_code\n"
+)
+# Packages shown on their own in the create_app breakdown
+PACKAGES = ('flask', 'werkzeug', 'jinja2', 'flask_cors', 'pymongo', 'bson', 'pyarrow')
+
+
+def environment(args, directory):
+    return dict(os.environ,
+                STORAGE_BACKEND=args.storage,
+                SQLITE_PATH=os.path.join(directory, 'webhooks.db'),
+                SPOOL_DIR=os.path.join(directory, 'spool'),
+                METRICS_DIR=os.path.join(directory, 'metrics'),
+                SUBSCRIPTIONS_FILE='',
+                PYTHONPATH=args.root)
+
+
+def importtime(script, env, cwd):
+    """Total and per-top-level-package cumulative import time, in ms."""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', script],
+                            env=env, cwd=cwd, capture_output=True, text=True, check=True)
+    total, packages = 0, {}
+    for line in result.stderr.splitlines():
+        # "import time:  self [us] | cumulative | imported package"
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        total += int(self_us)
+        # A package is listed once, where it is first imported, with everything under it
+        if name.strip() in PACKAGES:
+            packages[name.strip()] = int(cumulative_us)
+    return total / 1000, {name: us / 1000 for name, us in packages.items()}
+
+
+def first_request(env, cwd):
+    started = time.perf_counter()
+    subprocess.run([sys.executable, '-c', FIRST_REQUEST], env=env, cwd=cwd,
+                   capture_output=True, check=True)
+    return (time.perf_counter() - started) * 1000
+
+
+def free_port():
+    with contextlib.closing(socket.socket()) as probe:
+        probe.bind(('127.0.0.1', 0))
+        return probe.getsockname()[1]
+
+
+def gunicorn_first_request(env, cwd, timeout=30):
+    """Starting gunicorn to the first 200 on /api/actions, polled every 5 ms."""
+    port = free_port()
+    env = dict(env, SERVER_PROFILE='sync', WEB_WORKERS='1', WEB_BIND=f'127.0.0.1:{port}')
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', os.path.join(cwd, 'gunicorn.conf.py'),
+         '--chdir', cwd, 'app:create_app()'],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - started < timeout:
+            if server.poll() is not None:
+                raise RuntimeError("gunicorn exited before answering")
+            try:
+                connection = http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+                connection.request('GET', '/api/actions')
+                status = connection.getresponse().status
+                connection.close()
+                if status == 200:
+                    return (time.perf_counter() - started) * 1000
+            except OSError:
+                time.sleep(0.005)
+        raise RuntimeError(f"gunicorn did not answer within {timeout}s")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--runs', type=int, default=7)
+    parser.add_argument('--storage', default='sqlite', choices=['memory', 'sqlite', 'mongo'])
+    parser.add_argument('--root', default=ROOT, help='checkout to measure (default: this one)')
+    parser.add_argument('--gunicorn', action='store_true',
+                        help='also time a gunicorn worker to its first response')
+    parser.add_argument('--output', help='write the results as JSON')
+    parser.add_argument('--baseline', help='earlier --output file to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed relative growth of any median against --baseline')
+    args = parser.parse_args()
+    args.root = os.path.abspath(args.root)
+
+    print(f"🚀 Startup benchmark: {args.root}, {args.storage} storage, "
+          f"median of {args.runs} runs")
+    print("=" * 72)
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        env = environment(args, workdir)
+        packages = {}
+        for name, script in SCRIPTS.items():
+            runs = [importtime(script, env, workdir) for _ in range(args.runs)]
+            results[f'{name} (importtime ms)'] = round(statistics.median(t for t, _ in runs), 1)
+            if name == 'create_app':
+                for package in PACKAGES:
+                    times = [p[package] for _, p in runs if package in p]
+                    if times:
+                        packages[package] = round(statistics.median(times), 1)
+        results['first request (ms)'] = round(statistics.median(
+            first_request(env, workdir) for _ in range(args.runs)), 1)
+        if args.gunicorn:
+            results['gunicorn first request (ms)'] = round(statistics.median(
+                gunicorn_first_request(env, args.root) for _ in range(args.runs)), 1)
+
+    for name, value in results.items():
+        print(f"{name:<32} {value:>10.1f}")
+    print("\ncreate_app imports (cumulative ms)")
+    for package, value in sorted(packages.items(), key=lambda item: -item[1]):
+        print(f"   {package:<29} {value:>10.1f}")
+    results['create_app packages (ms)'] = packages
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump({'options': vars(args), 'results': results}, output, indent=2)
+        print(f"Results saved to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)['results']
+        failures = [f"{name}: {baseline[name]} -> {value} ms"
+                    for name, value in results.items()
+                    if isinstance(value, float) and name in baseline
+                    and value > baseline[name] * (1 + args.tolerance)]
+        if failures:
+            print("\n❌ Startup regressions:")
+            for line in failures:
+                print(f"   {line}")
+            sys.exit(1)
+        print(f"\n✅ Within {args.tolerance:.0%} of {args.baseline}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Benchmark harness: the same workload against every storage backend.
+
+Workload: batched inserts, single inserts, latest-50 reads, keyset paging
+through a filtered history, and grouped counts. MongoDB is included when
+MONGO_URI points at a reachable server (a scratch collection is used and
+dropped afterwards).
+
+    python benchmarks/bench_storage.py --events 20000 --backends memory sqlite mongo
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import config
+from app.storage import MemoryStorage, MongoStorage, SQLiteStorage
+
+AUTHORS = [f'user{i}' for i in range(40)]
+BRANCHES = ['main', 'develop', 'staging', 'release/1.0', 'feature/search']
+ACTIONS = ['push', 'pull_request', 'merge']
+
+
+def make_documents(count, offset=0):
+    started = datetime(2024, 1, 1)
+    return [{
+        'author': AUTHORS[i % len(AUTHORS)],
+        'action': ACTIONS[i % len(ACTIONS)],
+        'from_branch': BRANCHES[(i + 1) % len(BRANCHES)],
+        'to_branch': BRANCHES[i % len(BRANCHES)],
+        'timestamp': (started + timedelta(seconds=i)).isoformat(),
+        'delivery_id': f'delivery-{i}',
+        'created_at': started + timedelta(seconds=i),
+    } for i in range(offset, offset + count)]
+
+
+def open_backend(name, workdir):
+    if name == 'memory':
+        return MemoryStorage(capacity=10000000)
+    if name == 'sqlite':
+        return SQLiteStorage(os.path.join(workdir, 'bench.db'), table='bench_actions')
+    if name == 'mongo':
+        from pymongo import MongoClient
+        client = MongoClient(config.MONGO_URI, serverSelectionTimeoutMS=2000)
+        client.admin.command('ping')
+        collection = client[config.DATABASE_NAME]['bench_actions']
+        collection.drop()
+        return MongoStorage(collection)
+    raise ValueError(name)
+
+
+def timed(label, results, func, operations):
+    started = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - started
+    results.append((label, operations / elapsed if elapsed else float('inf'), elapsed))
+
+
+def run(storage, events, batch_size, singles, reads):
+    storage.ensure_indexes()
+    results = []
+
+    documents = make_documents(events)
+
+    def bulk():
+        for start in range(0, events, batch_size):
+            storage.insert_many(documents[start:start + batch_size])
+    timed(f'insert_many ({batch_size}/batch)', results, bulk, events)
+
+    single_documents = make_documents(singles, offset=events)
+
+    def single():
+        for document in single_documents:
+            storage.insert(document)
+    timed('insert (one by one)', results, single, singles)
+
+    timed('latest(50)', results, lambda: [storage.latest(50) for _ in range(reads)], reads)
+
+    pages = []
+
+    def paging():
+        cursor = None
+        while True:
+            page, cursor = storage.find_page({'author': 'user7'}, cursor, 50)
+            pages.append(len(page))
+            if not cursor:
+                break
+    timed('find_page author=… (all pages)', results, paging, 1)
+    results[-1] = (f'{results[-1][0]} [{len(pages)} pages]',) + results[-1][1:]
+
+    timed('count by author', results,
+          lambda: [storage.count('author', {'action': 'push'}) for _ in range(10)], 10)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--events', type=int, default=20000)
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--singles', type=int, default=1000)
+    parser.add_argument('--reads', type=int, default=500)
+    parser.add_argument('--backends', nargs='+', default=['memory', 'sqlite', 'mongo'])
+    args = parser.parse_args()
+
+    print(f"🗄️  Storage benchmark: {args.events} events")
+    print("=" * 72)
+    with tempfile.TemporaryDirectory() as workdir:
+        for name in args.backends:
+            try:
+                storage = open_backend(name, workdir)
+            except Exception as e:
+                print(f"\n{name}: skipped ({e})")
+                continue
+
+            print(f"\n{name}")
+            for label, rate, elapsed in run(storage, args.events, args.batch_size,
+                                            args.singles, args.reads):
+                print(f"   {label:<40} {rate:>12.0f} ops/sec  {elapsed * 1000:>9.1f} ms")
+
+            if name == 'mongo':
+                storage.collection.drop()
+            storage.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Load test: how many concurrent stream clients one worker process can hold.
+
+Each client is a thread consuming the same SSE generator the
+/api/actions/stream endpoint returns (one thread per connection, as under a
+threaded worker). A publisher pushes actions at a fixed rate and every client
+records how long each delta took to reach it.
+
+    python benchmarks/bench_stream_clients.py --clients 100 500 1000 --rate 20
+"""
+import argparse
+import json
+import os
+import resource
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.stream import Broadcaster, sse_events
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def client(broadcaster, cursor, latencies, lock):
+    received = []
+    for frame in sse_events(broadcaster, cursor, keepalive=0.5, max_duration=3600):
+        if 'event: actions' not in frame:
+            continue
+        now = time.perf_counter()
+        actions = json.loads(frame.split('data: ', 1)[1])['actions']
+        received.extend(now - action['sent_at'] for action in actions if action['id'] != 'stop')
+        if actions[-1]['id'] == 'stop':
+            break
+    with lock:
+        latencies.extend(received)
+
+
+def run(clients, rate, duration):
+    broadcaster = Broadcaster(history=1000)
+    latencies = []
+    lock = threading.Lock()
+
+    threads = [
+        threading.Thread(target=client, args=(broadcaster, broadcaster.cursor, latencies, lock),
+                         daemon=True)
+        for _ in range(clients)
+    ]
+    for thread in threads:
+        thread.start()
+    while broadcaster.clients < clients:
+        time.sleep(0.01)
+
+    published = 0
+    interval = 1 / rate
+    ends_at = time.perf_counter() + duration
+    while time.perf_counter() < ends_at:
+        broadcaster.publish([{'id': str(published), 'author': 'bench', 'action': 'push',
+                              'sent_at': time.perf_counter()}])
+        published += 1
+        time.sleep(interval)
+
+    # Release the clients
+    broadcaster.publish([{'id': 'stop', 'sent_at': time.perf_counter()}])
+    for thread in threads:
+        thread.join(5)
+
+    expected = published * clients
+    delivered = len(latencies)
+    return {
+        'clients': clients,
+        'published': published,
+        'delivered_ratio': round(delivered / expected, 4) if expected else 0,
+        'p50_ms': round(statistics.median(latencies) * 1000, 2) if latencies else 0,
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        'max_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--clients', type=int, nargs='+', default=[50, 200, 500, 1000])
+    parser.add_argument('--rate', type=float, default=20, help='actions published per second')
+    parser.add_argument('--duration', type=float, default=5, help='seconds per step')
+    parser.add_argument('--p99-budget-ms', type=float, default=250,
+                        help='p99 delivery latency a step must stay under to count')
+    args = parser.parse_args()
+
+    print(f"📡 Stream fan-out: {args.rate:g} actions/sec for {args.duration:g}s per step")
+    print("=" * 72)
+    print(f"{'clients':>8} {'published':>10} {'delivered':>10} {'p50 ms':>8} {'p99 ms':>8} {'rss MB':>8}")
+
+    capacity = 0
+    for clients in args.clients:
+        result = run(clients, args.rate, args.duration)
+        print(f"{result['clients']:>8} {result['published']:>10} {result['delivered_ratio']:>10.2%} "
+              f"{result['p50_ms']:>8} {result['p99_ms']:>8} {result['max_rss_mb']:>8}")
+        if result['p99_ms'] <= args.p99_budget_ms and result['delivered_ratio'] >= 0.999:
+            capacity = clients
+
+    print("=" * 72)
+    print(f"Largest step within a {args.p99_budget_ms:g} ms p99 budget: {capacity} clients per worker")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Benchmark: two tenants sharing one collection, isolation and scoped read latency.
+
+Configures tenants ``acme`` and ``globex`` with the same ``collection`` and
+delivers ``--events`` signed pushes and pull requests to each of
+/webhook/acme and /webhook/globex. Then, per tenant, it reads everything
+back through every read path a tenant has and fails when any of them
+returns the other tenant's actions, or misses one of its own:
+
+    actions   /api/actions?tenant=<name>, paged to the end
+    search    /api/search?tenant=<name>&branch=*
+    export    /api/export?tenant=<name> (NDJSON)
+    summary   /api/export/summary?tenant=<name> totals
+
+It also reports the p50/p99 of a scoped first page, which the tenant
+indexes keep flat however many actions the other tenant stores. Each
+backend runs in a fresh interpreter; MongoDB uses a scratch collection in
+MONGO_URI's server.
+
+    python benchmarks/bench_tenants.py
+    python benchmarks/bench_tenants.py --events 20000 --backends memory sqlite
+    python benchmarks/bench_tenants.py --output tenants.json
+    python benchmarks/bench_tenants.py --baseline tenants.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+TENANTS = {'acme': 'acme-bench-secret', 'globex': 'globex-bench-secret'}
+SHARED_COLLECTION = 'bench_shared_actions'
+PAGE_LIMIT = 100
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def read_all(client, name):
+    """Tenants seen by each read path for ``name``: {path: [tenant of every action]}."""
+    seen = {'actions': [], 'search': [], 'export': []}
+    cursor = None
+    while True:
+        url = f'/api/actions?tenant={name}&limit={PAGE_LIMIT}' + (f'&cursor={cursor}' if cursor else '')
+        page = client.get(url).get_json()
+        seen['actions'] += [action['tenant'] for action in page['actions']]
+        cursor = page['next_cursor']
+        if not cursor:
+            break
+
+    response = client.get(f'/api/search?tenant={name}&branch=*&limit=100000&format=ndjson')
+    seen['search'] = [json.loads(line)['tenant'] for line in response.data.splitlines() if line]
+
+    response = client.get(f'/api/export?tenant={name}&format=ndjson&fields=tenant')
+    seen['export'] = [json.loads(line)['tenant'] for line in response.data.splitlines() if line]
+
+    summary = client.get(f'/api/export/summary?tenant={name}').get_json()
+    return seen, summary['total']
+
+
+def child(args):
+    """One backend in this interpreter; prints its result as JSON."""
+    from payloads import PayloadFactory
+    from app import create_app, main
+    from app.startup import startup
+
+    app = create_app(warm_up='off')
+    app.testing = True
+    startup.warm_up()
+    client = app.test_client()
+
+    accepted = dict.fromkeys(TENANTS, 0)
+    for seed, (name, secret) in enumerate(TENANTS.items(), 1):
+        factory = PayloadFactory(seed=seed, size=args.payload_bytes, secret=secret)
+        for index in range(args.events):
+            _, body, headers = factory.delivery('push' if index % 3 else 'pull_request')
+            response = client.post(f'/webhook/{name}', data=body, headers=headers)
+            accepted[name] += response.status_code == 202
+    main.pipelines[SHARED_COLLECTION].ingest_queue.flush()
+
+    tenants = {}
+    for name in TENANTS:
+        seen, total = read_all(client, name)
+        leaks = {path: sum(tenant != name for tenant in tenants_seen)
+                 for path, tenants_seen in seen.items()}
+        counts = dict({path: len(tenants_seen) for path, tenants_seen in seen.items()},
+                      summary=total)
+        latencies = []
+        for _ in range(args.reads):
+            started = time.perf_counter()
+            client.get(f'/api/actions?tenant={name}&limit=20').close()
+            latencies.append(time.perf_counter() - started)
+        tenants[name] = {
+            'accepted': accepted[name],
+            'counts': counts,
+            'leaks': leaks,
+            'p50_ms': round(statistics.median(latencies) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        }
+    if args.backend == 'mongo':
+        storage = main.pipelines[SHARED_COLLECTION].storage
+        storage.collection.drop()
+        storage.db.drop_collection(f'{SHARED_COLLECTION}_hot')
+    print(json.dumps(tenants))
+    os._exit(0)
+
+
+def run(backend, args, workdir):
+    tenants_file = os.path.join(workdir, 'tenants.json')
+    with open(tenants_file, 'w') as output:
+        json.dump({name: {'secrets': [secret], 'collection': SHARED_COLLECTION}
+                   for name, secret in TENANTS.items()}, output)
+    env = dict(os.environ,
+               STORAGE_BACKEND=backend,
+               TENANTS_FILE=tenants_file,
+               SQLITE_PATH=os.path.join(workdir, f'{backend}.db'),
+               MEMORY_CAPACITY=str(args.events * len(TENANTS) * 2),
+               INGEST_QUEUE_SIZE=str(args.events * len(TENANTS) + 1),
+               SPOOL_DIR=os.path.join(workdir, backend, 'spool'),
+               METRICS_DIR=os.path.join(workdir, backend, 'metrics'),
+               METRICS_ENABLED='false',
+               SUBSCRIPTIONS_FILE='',
+               EVENT_BUS='none')
+    command = [sys.executable, os.path.abspath(__file__), '--child', '--backend', backend,
+               '--events', str(args.events), '--reads', str(args.reads),
+               '--payload-bytes', str(args.payload_bytes)]
+    result = subprocess.run(command, env=env, capture_output=True, text=True, cwd=workdir)
+    if result.returncode != 0:
+        raise RuntimeError(f"{backend} run failed:\n{result.stderr[-2000:]}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def check(backend, tenants):
+    """Isolation failures of one backend's run."""
+    failures = []
+    for name, row in tenants.items():
+        for path, leaked in row['leaks'].items():
+            if leaked:
+                failures.append(f"{backend} {path}: {name} saw {leaked} actions of another tenant")
+        for path, count in row['counts'].items():
+            if count != row['accepted']:
+                failures.append(f"{backend} {path}: {name} got {count} of its "
+                                f"{row['accepted']} actions")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--events', type=int, default=2000, help='deliveries per tenant')
+    parser.add_argument('--reads', type=int, default=200, help='timed scoped first pages per tenant')
+    parser.add_argument('--backends', nargs='+', default=['memory', 'sqlite'],
+                        choices=['memory', 'sqlite', 'mongo'])
+    parser.add_argument('--payload-bytes', type=int, default=1024)
+    parser.add_argument('--backend', help=argparse.SUPPRESS)
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--output', help='write the results as JSON')
+    parser.add_argument('--baseline', help='earlier --output file to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed relative growth of the scoped page p50s against --baseline')
+    args = parser.parse_args()
+    if args.child:
+        return child(args)
+
+    print(f"🏢 Tenant isolation benchmark: {args.events} deliveries to each of "
+          f"{', '.join(TENANTS)} in one shared collection")
+    print("=" * 72)
+    results, failures = {}, []
+    with tempfile.TemporaryDirectory() as workdir:
+        for backend in args.backends:
+            results[backend] = run(backend, args, workdir)
+            failures += check(backend, results[backend])
+            print(f"\n{backend}")
+            print(f"   {'tenant':<8} {'accepted':>8} {'actions':>8} {'search':>8} {'export':>8} "
+                  f"{'summary':>8} {'leaked':>7} {'p50 ms':>8} {'p99 ms':>8}")
+            for name, row in results[backend].items():
+                counts = row['counts']
+                print(f"   {name:<8} {row['accepted']:>8} {counts['actions']:>8} "
+                      f"{counts['search']:>8} {counts['export']:>8} {counts['summary']:>8} "
+                      f"{sum(row['leaks'].values()):>7} {row['p50_ms']:>8.2f} {row['p99_ms']:>8.2f}")
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump({'options': vars(args), 'results': results}, output, indent=2)
+        print(f"Results saved to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)['results']
+        failures += [f"{backend} {name} p50: {baseline[backend][name]['p50_ms']} -> {row['p50_ms']} ms"
+                     for backend, tenants in results.items() if backend in baseline
+                     for name, row in tenants.items()
+                     if row['p50_ms'] > baseline[backend][name]['p50_ms'] * (1 + args.tolerance)]
+
+    if failures:
+        print("\n❌ Tenant isolation failures:")
+        for line in failures:
+            print(f"   {line}")
+        sys.exit(1)
+    print("\n✅ Every read path stayed within its tenant")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,304 @@
+"""
+Realistic GitHub webhook payloads for the benchmarks.
+
+Shapes follow the push and pull_request deliveries GitHub sends (trimmed to
+the fields a receiver could plausibly read, plus the nesting around them).
+``size`` pads commit messages / PR bodies so a delivery serializes to
+roughly that many bytes; GitHub push payloads run from ~5 KB to several
+hundred KB for large pushes.
+
+    from payloads import PayloadFactory
+    factory = PayloadFactory(seed=1, size=8192)
+    event, body, headers = factory.delivery('push')
+"""
+import hashlib
+import hmac
+import json
+import random
+import uuid
+import zlib
+from datetime import datetime, timedelta, timezone
+
+EVENT_KINDS = ('push', 'pull_request', 'merge', 'create', 'delete', 'release',
+               'pull_request_review', 'workflow_run', 'check_suite')
+AUTHORS = [f'dev{i:03d}' for i in range(200)]
+BRANCHES = ['main', 'develop', 'staging', 'release/2.4', 'hotfix/login',
+            'feature/search', 'feature/export', 'feature/metrics']
+REPOSITORIES = ['acme/api', 'acme/web', 'acme/infra', 'acme/docs']
+WORDS = ('fix add update remove refactor bump cleanup handle retry cache index '
+         'query parser config worker queue test docs release deploy').split()
+
+
+class PayloadFactory:
+    """Deterministic generator of (event header, body bytes, headers) deliveries."""
+
+    def __init__(self, seed=0, size=4096, secret=None, redelivery=0.0):
+        self.random = random.Random(seed)
+        self.size = size
+        self.secret = secret
+        self.redelivery = redelivery
+        self._clock = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        self._recent = []
+
+    def delivery(self, kind):
+        """One delivery of ``kind`` (push, pull_request or merge), ready to POST."""
+        if self._recent and self.random.random() < self.redelivery:
+            # GitHub retries reuse the delivery id and body
+            return self.random.choice(self._recent)
+
+        if kind not in EVENT_KINDS:
+            raise ValueError(f"Unknown event kind: {kind} (expected one of {', '.join(EVENT_KINDS)})")
+        self._clock += timedelta(seconds=self.random.randint(1, 30))
+        event, payload = self.payload(kind)
+
+        body = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+        headers = {
+            'Content-Type': 'application/json',
+            'X-GitHub-Event': event,
+            'X-GitHub-Delivery': str(uuid.UUID(int=self.random.getrandbits(128))),
+            'User-Agent': 'GitHub-Hookshot/bench',
+        }
+        if self.secret:
+            digest = hmac.new(self.secret.encode('utf-8'), body, hashlib.sha256).hexdigest()
+            headers['X-Hub-Signature-256'] = f'sha256={digest}'
+
+        delivery = (event, body, headers)
+        self._recent.append(delivery)
+        del self._recent[:-100]
+        return delivery
+
+    def payload(self, kind):
+        """(X-GitHub-Event, payload dict) for one event of ``kind``."""
+        if kind == 'push':
+            return 'push', self.push()
+        if kind in ('pull_request', 'merge'):
+            return 'pull_request', self.pull_request(merged=kind == 'merge')
+        if kind in ('create', 'delete'):
+            return kind, self.ref_event()
+        return kind, getattr(self, kind)()
+
+    def push(self, commits=None):
+        """A push of ``commits`` commits (1-3 when not given)."""
+        author = self.random.choice(AUTHORS)
+        branch = self.random.choice(BRANCHES)
+        repository = self._repository()
+        count = commits or self.random.randint(1, 3)
+        commits = []
+        for _ in range(count):
+            commits.append(self._commit(author))
+
+        payload = {
+            'ref': f'refs/heads/{branch}',
+            'before': self._sha(),
+            'after': commits[-1]['id'],
+            'created': False,
+            'deleted': False,
+            'forced': False,
+            'compare': f"https://github.com/{repository['full_name']}/compare/x...y",
+            'commits': commits,
+            'head_commit': commits[-1],
+            'repository': repository,
+            'pusher': {'name': author, 'email': f'{author}@example.com'},
+            'sender': self._user(author),
+        }
+        # head_commit is the last commit, so its padding is serialized twice
+        self._pad(payload, commits[-1], 'message', copies=2)
+        return payload
+
+    def pull_request(self, merged):
+        author = self.random.choice(AUTHORS)
+        base, head = self.random.sample(BRANCHES, 2)
+        repository = self._repository()
+        number = self.random.randint(1, 5000)
+        opened_at = self._timestamp(self._clock - timedelta(hours=2))
+        pull_request = {
+            'url': f"https://api.github.com/repos/{repository['full_name']}/pulls/{number}",
+            'id': self.random.getrandbits(32),
+            'number': number,
+            'state': 'closed' if merged else 'open',
+            'title': self._sentence(6),
+            'body': self._sentence(20),
+            'user': self._user(author),
+            'created_at': opened_at,
+            'updated_at': self._timestamp(self._clock),
+            'closed_at': self._timestamp(self._clock) if merged else None,
+            'merged_at': self._timestamp(self._clock) if merged else None,
+            'merged': merged,
+            'merge_commit_sha': self._sha() if merged else None,
+            'head': {'label': f'acme:{head}', 'ref': head, 'sha': self._sha(),
+                     'repo': repository},
+            'base': {'label': f'acme:{base}', 'ref': base, 'sha': self._sha(),
+                     'repo': repository},
+            'commits': self.random.randint(1, 12),
+            'additions': self.random.randint(1, 900),
+            'deletions': self.random.randint(0, 400),
+            'changed_files': self.random.randint(1, 40),
+        }
+        payload = {
+            'action': 'closed' if merged else 'opened',
+            'number': number,
+            'pull_request': pull_request,
+            'repository': repository,
+            'sender': self._user(author),
+        }
+        self._pad(payload, pull_request, 'body')
+        return payload
+
+    def ref_event(self):
+        author = self.random.choice(AUTHORS)
+        ref_type = self.random.choice(('branch', 'tag'))
+        return {
+            'ref': self.random.choice(BRANCHES) if ref_type == 'branch' else f'v{self.random.randint(1, 9)}.0',
+            'ref_type': ref_type,
+            'master_branch': 'main',
+            'pusher_type': 'user',
+            'repository': self._repository(),
+            'sender': self._user(author),
+        }
+
+    def release(self):
+        author = self.random.choice(AUTHORS)
+        tag = f'v{self.random.randint(1, 9)}.{self.random.randint(0, 20)}.0'
+        release = {
+            'id': self.random.getrandbits(32),
+            'tag_name': tag,
+            'target_commitish': 'main',
+            'name': tag,
+            'draft': False,
+            'prerelease': False,
+            'author': self._user(author),
+            'created_at': self._timestamp(self._clock),
+            'published_at': self._timestamp(self._clock),
+            'body': self._sentence(40),
+            'assets': [],
+        }
+        payload = {'action': 'published', 'release': release,
+                   'repository': self._repository(), 'sender': self._user(author)}
+        self._pad(payload, release, 'body')
+        return payload
+
+    def pull_request_review(self):
+        reviewer = self.random.choice(AUTHORS)
+        pull_request = self.pull_request(merged=False)['pull_request']
+        review = {
+            'id': self.random.getrandbits(32),
+            'user': self._user(reviewer),
+            'body': self._sentence(15),
+            'state': self.random.choice(('approved', 'changes_requested', 'commented')),
+            'submitted_at': self._timestamp(self._clock),
+            'commit_id': self._sha(),
+        }
+        return {'action': 'submitted', 'review': review, 'pull_request': pull_request,
+                'repository': pull_request['base']['repo'], 'sender': self._user(reviewer)}
+
+    def workflow_run(self):
+        actor = self.random.choice(AUTHORS)
+        run = {
+            'id': self.random.getrandbits(32),
+            'name': self.random.choice(('CI', 'Release', 'Lint', 'Deploy')),
+            'head_branch': self.random.choice(BRANCHES),
+            'head_sha': self._sha(),
+            'event': 'push',
+            'status': 'completed',
+            'conclusion': self.random.choice(('success', 'failure', 'cancelled')),
+            'run_number': self.random.randint(1, 9000),
+            'created_at': self._timestamp(self._clock - timedelta(minutes=5)),
+            'updated_at': self._timestamp(self._clock),
+            'actor': self._user(actor),
+            'triggering_actor': self._user(actor),
+            'head_commit': self._commit(actor),
+            'repository': self._repository(),
+        }
+        payload = {'action': 'completed', 'workflow_run': run,
+                   'repository': run['repository'], 'sender': self._user(actor)}
+        self._pad(payload, run['head_commit'], 'message')
+        return payload
+
+    def check_suite(self):
+        sender = self.random.choice(AUTHORS)
+        suite = {
+            'id': self.random.getrandbits(32),
+            'head_branch': self.random.choice(BRANCHES),
+            'head_sha': self._sha(),
+            'status': 'completed',
+            'conclusion': self.random.choice(('success', 'failure', 'neutral')),
+            'app': {'id': 15368, 'slug': 'github-actions', 'name': 'GitHub Actions'},
+            'created_at': self._timestamp(self._clock - timedelta(minutes=5)),
+            'updated_at': self._timestamp(self._clock),
+            'pull_requests': [],
+            'head_commit': self._commit(sender),
+        }
+        payload = {'action': 'completed', 'check_suite': suite,
+                   'repository': self._repository(), 'sender': self._user(sender)}
+        self._pad(payload, suite['head_commit'], 'message')
+        return payload
+
+    def _commit(self, author):
+        return {
+            'id': self._sha(),
+            'tree_id': self._sha(),
+            'distinct': True,
+            'message': self._sentence(8),
+            'timestamp': self._timestamp(self._clock),
+            'url': 'https://github.com/acme/api/commit/x',
+            'author': {'name': author, 'email': f'{author}@example.com', 'username': author},
+            'committer': {'name': author, 'email': f'{author}@example.com', 'username': author},
+            'added': [f'src/{self.random.choice(WORDS)}.py' for _ in range(self.random.randint(0, 3))],
+            'removed': [],
+            'modified': [f'src/{self.random.choice(WORDS)}.py' for _ in range(self.random.randint(1, 5))],
+        }
+
+    def _repository(self):
+        full_name = self.random.choice(REPOSITORIES)
+        owner, name = full_name.split('/')
+        return {
+            'id': zlib.crc32(full_name.encode('utf-8')),
+            'name': name,
+            'full_name': full_name,
+            'private': False,
+            'owner': {'login': owner, 'id': 1, 'type': 'Organization'},
+            'html_url': f'https://github.com/{full_name}',
+            'default_branch': 'main',
+        }
+
+    def _user(self, login):
+        return {'login': login, 'id': AUTHORS.index(login) + 1000, 'type': 'User',
+                'avatar_url': f'https://avatars.githubusercontent.com/u/{login}'}
+
+    def _pad(self, payload, target, field, copies=1):
+        """Grow ``target[field]`` until the payload serializes to about ``self.size`` bytes."""
+        missing = (self.size - len(json.dumps(payload, separators=(',', ':')))) // copies
+        if missing > 0:
+            target[field] += '\n\n' + self._text(missing)
+
+    def _text(self, length):
+        words = []
+        total = 0
+        while total < length:
+            word = self.random.choice(WORDS)
+            words.append(word)
+            total += len(word) + 1
+        return ' '.join(words)[:length]
+
+    def _sentence(self, words):
+        return ' '.join(self.random.choice(WORDS) for _ in range(words)).capitalize()
+
+    def _sha(self):
+        return f'{self.random.getrandbits(160):040x}'
+
+    @staticmethod
+    def _timestamp(moment):
+        return moment.isoformat().replace('+00:00', 'Z')
+
+
+def parse_mix(spec, choices):
+    """Parse ``"push=6,pull_request=3"`` into ``(names, weights)`` restricted to ``choices``."""
+    names, weights = [], []
+    for part in spec.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in choices:
+            raise ValueError(f"Unknown mix entry: {name} (expected one of {', '.join(choices)})")
+        names.append(name)
+        weights.append(float(weight or 1))
+    return names, weights
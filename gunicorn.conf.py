@@ -0,0 +1,40 @@
+"""
+gunicorn settings for the serving profile chosen by SERVER_PROFILE:
+
+    sync     one request at a time per worker process; a dashboard holding
+             /api/actions/stream or a long-poll open takes a whole worker
+    gthread  WEB_THREADS request threads per worker (the default)
+    gevent   WEB_WORKER_CONNECTIONS greenlets per worker; gunicorn
+             monkey-patches each worker before loading the app, so PyMongo's
+             sockets, the ingest writer and every background thread become
+             cooperative (install requirements-gevent.txt)
+
+    gunicorn -c gunicorn.conf.py "app:create_app()"
+"""
+import importlib.util
+import os
+
+# Read app/config.py by path: importing the app package here would create its
+# locks and clients in the master, before a gevent worker patches them
+_spec = importlib.util.spec_from_file_location(
+    'webhook_server_config', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app', 'config.py'))
+_config = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(_config)
+
+SERVER_PROFILES = ('sync', 'gthread', 'gevent')
+
+if _config.SERVER_PROFILE not in SERVER_PROFILES:
+    raise ValueError(f"Unknown SERVER_PROFILE: {_config.SERVER_PROFILE} "
+                     f"(expected one of {', '.join(SERVER_PROFILES)})")
+if _config.SERVER_PROFILE == 'gevent' and importlib.util.find_spec('gevent') is None:
+    raise ImportError("SERVER_PROFILE=gevent requires the gevent package "
+                      "(pip install -r requirements-gevent.txt)")
+
+bind = _config.WEB_BIND
+workers = _config.WEB_WORKERS
+worker_class = _config.SERVER_PROFILE
+timeout = _config.WEB_TIMEOUT
+if _config.SERVER_PROFILE == 'gthread':
+    threads = _config.WEB_THREADS
+elif _config.SERVER_PROFILE == 'gevent':
+    worker_connections = _config.WEB_WORKER_CONNECTIONS
@@ -0,0 +1,111 @@
+import hashlib
+import hmac
+import json
+import os
+import sys
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from app.schema import build_document  # noqa: E402
+from app.storage import MemoryStorage, SQLiteStorage  # noqa: E402
+
+BACKENDS = ('memory', 'sqlite')
+SECRETS = ('old-secret', 'new-secret')
+
+
+@pytest.fixture(params=BACKENDS)
+def storage(request, tmp_path):
+    """An empty storage of each backend, indexes created."""
+    if request.param == 'memory':
+        storage = MemoryStorage(1000)
+    else:
+        storage = SQLiteStorage(str(tmp_path / 'actions.db'))
+    storage.ensure_indexes()
+    yield storage
+    if request.param == 'sqlite':
+        storage.close()
+
+
+@pytest.fixture(scope='module', params=BACKENDS)
+def app(request, tmp_path_factory):
+    """The Flask app on each backend, built from a fresh import of the app package.
+
+    Configuration is read from the environment when ``app.config`` is first
+    imported, and main.py builds its storage at import time, so every backend
+    needs its own import of the package.
+    """
+    workdir = tmp_path_factory.mktemp(request.param)
+    with pytest.MonkeyPatch.context() as patch:
+        for name, value in {
+            'STORAGE_BACKEND': request.param,
+            'SQLITE_PATH': str(workdir / 'webhooks.db'),
+            'WEBHOOK_SECRETS': ','.join(SECRETS),
+            'SPOOL_DIR': str(workdir / 'spool'),
+            'ARCHIVE_DIR': str(workdir / 'archive'),
+            'METRICS_DIR': str(workdir / 'metrics'),
+            'METRICS_ENABLED': 'false',
+            'TENANTS_FILE': '',
+            'SUBSCRIPTIONS_FILE': '',
+            'EVENT_BUS': 'none',
+        }.items():
+            patch.setenv(name, value)
+        for module in [name for name in sys.modules if name == 'app' or name.startswith('app.')]:
+            patch.delitem(sys.modules, module)
+
+        from app import create_app
+        from app.startup import startup
+
+        flask_app = create_app(warm_up='off')
+        flask_app.testing = True
+        startup.warm_up()
+        yield flask_app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def flush(app):
+    """Write everything the app has queued, so reads see it."""
+    from app import main
+    from app.webhook import routes
+
+    for pipeline in main.pipelines.values():
+        pipeline.ingest_queue.flush()
+    routes.ingest_queue.flush()
+
+
+def push_delivery(secret=SECRETS[0], ref='refs/heads/main', repository='octo/widgets',
+                  delivery_id=None):
+    """(body, headers) of a signed push delivery."""
+    body = json.dumps({
+        'ref': ref,
+        'pusher': {'name': 'octocat'},
+        'repository': {'full_name': repository},
+        'head_commit': {'message': 'Fix the widget', 'timestamp': '2024-01-01T10:00:00Z'},
+    }).encode('utf-8')
+    digest = hmac.new(secret.encode('utf-8'), body, hashlib.sha256).hexdigest()
+    return body, {
+        'Content-Type': 'application/json',
+        'X-GitHub-Event': 'push',
+        'X-GitHub-Delivery': delivery_id or str(uuid.uuid4()),
+        'X-Hub-Signature-256': f'sha256={digest}',
+    }
+
+
+def documents(count, started=None, **fields):
+    """``count`` current-schema pushes, one second apart from ``started``."""
+    started = started or datetime(2024, 1, 1)
+    created = []
+    for index in range(count):
+        document = build_document('push', f'dev{index}', to_branch='main',
+                                  repository='octo/widgets', **fields)
+        document['created_at'] = started + timedelta(seconds=index)
+        created.append(document)
+    return created
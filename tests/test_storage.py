@@ -0,0 +1,136 @@
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+
+from app.queries import QueryError, encode_cursor
+from app.retention import Archive, Retention
+from app.schema import SCHEMA_VERSION, migrate, upgrade, view
+from app.search import parse_search
+
+from conftest import documents
+
+
+def test_cursor_round_trip(storage):
+    stored = documents(7)
+    storage.insert_many(stored)
+
+    seen, cursor = [], None
+    while True:
+        page, cursor = storage.find_page(cursor=cursor, limit=3)
+        seen += [document['_id'] for document in page]
+        if not cursor:
+            break
+    assert seen == [document['_id'] for document in reversed(stored)]
+
+
+def test_tampered_cursor(storage):
+    storage.insert_many(documents(1))
+    cursor = encode_cursor({'created_at': datetime(2024, 1, 1), '_id': 'not-an-object-id'})
+    with pytest.raises(QueryError):
+        storage.find_page(cursor=cursor)
+
+
+def test_redelivery_is_a_duplicate(storage):
+    first, again = documents(2, delivery_id='delivery-1')
+    assert storage.insert_many([first]).inserted == 1
+
+    result = storage.insert_many([again])
+    assert result.inserted == 0
+    assert result.duplicates == [again]
+    assert [document['_id'] for document in storage.latest(10)] == [first['_id']]
+
+
+def legacy_push(branch, repository='octo/widgets', **fields):
+    """A version 1 push, stored before display fields were precomputed."""
+    return dict({
+        '_id': ObjectId(),
+        'author': 'octocat',
+        'action': 'push',
+        'to_branch': branch,
+        'repository': repository,
+        'timestamp': '2024-01-01T10:00:00Z',
+        'created_at': datetime(2024, 1, 1, 10),
+    }, **fields)
+
+
+def test_upgrade_from_version_1():
+    event = legacy_push('refs/heads/release/1.2', type='push', message='old line')
+    del event['action']
+
+    upgraded = upgrade(event)
+    assert upgraded['schema_version'] == SCHEMA_VERSION
+    assert upgraded['action'] == 'push'
+    assert upgraded['to_branch'] == 'release/1.2'
+    assert upgraded['timestamp'] == '2024-01-01T10:00:00'
+    assert 'message' not in upgraded and 'type' not in upgraded
+    assert upgraded['display_text'].startswith('"octocat" pushed to "release/1.2"')
+    assert 'schema_version' not in event
+
+
+def test_migrate_from_version_1(storage):
+    cut_short = legacy_push('1.2', schema_version=2)
+    ambiguous = legacy_push('2.0', schema_version=2)
+    stored = [legacy_push('release/1.2'), legacy_push('release/2.0'), legacy_push('hotfix/2.0'),
+              cut_short, ambiguous]
+    storage.insert_many(stored)
+
+    assert migrate(storage, batch_size=2) == (5, 5)
+    assert migrate(storage) == (5, 0)
+
+    migrated = {document['_id']: document for batch in storage.scan() for document in batch}
+    assert {document['schema_version'] for document in migrated.values()} == {SCHEMA_VERSION}
+    assert migrated[cut_short['_id']]['to_branch'] == 'release/1.2'
+    assert migrated[ambiguous['_id']]['to_branch'] == '2.0'
+    assert view(migrated[cut_short['_id']])['display_text'].startswith(
+        '"octocat" pushed to "release/1.2"')
+
+
+def test_archive_skips_a_duplicated_member(tmp_path):
+    archive = Archive('actions', str(tmp_path))
+    batch = documents(3)
+    archive.write(batch)
+    # A pass interrupted between writing and deleting archives the batch again
+    archive.write(batch[1:])
+
+    found = list(archive.find())
+    assert [document['_id'] for document in found] == [document['_id'] for document in batch]
+    assert found[0]['created_at'] == batch[0]['created_at']
+    assert [document['author'] for document in archive.find({'author': 'dev1'})] == ['dev1']
+
+
+def test_archive_pass_moves_old_documents(storage, tmp_path):
+    old = documents(3, started=datetime.utcnow() - timedelta(days=40))
+    recent = documents(2, started=datetime.utcnow() - timedelta(hours=1))
+    storage.insert_many(old + recent)
+
+    retention = Retention(storage, 'actions', retention_days=0, archive_after_days=30,
+                          directory=str(tmp_path))
+    assert retention.run_once() == (3, 0)
+    assert {document['_id'] for document in storage.latest(10)} == {
+        document['_id'] for document in recent}
+    assert [document['_id'] for document in retention.archive.find()] == [
+        document['_id'] for document in old]
+
+
+def searched(storage, **args):
+    return {document['_id'] for document, _ in storage.search(parse_search(dict(args, limit='100')))}
+
+
+def test_search_follows_delete_and_expire(storage):
+    old = documents(3, started=datetime(2024, 1, 1))
+    recent = documents(3, started=datetime(2024, 3, 1))
+    storage.insert_many(old + recent)
+    everything = {document['_id'] for document in old + recent}
+    assert searched(storage, q='widgets') == everything
+    assert searched(storage, branch='main') == everything
+
+    assert storage.delete([recent[0]['_id']]) == 1
+    assert searched(storage, q='widgets') == everything - {recent[0]['_id']}
+    assert searched(storage, author='dev0') == {old[0]['_id']}
+
+    assert storage.expire(datetime(2024, 2, 1)) == 3
+    remaining = {document['_id'] for document in recent[1:]}
+    assert searched(storage, q='widgets') == remaining
+    assert searched(storage, branch='main') == remaining
+    assert searched(storage, author='dev0') == set()
@@ -0,0 +1,79 @@
+import base64
+import json
+
+from conftest import SECRETS, flush, push_delivery
+
+
+def test_ack_id_is_the_stored_id(app, client):
+    body, headers = push_delivery()
+    response = client.post('/webhook', data=body, headers=headers)
+    assert response.status_code == 202
+    flush(app)
+
+    actions = client.get('/api/actions?repository=octo/widgets').get_json()['actions']
+    assert response.get_json()['document_id'] in [action['id'] for action in actions]
+
+
+def test_test_webhook_id_is_the_stored_id(app, client):
+    response = client.post('/test-webhook', json={'repository': 'octo/test-webhook'})
+    assert response.status_code == 202
+    flush(app)
+
+    actions = client.get('/api/actions?repository=octo/test-webhook').get_json()['actions']
+    assert [action['id'] for action in actions] == [response.get_json()['id']]
+
+
+def test_redelivery_is_stored_once(app, client):
+    body, headers = push_delivery(repository='octo/redelivered')
+    assert client.post('/webhook', data=body, headers=headers).status_code == 202
+    response = client.post('/webhook', data=body, headers=headers)
+    assert response.status_code == 200
+    assert response.get_json()['status'] == 'duplicate'
+    flush(app)
+
+    actions = client.get('/api/actions?repository=octo/redelivered').get_json()['actions']
+    assert len(actions) == 1
+
+
+def test_every_active_secret_is_accepted(client):
+    for secret in SECRETS:
+        body, headers = push_delivery(secret=secret, repository='octo/rotated')
+        assert client.post('/webhook', data=body, headers=headers).status_code == 202
+        body, headers = push_delivery(secret=secret, repository='octo/rotated')
+        assert client.post('/webhook/receiver', data=body, headers=headers).status_code == 202
+
+
+def test_unknown_secret_is_rejected(client):
+    body, headers = push_delivery(secret='retired-secret')
+    assert client.post('/webhook', data=body, headers=headers).status_code == 401
+    assert client.post('/webhook/receiver', data=body, headers=headers).status_code == 401
+
+    del headers['X-Hub-Signature-256']
+    assert client.post('/webhook', data=body, headers=headers).status_code == 401
+
+
+def test_cursor_pages_through_everything(app, client):
+    for _ in range(5):
+        body, headers = push_delivery(repository='octo/paged')
+        client.post('/webhook', data=body, headers=headers)
+    flush(app)
+
+    seen, cursor = [], None
+    while True:
+        url = '/api/actions?repository=octo/paged&limit=2' + (f'&cursor={cursor}' if cursor else '')
+        page = client.get(url).get_json()
+        seen += [action['id'] for action in page['actions']]
+        cursor = page['next_cursor']
+        if not cursor:
+            break
+    assert len(seen) == len(set(seen)) == 5
+
+
+def test_tampered_cursor_is_a_bad_request(client):
+    tampered = base64.urlsafe_b64encode(
+        json.dumps(['2024-01-01T00:00:00', 'not-an-object-id']).encode('utf-8')).decode('ascii')
+    for url in ('/api/actions', '/webhook/events'):
+        for cursor in (tampered, 'garbage'):
+            response = client.get(f'{url}?cursor={cursor}')
+            assert response.status_code == 400
+            assert response.get_json() == {'error': 'Invalid cursor'}